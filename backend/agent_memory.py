@@ -0,0 +1,89 @@
+import os
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from database import DBAgentMemory
+from metrics import record_cache
+
+# ---------------------------------------------------------
+# 에이전트 기억 저장소
+# - 종목별 최근 N개 의사결정만 링버퍼(deque)로 보관 → 크기가 이력에 비례해 커지지 않음
+# - 정적 성향(psychology)과 분리, DB에는 틱마다 모아서 한 번에 flush
+# ---------------------------------------------------------
+MEMORY_SIZE = int(os.getenv("AGENT_MEMORY_SIZE", "5"))
+
+
+@dataclass
+class Decision:
+    action: str
+    order_desc: str
+    thought: str
+    price: float = 0.0
+    quantity: int = 0
+    sim_time: Optional[datetime] = None
+
+    def describe(self) -> str:
+        # 프롬프트의 [직전 기억] 문구 (기존 last_thought_XXX 값과 같은 모양)
+        return f"{self.action} ({self.order_desc}) 선택: {self.thought}"
+
+
+class AgentMemoryStore:
+    def __init__(self, size: int = MEMORY_SIZE):
+        self.size = size
+        self._buffers = {}      # (agent_id, ticker) -> deque[Decision]
+        self._loaded = set()    # DB에서 이미 읽어온 agent_id
+        self._pending = []      # flush 대기 중인 (agent_id, ticker, Decision)
+
+    def _ensure_loaded(self, db: Session, agent_id: str):
+        if agent_id in self._loaded:
+            record_cache("agent_memory", True)
+            return
+        record_cache("agent_memory", False)
+        rows = db.execute(
+            select(DBAgentMemory).where(DBAgentMemory.agent_id == agent_id).order_by(DBAgentMemory.id)
+        ).scalars()
+        for r in rows:
+            buf = self._buffers.setdefault((agent_id, r.ticker), deque(maxlen=self.size))
+            buf.append(Decision(r.action, r.order_desc, r.thought, r.price or 0.0, r.quantity or 0, r.sim_time))
+        self._loaded.add(agent_id)
+
+    def recall(self, db: Session, agent_id: str, ticker: str) -> list:
+        """오래된 것부터 최근 순서의 의사결정 목록"""
+        self._ensure_loaded(db, agent_id)
+        return list(self._buffers.get((agent_id, ticker), ()))
+
+    def last_thought(self, db: Session, agent_id: str, ticker: str) -> Optional[str]:
+        self._ensure_loaded(db, agent_id)
+        buf = self._buffers.get((agent_id, ticker))
+        return buf[-1].describe() if buf else None
+
+    def remember(self, agent_id: str, ticker: str, decision: Decision):
+        buf = self._buffers.setdefault((agent_id, ticker), deque(maxlen=self.size))
+        buf.append(decision)
+        self._pending.append((agent_id, ticker, decision))
+
+    def flush(self, db: Session) -> int:
+        """대기 중인 기억을 한 번에 INSERT 하고, 건드린 (에이전트, 종목)은 최근 N개만 남김"""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        db.add_all([DBAgentMemory(agent_id=a, ticker=t, action=d.action, order_desc=d.order_desc, thought=d.thought,
+                                  price=d.price, quantity=d.quantity, sim_time=d.sim_time) for a, t, d in pending])
+        db.flush()
+
+        for agent_id, ticker in {(a, t) for a, t, _ in pending}:
+            keep = select(DBAgentMemory.id).where(
+                DBAgentMemory.agent_id == agent_id, DBAgentMemory.ticker == ticker
+            ).order_by(DBAgentMemory.id.desc()).limit(self.size)
+            db.execute(delete(DBAgentMemory).where(
+                DBAgentMemory.agent_id == agent_id, DBAgentMemory.ticker == ticker,
+                DBAgentMemory.id.notin_(keep.scalar_subquery())
+            ))
+        db.commit()
+        return len(pending)
+
+
+AGENT_MEMORY = AgentMemoryStore()
@@ -0,0 +1,57 @@
+from typing import Optional
+from sqlalchemy.orm import Session
+from database import DBAgent
+from domain_models import AgentRole
+from metrics import record_cache
+
+# ---------------------------------------------------------
+# 에이전트 id 인터닝 (문자열 ↔ 정수)
+# - 정수 = agents.id (PK). 엔진 호가창/체결 기록은 정수만 들고 다님
+# - 역할(유저/마켓메이커/고래/일반)은 비트마스크 → startswith 스캔 대신 O(1) 플래그 검사
+# - 문자열 id는 API/로그/positions 원장 등 바깥 경계에서만 다시 풀어 씀
+# ---------------------------------------------------------
+_HUMAN = int(AgentRole.HUMAN)  # IntFlag 연산은 파이썬 레벨이라 느림 → 핫패스는 평범한 int로
+
+
+class AgentRegistry:
+    def __init__(self):
+        self._uid = {}     # agent_id -> uid
+        self._name = {}    # uid -> agent_id
+        self._flags = {}   # uid -> AgentRole 비트
+
+    def _register(self, uid: int, agent_id: str, role_flags: Optional[int]):
+        self._uid[agent_id] = uid
+        self._name[uid] = agent_id
+        self._flags[uid] = role_flags or int(AgentRole.for_agent_id(agent_id))
+
+    def load(self, db: Session):
+        """전체 에이전트를 한 번에 인터닝 (쿼리 1번)"""
+        for uid, agent_id, role_flags in db.query(DBAgent.id, DBAgent.agent_id, DBAgent.role_flags):
+            self._register(uid, agent_id, role_flags)
+
+    def uid(self, db: Session, agent_id: str) -> Optional[int]:
+        """문자열 id → 정수. 처음 보는 id만 DB 조회, 없는 에이전트면 None"""
+        uid = self._uid.get(agent_id)
+        record_cache("agent_registry", hit=uid is not None)
+        if uid is None:
+            row = db.query(DBAgent.id, DBAgent.role_flags).filter(DBAgent.agent_id == agent_id).first()
+            if row is None: return None
+            uid = row.id
+            self._register(uid, agent_id, row.role_flags)
+        return uid
+
+    def name(self, uid: int) -> Optional[str]:
+        return self._name.get(uid)
+
+    def flags(self, uid: int) -> int:
+        return self._flags.get(uid, 0)
+
+    def is_human(self, uid: int) -> bool:
+        return bool(self._flags.get(uid, 0) & _HUMAN)
+
+    def reset(self):
+        """에이전트를 지우고 다시 만든 뒤 (init_agents 등) id가 바뀌었을 때"""
+        self.__init__()
+
+
+AGENTS = AgentRegistry()
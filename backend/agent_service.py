@@ -1,23 +1,36 @@
 import os
 import json
 import random
-import httpx
-from openai import AsyncAzureOpenAI
 from dotenv import load_dotenv
+from llm_provider import chat_completion
 
 load_dotenv()
 
 # ----------------------------------------------------------------
-# 1. 설정 (OpenAI + Bing)
+# 1. 설정 (OpenAI + Bing) - LLM 클라이언트는 llm_provider에서 공유
 # ----------------------------------------------------------------
-client = AsyncAzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-)
 NEWS_MODEL = os.getenv("MODEL_NEWS", "gpt-4o-mini")
 
 BING_KEY = os.getenv("BING_SEARCH_KEY")
+
+# Bing 호출용 HTTP 클라이언트 (호출마다 새로 만들지 않고 커넥션 풀 재사용)
+# httpx는 처음 쓸 때 import → 뉴스 검색을 안 하는 프로세스(시뮬레이션/API)는 기동 비용 없음
+_http_client = None
+
+
+def get_http_client():
+    import httpx
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=10.0, limits=httpx.Limits(max_connections=10, max_keepalive_connections=5))
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 BING_ENDPOINT = os.getenv("BING_SEARCH_ENDPOINT", "https://api.bing.microsoft.com/v7.0/news/search")
 
 # ----------------------------------------------------------------
@@ -83,9 +96,8 @@ async def fetch_news_from_bing(company_name: str, query: str):
     params = {"q": query, "count": 1, "mkt": "ko-KR", "sortBy": "Date"}
 
     try:
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(BING_ENDPOINT, headers=headers, params=params)
-            data = response.json()
+        response = await get_http_client().get(BING_ENDPOINT, headers=headers, params=params)
+        data = response.json()
 
         if "value" not in data or not data["value"]: return []
 
@@ -111,7 +123,8 @@ async def rewrite_as_parody(company_name: str, real_title: str, real_desc: str):
     """
     
     try:
-        response = await client.chat.completions.create(
+        response = await chat_completion(
+            "news",
             model=NEWS_MODEL,
             messages=[{"role": "user", "content": f"{prompt}\nJSON(title, summary, impact_score) 출력."}],
             response_format={"type": "json_object"}
@@ -159,7 +172,8 @@ async def generate_fake_news(company_name: str, info: dict):
         """
 
     try:
-        response = await client.chat.completions.create(
+        response = await chat_completion(
+            "news",
             model=NEWS_MODEL,
             messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": "JSON(title, summary) 작성."}],
             response_format={"type": "json_object"},
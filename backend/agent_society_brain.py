@@ -1,17 +1,16 @@
 import os
 import json
+import time
 import random
-from openai import AsyncAzureOpenAI
 from dotenv import load_dotenv
 from domain_models import AgentState
+from llm_provider import chat_completion
+from metrics import LLM_CALLS_SKIPPED_TOTAL, AGENT_BATCH_SIZE
+from prompt_templates import (system_prefix, trade_user_prompt, social_user_prompt, batch_user_prompt, allowed_actions,
+                              fit_budget, PROMPT_TOKEN_BUDGET, BATCH_AGENT_TOKENS, TRADE_MAX_TOKENS, CHATTER_MAX_TOKENS)
 
 load_dotenv()
 
-client = AsyncAzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-)
 AGENT_MODEL = os.getenv("MODEL_AGENT", "gpt-4o-mini") 
 
 def get_agent_persona(agent_name):
@@ -45,131 +44,176 @@ async def agent_society_think(
     agent_type, strategy_prompt = get_agent_persona(agent_name)
     is_social_mode = (current_price <= 0)
 
-    # 1. 자산 상태 분석
-    status_msg = "보유 주식 없음"
-    if portfolio_qty > 0 and avg_price > 0 and not is_social_mode:
-        roi = ((current_price - avg_price) / avg_price) * 100
-        roi_str = f"{roi:+.2f}%"
-        if roi > 0: status_msg = f"🟢 수익 중 ({roi_str})"
-        else: status_msg = f"🔴 손실 중 ({roi_str})"
-    elif is_social_mode:
-        status_msg = "전체 계좌 상황을 보며 커뮤니티 활동 중"
-
-    # 2. 기억 복원
-    memory_context = "최근 거래 기록 없음."
-    if last_action_desc:
-        memory_context = f"📜 [직전 기억]: 당신은 지난번에 '{last_action_desc}'라고 생각하고 행동했습니다."
-
-    # 3. 사회적 분위기
-    social_context = "시장 분위기 파악 불가."
-    if market_sentiment:
-        social_context = f"👥 [시장 분위기]: {market_sentiment}"
-
-    # 4. 시스템 프롬프트 구성
-    mode_instruction = "커뮤니티 라운지에서 사람들과 소통 중입니다. 매매 목적이 아니므로 잡담을 하세요." if is_social_mode else "특정 종목 매매를 결정해야 합니다."
-    
-    system_prompt = f"""
-    당신은 '{agent_name}' ({agent_type})입니다. {mode_instruction}
-    
-    [당신의 투자 철학]
-    {strategy_prompt}
-    
-    [행동 원칙]
-    1. 사회적 상호작용: 시장 반응에 대해 당신의 성격대로 던지세요. 
-    2. 감정 표현: 기계적이지 않게 사람처럼 표현하세요.
-    3. 적극적 매도/매수 지향: 가만히(HOLD) 있지 마세요. 특히 주식을 보유 중이라면 적극적으로 익절(수익 실현)하거나 손절(SELL)하여 현금을 회수하는 판단을 자주 내리세요.
-    4. 반드시 JSON 형식으로만 응답하세요.
-    """
-    
-    # 5. 🔥 유저 프롬프트 (상황별 강력한 힌트로 헛발질 원천 차단)
-    market_data_display = f"현재 {context_info}에 대해 토론 중" if is_social_mode else f"종목 현재가: {int(current_price):,}원"
-    
-    if portfolio_qty > 0:
-        action_hint = "💡 [중요] 해당 주식을 보유 중입니다! 수익권이면 익절(SELL), 손실권이어도 위험하면 손절(SELL)하여 현금을 적극적으로 확보하세요."
-    elif cash >= current_price:
-        action_hint = "💡 주식이 없으므로 SELL은 불가합니다. 현금이 있으니 매수(BUY) 기회를 적극 노리세요."
+    if is_social_mode:
+        user_prompt = fit_budget(
+            lambda **opt: social_user_prompt(agent_name, context_info, cash, **opt),
+            memory=last_action_desc, sentiment=market_sentiment,
+        )
     else:
-        action_hint = "💡 현금 부족으로 매수가 불가능하며, 주식도 없으므로 강제 관망(HOLD) 상태입니다. 시장을 지켜보는 멘트만 작성하세요."
-
-    user_prompt = f"""
-    [{'커뮤니티 라운지' if is_social_mode else '시장 데이터'}]
-    - 상황: {market_data_display}
-    - {social_context}
-    
-    [당신의 상태]
-    - 현금: {int(cash):,}원
-    - 주식 보유 현황: {portfolio_qty}주 (평단 {int(avg_price):,}원)
-    - 현재 심리: {status_msg}
-    - {memory_context}
-    
-    위 상황에서 의사결정을 내리세요.
-    매매 모드일 때 힌트: {action_hint}
-
-    {{
-        "thought_process": "당신의 페르소나가 드러나는 게시글 내용 (딱 한 문장)",
-        "action": "BUY" 또는 "SELL" 또는 "HOLD",
-        "price": (희망 가격, 정수),
-        "quantity": (수량, 정수)
-    }}
-    """
+        actions = allowed_actions(current_price, cash, portfolio_qty)
+        if actions == ["HOLD"]:
+            # 현금도 주식도 없으면 답이 정해져 있으므로 LLM을 부르지 않음
+            LLM_CALLS_SKIPPED_TOTAL.inc(call_type="trade_decision", reason="forced_hold")
+            return {"action": "HOLD", "quantity": 0, "price": int(current_price), "thought_process": "현금 부족 + 보유 주식 없음으로 관망"}
+        user_prompt = fit_budget(
+            lambda **opt: trade_user_prompt(agent_name, current_price, cash, portfolio_qty, avg_price, actions, **opt),
+            memory=last_action_desc, news=context_info, sentiment=market_sentiment,
+        )
 
     try:
-        response = await client.chat.completions.create(
+        response = await chat_completion(
+            "chatter" if is_social_mode else "trade_decision",
             model=AGENT_MODEL,
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": system_prefix(agent_type, strategy_prompt, is_social_mode)},
                 {"role": "user", "content": user_prompt}
             ],
             temperature=0.9, 
             response_format={"type": "json_object"},
-            max_tokens=300
+            max_tokens=CHATTER_MAX_TOKENS if is_social_mode else TRADE_MAX_TOKENS
         )
         
         result_text = response.choices[0].message.content
         if not result_text: raise ValueError("Empty response")
             
         decision = json.loads(result_text.strip())
-        action = str(decision.get("action", "HOLD")).upper()
-        
         if is_social_mode:
             decision["action"] = "HOLD"; decision["price"] = 0; decision["quantity"] = 0
             return decision
+        return _validate_decision(decision, current_price, cash, portfolio_qty)
 
-        try: qty = int(float(decision.get("quantity", 0)))
-        except: qty = 0
+    except Exception as e:
+        return _fallback_hold(current_price)
 
-        try:
-            raw_p = decision.get("price", current_price)
-            raw_price = int(float(raw_p)) if raw_p not in [None, "", "null"] else int(current_price)
-        except: raw_price = int(current_price)
 
-        if raw_price <= 0: raw_price = int(current_price)
-        price = max(int(current_price * 0.85), min(raw_price, int(current_price * 1.15)))
-        
-        decision["price"] = price
-        decision["quantity"] = qty
-
-        # 🔥 [안전장치 수정] 로그를 명확하게 분리하여 헛발질 이유 확인
-        if action == "BUY":
-            if price > 0:
-                max_buyable = int(cash // price)
-                decision["quantity"] = min(qty, max_buyable)
-                if decision["quantity"] <= 0:
-                     return {"action": "HOLD", "quantity": 0, "price": price, "thought_process": f"잔고 부족으로 매수 실패 ({decision.get('thought_process', '')})"}
-            else:
-                return {"action": "HOLD", "quantity": 0, "price": 0, "thought_process": "잘못된 가격 입력으로 관망"}
-        
-        elif action == "SELL":
-            if portfolio_qty == 0:
-                return {"action": "HOLD", "quantity": 0, "price": price, "thought_process": "보유 주식 부족으로 매도 실패"}
-            decision["quantity"] = min(qty, portfolio_qty)
-            if decision["quantity"] <= 0:
-                 return {"action": "HOLD", "quantity": 0, "price": price, "thought_process": "매도 수량 0으로 관망"}
+def _fallback_hold(current_price) -> dict:
+    return {"action": "HOLD", "quantity": 0, "price": int(current_price), "thought_process": "시장 상황을 분석 중입니다."}
 
-        if action != "HOLD" and decision["quantity"] <= 0:
-             return {"action": "HOLD", "quantity": 0, "price": price, "thought_process": "수량 오류로 관망"}
 
-        return decision
+def _validate_decision(decision: dict, current_price, cash, portfolio_qty) -> dict:
+    """LLM 답변 정리: 가격은 현재가 ±15%로, 수량은 잔고/보유량 이내로 (단건/배치 공용)"""
+    action = str(decision.get("action", "HOLD")).upper()
+    decision["action"] = action
 
-    except Exception as e:
-        return {"action": "HOLD", "quantity": 0, "price": int(current_price), "thought_process": "시장 상황을 분석 중입니다."}
\ No newline at end of file
+    try: qty = int(float(decision.get("quantity", 0)))
+    except: qty = 0
+
+    try:
+        raw_p = decision.get("price", current_price)
+        raw_price = int(float(raw_p)) if raw_p not in [None, "", "null"] else int(current_price)
+    except: raw_price = int(current_price)
+
+    if raw_price <= 0: raw_price = int(current_price)
+    price = max(int(current_price * 0.85), min(raw_price, int(current_price * 1.15)))
+    
+    decision["price"] = price
+    decision["quantity"] = qty
+
+    # 🔥 [안전장치 수정] 로그를 명확하게 분리하여 헛발질 이유 확인
+    if action == "BUY":
+        if price > 0:
+            max_buyable = int(cash // price)
+            decision["quantity"] = min(qty, max_buyable)
+            if decision["quantity"] <= 0:
+                 return {"action": "HOLD", "quantity": 0, "price": price, "thought_process": f"잔고 부족으로 매수 실패 ({decision.get('thought_process', '')})"}
+        else:
+            return {"action": "HOLD", "quantity": 0, "price": 0, "thought_process": "잘못된 가격 입력으로 관망"}
+    
+    elif action == "SELL":
+        if portfolio_qty == 0:
+            return {"action": "HOLD", "quantity": 0, "price": price, "thought_process": "보유 주식 부족으로 매도 실패"}
+        decision["quantity"] = min(qty, portfolio_qty)
+        if decision["quantity"] <= 0:
+             return {"action": "HOLD", "quantity": 0, "price": price, "thought_process": "매도 수량 0으로 관망"}
+
+    if action != "HOLD" and decision["quantity"] <= 0:
+         return {"action": "HOLD", "quantity": 0, "price": price, "thought_process": "수량 오류로 관망"}
+
+    return decision
+
+
+# ---------------------------------------------------------
+# 배치 모드: 같은 종목 x 같은 페르소나 에이전트 여러 명을 LLM 호출 1번으로 결정
+# - 배치 크기는 AIMD로 자동 조절 (성공하면 +1, 느리거나 실패하면 절반)
+# ---------------------------------------------------------
+BATCH_MAX_SIZE = int(os.getenv("AGENT_BATCH_MAX_SIZE", "8"))
+BATCH_TARGET_SEC = float(os.getenv("AGENT_BATCH_TARGET_SEC", "8.0"))
+
+
+class AdaptiveBatchSizer:
+    def __init__(self, initial: int = 4, min_size: int = 1, max_size: int = BATCH_MAX_SIZE,
+                 target_sec: float = BATCH_TARGET_SEC):
+        self.min_size, self.max_size, self.target_sec = min_size, max_size, target_sec
+        self._size = float(max(min_size, min(initial, max_size)))
+        AGENT_BATCH_SIZE.set(self.size)
+
+    @property
+    def size(self) -> int:
+        return int(self._size)
+
+    def record(self, elapsed: float, ok: bool):
+        if ok and elapsed <= self.target_sec:
+            self._size = min(self.max_size, self._size + 1)
+        else:
+            self._size = max(self.min_size, self._size / 2)
+        AGENT_BATCH_SIZE.set(self.size)
+
+
+BATCH_SIZER = AdaptiveBatchSizer()
+
+
+async def agent_society_think_batch(persona: tuple, current_price, context_info, market_sentiment, agents: list) -> list:
+    """persona: get_agent_persona() 결과, agents: [{agent_name, cash, portfolio_qty, avg_price, last_action_desc}]
+    → 같은 순서의 결정 목록 (빠진 에이전트는 관망)"""
+    agent_type, strategy_prompt = persona
+    decisions = [None] * len(agents)
+
+    # 현금도 주식도 없는 에이전트는 LLM에 보내지 않음
+    asking = []
+    for i, a in enumerate(agents):
+        actions = allowed_actions(current_price, a["cash"], a["portfolio_qty"])
+        if actions == ["HOLD"]:
+            LLM_CALLS_SKIPPED_TOTAL.inc(call_type="trade_batch", reason="forced_hold")
+            decisions[i] = {"action": "HOLD", "quantity": 0, "price": int(current_price), "thought_process": "현금 부족 + 보유 주식 없음으로 관망"}
+        else:
+            asking.append((i, dict(a, actions=actions)))
+    if not asking:
+        return decisions
+
+    rows = [a for _, a in asking]
+    user_prompt = fit_budget(
+        lambda **opt: batch_user_prompt(current_price, rows, **opt),
+        budget=PROMPT_TOKEN_BUDGET + BATCH_AGENT_TOKENS * len(rows),
+        news=context_info, sentiment=market_sentiment,
+    )
+
+    answers, ok = {}, False
+    start = time.perf_counter()
+    try:
+        response = await chat_completion(
+            "trade_batch",
+            model=AGENT_MODEL,
+            messages=[
+                {"role": "system", "content": system_prefix(agent_type, strategy_prompt, False, batch=True)},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.9,
+            response_format={"type": "json_object"},
+            max_tokens=TRADE_MAX_TOKENS * len(rows)
+        )
+        result_text = response.choices[0].message.content
+        if not result_text: raise ValueError("Empty response")
+        for item in json.loads(result_text.strip()).get("decisions", []):
+            if isinstance(item, dict) and item.get("agent"):
+                answers[str(item["agent"])] = item
+        # 절반 이상 빠뜨린 답은 실패로 보고 배치를 줄임
+        ok = len(answers) * 2 >= len(rows)
+    except Exception:
+        ok = False
+    finally:
+        BATCH_SIZER.record(time.perf_counter() - start, ok)
+
+    for i, a in asking:
+        item = answers.get(a["agent_name"])
+        decisions[i] = _validate_decision(item, current_price, a["cash"], a["portfolio_qty"]) if item else _fallback_hold(current_price)
+    return decisions
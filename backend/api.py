@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException, Header, Depends
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Depends, Request, Query
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from sqlalchemy import desc, asc, func
 from sqlalchemy.orm import Session
-from database import SessionLocal, DBCompany, DBTrade, DBNews, DBAgent, DBDiscussion
-import uvicorn
+from database import SessionLocal, DBCompany, DBTrade, DBNews, DBAgent
 from datetime import datetime, timedelta
 from typing import List, Optional
 from urllib.parse import unquote # 🔥 [핵심 추가] 프론트에서 포장해서 보낸 아이디를 안전하게 푸는 도구
@@ -12,9 +15,46 @@ from urllib.parse import unquote # 🔥 [핵심 추가] 프론트에서 포장
 # 유저님의 핵심 엔진 및 멘토 임포트
 from market_engine import MarketEngine
 from domain_models import Order, OrderSide, OrderType
-from mentor_brain import generate_all_mentors_advice, chat_with_mentor, generate_user_investment_solution
+from mentor_brain import (generate_all_mentors_advice, chat_with_mentor, generate_user_investment_solution,
+                          gather_observation_data, gather_user_history_data,
+                          stream_mentors_advice, stream_user_solution, stream_chat_with_mentor)
+from positions import get_portfolio, get_position
+from leaderboard import LEADERBOARD, get_leaderboard
+from indicators import get_indicators
+from news_cache import get_news_cache
+from discussion_service import DISCUSSIONS, get_discussions
+from metrics import REGISTRY, ERRORS_TOTAL, render_prometheus, monitor_event_loop_lag, push_token_ok
+from llm_provider import close_llm_client
+from fast_response import fast_json, cached_json, not_modified, make_etag, sse_response
+from response_cache import RESPONSE_CACHE
+from user_analytics import get_cached_solution
 
-app = FastAPI(title="Global Stock Simulation API")
+# 다른 프로세스(시뮬레이션 등)가 push한 메트릭 스냅샷 {job: snapshot}
+# ⚠️ 워커(프로세스)마다 따로 있음 → 워커 여러 개로 띄우면 push는 그중 한 워커에만 들어가고,
+#    /metrics 스크레이프가 다른 워커에 걸리면 시뮬레이션 메트릭이 빠짐 (push 받는 API는 워커 1개로 운영)
+REMOTE_METRICS = {}
+
+# 기동 시 캐시 미리 채우기 (기본 꺼짐 - 첫 요청이 대신 채움. 켜면 DB 연결/캐시 적재가 끝난 뒤 요청을 받음)
+API_WARMUP = os.getenv("API_WARMUP", "false").lower() in ("1", "true", "yes")
+
+def _warm_up():
+    with SessionLocal() as db:
+        get_leaderboard(db)
+        get_indicators(db)
+        get_news_cache(db)
+        get_discussions(db)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # import 시점에는 DB/LLM 클라이언트를 만들지 않음 → 여기(워커별)서 필요할 때 생성
+    if API_WARMUP:
+        await asyncio.to_thread(_warm_up)
+    lag_task = asyncio.create_task(monitor_event_loop_lag())
+    yield
+    lag_task.cancel()
+    await close_llm_client()
+
+app = FastAPI(title="Global Stock Simulation API", lifespan=lifespan)
 engine = MarketEngine()
 
 # CORS 설정
@@ -69,11 +109,19 @@ class ChatRequest(BaseModel):
     agent_type: str
     message: str
 
+class MetricsPushRequest(BaseModel):
+    job: str
+    metrics: dict
+
 # --- [API Endpoints] ---
 
 # 1. 기업 목록 조회
 @app.get("/api/companies")
-def get_companies(db: Session = Depends(get_db)):
+def get_companies(request: Request, db: Session = Depends(get_db)):
+    # 체결이 있기 전까지는 모든 클라이언트에게 같은 응답 → 공유 캐시 (체결 시 엔진이 무효화)
+    return cached_json(request, "companies", ("trades",), lambda: _companies_payload(db))
+
+def _companies_payload(db: Session) -> list:
     companies = db.query(DBCompany).all()
     sim_now = get_current_sim_time(db)
     sim_today_start = sim_now.replace(hour=9, minute=0, second=0, microsecond=0)
@@ -105,14 +153,31 @@ def get_companies(db: Session = Depends(get_db)):
 
 # 2. 특정 기업 차트 데이터
 @app.get("/api/chart/{ticker}")
-def get_chart(ticker: str, limit: int = 3000, db: Session = Depends(get_db)): 
-    trades = db.query(DBTrade).filter(DBTrade.ticker == ticker).order_by(desc(DBTrade.timestamp)).limit(limit).all()
-    return [{"time": t.timestamp.isoformat(), "price": t.price} for t in trades][::-1]
+def get_chart(ticker: str, request: Request, limit: int = 3000, layout: str = Query("rows", alias="format"),
+              db: Session = Depends(get_db)):
+    # 종목의 마지막 체결 id가 그대로면 304 (최대 3000건 조회/직렬화 생략)
+    last_id = db.query(func.max(DBTrade.id)).filter(DBTrade.ticker == ticker).scalar()
+    etag = make_etag("chart", ticker, limit, layout, last_id)
+    cached = not_modified(request, etag, "chart")
+    if cached is not None: return cached
+
+    # ORM 객체 대신 필요한 두 컬럼만, 시각 변환은 직렬화기(orjson)가 C에서 처리
+    rows = db.query(DBTrade.timestamp, DBTrade.price).filter(DBTrade.ticker == ticker).order_by(desc(DBTrade.timestamp)).limit(limit).all()
+    rows.reverse()
+    if layout == "columns":
+        # 열 단위: {"time": [epoch ms...], "price": [...]} - 키 반복이 없어 본문이 절반 이하
+        payload = {"time": [int(ts.timestamp() * 1000) for ts, _ in rows], "price": [p for _, p in rows]}
+    else:
+        payload = [{"time": ts, "price": p} for ts, p in rows]
+    return fast_json(request, payload, "chart", etag)
 
 # 3. 뉴스 가져오기
 @app.get("/api/news")
-def get_all_news(db: Session = Depends(get_db)):
-    news = db.query(DBNews).order_by(desc(DBNews.id)).limit(50).all()
+def get_all_news(request: Request, db: Session = Depends(get_db)):
+    return cached_json(request, "news", ("news",), lambda: _news_payload(db))
+
+def _news_payload(db: Session) -> list:
+    news = db.query(DBNews).filter(DBNews.is_published == 1).order_by(desc(DBNews.id)).limit(50).all()
     return [{
         "id": n.id,
         "ticker": n.company_name,
@@ -124,8 +189,16 @@ def get_all_news(db: Session = Depends(get_db)):
     } for n in news]
 
 @app.get("/api/news/{company_name}")
-def get_news(company_name: str, db: Session = Depends(get_db)):
-    news_list = db.query(DBNews).filter(DBNews.company_name == company_name).order_by(desc(DBNews.id)).limit(5).all()
+def get_news(company_name: str, request: Request, db: Session = Depends(get_db)):
+    # 경로 값이 그대로 캐시 키가 되므로 모르는 회사는 캐시에 넣지 않고 404 (키가 끝없이 늘어나지 않게)
+    if get_news_cache(db).ticker_of(company_name) is None:
+        raise HTTPException(status_code=404, detail="회사 없음")
+    return cached_json(request, "news_company", ("news",), lambda: _company_news_payload(db, company_name), name=company_name)
+
+def _company_news_payload(db: Session, company_name: str) -> list:
+    # 종목별 최신 뉴스 캐시에서 (캐시 미스 = 새 발행이 있었다는 뜻이므로 주기 기다리지 않고 바로 동기화)
+    cache = get_news_cache(db, max_age=0)
+    news_list = cache.recent(cache.ticker_of(company_name), 5)
     return [{
         "id": n.id,
         "title": n.title,
@@ -144,6 +217,8 @@ async def init_user(req: UserInitRequest, db: Session = Depends(get_db)):
     new_user = DBAgent(agent_id=user_id, cash_balance=5000000.0, portfolio={}, psychology={"type": "HUMAN", "name": req.username})
     db.add(new_user)
     db.commit()
+    LEADERBOARD.set_agent(user_id, 5000000.0, {})
+    RESPONSE_CACHE.invalidate("agents")
     return {"status": "created", "user_id": user_id, "balance": 5000000.0}
 
 @app.get("/api/user/status")
@@ -157,11 +232,13 @@ async def get_user_status(x_user_id: str = Header("USER_guest"), db: Session = D
         db.add(user)
         db.commit()
         db.refresh(user)
+        LEADERBOARD.set_agent(user.agent_id, user.cash_balance, {})
+        RESPONSE_CACHE.invalidate("agents")
 
     return {
         "user_id": user.agent_id,
         "balance": user.cash_balance,
-        "portfolio": user.portfolio,
+        "portfolio": get_portfolio(db, user.agent_id),
         "sim_time": get_current_sim_time(db).strftime("%H:%M")
     }
 
@@ -173,27 +250,56 @@ async def get_user_solution(x_user_id: str = Header("USER_guest"), db: Session =
         solutions = await generate_user_investment_solution(db, x_user_id)
         return solutions
     except Exception as e:
+        ERRORS_TOTAL.inc(component="api_solution")
         print(f"Solution API Error: {e}")
         return {"error": "투자 분석을 생성하는 중 오류가 발생했습니다."}
 
+# 스트리밍 버전 (SSE): 끝난 멘토부터 event: solution 으로 카드 1장씩 → event: done
+# DB 조회는 응답 시작 전에 끝냄 (스트리밍 중에는 요청 세션을 쓰지 않음)
+@app.get("/api/user/solution/stream")
+async def stream_user_solution_events(x_user_id: str = Header("USER_guest"), db: Session = Depends(get_db)):
+    x_user_id = unquote(x_user_id) # 🔥 디코딩
+    try:
+        history_data = gather_user_history_data(db, x_user_id)
+        cached = get_cached_solution(db, x_user_id, history_data["features"]) if history_data else None
+    except Exception as e:
+        ERRORS_TOTAL.inc(component="api_solution")
+        print(f"Solution API Error: {e}")
+        history_data = cached = None
+
+    async def events():
+        if not history_data:
+            yield "error", {"error": "투자 분석을 생성하는 중 오류가 발생했습니다."}
+            return
+        async for card in stream_user_solution(history_data, cached):
+            yield "solution", card
+        yield "done", {}
+    return sse_response(events(), "solution")
+
 # 5. 커뮤니티
-@app.get("/api/community/global")
-def get_global_community_posts(db: Session = Depends(get_db)):
-    posts = db.query(DBDiscussion).filter(DBDiscussion.ticker == 'GLOBAL').order_by(desc(DBDiscussion.created_at)).limit(50).all()
+def _post_rows(posts) -> list:
     return [{"id": p.id, "author": p.agent_id, "content": p.content, "sentiment": p.sentiment, "time": p.created_at.strftime("%H:%M")} for p in posts]
 
+# 캐시 미스 = 새 글이 저장됐다는 뜻 → 종토방 링버퍼도 주기 기다리지 않고 바로 꼬리 읽기 (max_age=0)
+@app.get("/api/community/global")
+def get_global_community_posts(request: Request, db: Session = Depends(get_db)):
+    return cached_json(request, "community_global", ("posts:GLOBAL",),
+                       lambda: _post_rows(get_discussions(db, max_age=0).recent("GLOBAL", 50)))
+
 @app.get("/api/community/{ticker}")
-def get_stock_community(ticker: str, db: Session = Depends(get_db)):
-    posts = db.query(DBDiscussion).filter(DBDiscussion.ticker == ticker).order_by(desc(DBDiscussion.id)).limit(20).all()
-    return [{"id": p.id, "author": p.agent_id, "content": p.content, "sentiment": p.sentiment, "time": p.created_at.strftime("%H:%M")} for p in posts]
+def get_stock_community(ticker: str, request: Request, db: Session = Depends(get_db)):
+    if ticker != "GLOBAL" and not get_news_cache(db).has_ticker(ticker):
+        raise HTTPException(status_code=404, detail="종목 없음")
+    return cached_json(request, "community_ticker", (f"posts:{ticker}",),
+                       lambda: _post_rows(get_discussions(db, max_age=0).recent(ticker, 20)), ticker=ticker)
 
 @app.post("/api/community")
 def create_community_post(req: CommunityPostRequest, db: Session = Depends(get_db)):
     sim_now = get_current_sim_time(db)
     try:
-        new_post = DBDiscussion(ticker=req.ticker, agent_id=req.author, content=req.content, sentiment=req.sentiment, created_at=sim_now)
-        db.add(new_post)
-        db.commit()
+        # 유저 글은 틱을 기다리지 않고 바로 저장
+        DISCUSSIONS.add(req.ticker, req.author, req.content, req.sentiment, sim_now)
+        DISCUSSIONS.flush(db)
         return {"status": "success"}
     except Exception as e:
         db.rollback()
@@ -212,6 +318,8 @@ async def place_user_order(req: OrderRequest, x_user_id: str = Header(...), db:
         db.add(user)
         db.commit()
         db.refresh(user)
+        LEADERBOARD.set_agent(user.agent_id, user.cash_balance, {})
+        RESPONSE_CACHE.invalidate("agents")
 
     # 🔥 [에러 방지 2] 엔진 가기 전에 백엔드 단에서 확실하게 진짜 돈과 주식이 있는지 확인합니다.
     total_price = req.price * req.quantity
@@ -219,7 +327,7 @@ async def place_user_order(req: OrderRequest, x_user_id: str = Header(...), db:
         if user.cash_balance < total_price:
             raise HTTPException(status_code=400, detail=f"잔액이 부족합니다. (현재 DB 잔고: {int(user.cash_balance)}원)")
     else:
-        current_qty = user.portfolio.get(req.ticker, 0)
+        current_qty, _ = get_position(db, x_user_id, req.ticker)
         if current_qty < req.quantity:
             raise HTTPException(status_code=400, detail=f"보유 주식이 부족합니다. (현재 DB 보유: {current_qty}주)")
 
@@ -232,24 +340,97 @@ async def place_user_order(req: OrderRequest, x_user_id: str = Header(...), db:
     return result
 
 @app.get("/api/rank")
-def get_rank(db: Session = Depends(get_db)):
-    agents = db.query(DBAgent).all()
-    rich_list = [{"agent_id": ag.agent_id, "total_asset": ag.cash_balance} for ag in agents if ag.agent_id != "MARKET_MAKER"]
-    return sorted(rich_list, key=lambda x: x["total_asset"], reverse=True)[:10]
+def get_rank(request: Request, limit: int = 10, db: Session = Depends(get_db)):
+    # 현금 + 보유주식 시가평가 기준 (정렬 인덱스에서 Top-K 슬라이스) - 체결/신규 유저 때만 다시 만듦
+    limit = min(max(limit, 1), 100)
+    # 캐시 미스 = 버전이 바뀌었다는 뜻이므로 재동기화 주기를 기다리지 않고 바로 DB에서 다시 읽음
+    return cached_json(request, "rank", ("trades", "agents"), lambda: get_leaderboard(db, max_age=0).top(limit), limit=limit)
+
+@app.get("/api/user/rank")
+def get_user_rank(x_user_id: str = Header("USER_guest"), db: Session = Depends(get_db)):
+    x_user_id = unquote(x_user_id) # 🔥 디코딩
+    board = get_leaderboard(db)
+    rank = board.rank(x_user_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="랭킹에 없는 유저입니다.")
+    return {**board.entry(x_user_id), "rank": rank, "total_players": len(board)}
+
+@app.get("/api/indicators")
+def get_all_indicators(request: Request, db: Session = Depends(get_db)):
+    # 종목별 최근 체결 지표 (수익률, VWAP, EMA, 변동성, 추세) - 체결마다 증분 갱신된 값
+    return cached_json(request, "indicators", ("trades",), lambda: get_indicators(db, max_age=0).all())
+
+@app.get("/api/indicators/{ticker}")
+def get_ticker_indicators(ticker: str, db: Session = Depends(get_db)):
+    if not db.query(DBCompany.ticker).filter(DBCompany.ticker == ticker).first():
+        raise HTTPException(status_code=404, detail="종목 없음")
+    return {"ticker": ticker, **get_indicators(db).get(ticker)}
 
 # 7. 멘토 및 챗봇
 @app.get("/api/advice/{ticker}")
 async def get_mentor_advice(ticker: str, x_user_id: str = Header("USER_01"), db: Session = Depends(get_db)):
     x_user_id = unquote(x_user_id) # 🔥 디코딩
     try: return await generate_all_mentors_advice(db, ticker, x_user_id)
-    except Exception as e: return {"error": str(e)}
+    except Exception as e:
+        ERRORS_TOTAL.inc(component="api_advice")
+        return {"error": str(e)}
+
+# 스트리밍 버전 (SSE): 멘토 4명 중 끝난 순서대로 event: advice → event: done
+@app.get("/api/advice/{ticker}/stream")
+async def stream_mentor_advice(ticker: str, x_user_id: str = Header("USER_01"), db: Session = Depends(get_db)):
+    x_user_id = unquote(x_user_id) # 🔥 디코딩
+    obs_data = gather_observation_data(db, ticker, x_user_id)
+
+    async def events():
+        if not obs_data:
+            yield "error", {"error": "종목 데이터를 찾을 수 없습니다."}
+            return
+        async for mentor, advice in stream_mentors_advice(obs_data):
+            yield "advice", {"mentor": mentor, **advice}
+        yield "done", {"generated_at": datetime.now().isoformat()}
+    return sse_response(events(), "advice")
 
 @app.post("/api/chat")
 async def handle_chat(req: ChatRequest):
     try:
         reply = await chat_with_mentor(req.agent_type, req.message)
         return {"reply": reply}
-    except Exception: return {"reply": "챗봇 서비스 일시 점검 중입니다."}
+    except Exception:
+        ERRORS_TOTAL.inc(component="api_chat")
+        return {"reply": "챗봇 서비스 일시 점검 중입니다."}
+
+# 스트리밍 버전 (SSE): 토큰 조각마다 event: token {"delta"} → 마지막에 event: done {"reply": 전체}
+@app.post("/api/chat/stream")
+async def handle_chat_stream(req: ChatRequest):
+    async def events():
+        parts = []
+        try:
+            async for delta in stream_chat_with_mentor(req.agent_type, req.message):
+                parts.append(delta)
+                yield "token", {"delta": delta}
+        except Exception:
+            ERRORS_TOTAL.inc(component="api_chat")
+            yield "error", {"reply": "챗봇 서비스 일시 점검 중입니다."}
+            return
+        yield "done", {"reply": "".join(parts)}
+    return sse_response(events(), "chat")
+
+# 9. 📊 운영 메트릭 (Prometheus text format)
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    snapshots = {"api": REGISTRY.snapshot(), **REMOTE_METRICS}
+    return PlainTextResponse(render_prometheus(snapshots), media_type="text/plain; version=0.0.4")
+
+@app.post("/metrics/push")
+def push_metrics(req: MetricsPushRequest, request: Request, x_metrics_token: str = Header("")):
+    # METRICS_PUSH_TOKEN 이 있으면 헤더 토큰 필수, 없으면 localhost 에서 온 push만
+    if not push_token_ok(x_metrics_token, request.client.host if request.client else ""):
+        raise HTTPException(status_code=403, detail="메트릭 push 권한이 없습니다.")
+    if req.job == "api":
+        raise HTTPException(status_code=400, detail="'api' job 이름은 예약되어 있습니다.")
+    REMOTE_METRICS[req.job] = req.metrics
+    return {"status": "ok"}
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("api:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
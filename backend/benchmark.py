@@ -0,0 +1,579 @@
+import os
+import sys
+import gc
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tracemalloc
+import platform
+import shutil
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timedelta
+import numpy as np
+
+# ==========================================
+# 0. 로컬 환경 강제 (Azure/네트워크 없이 실제 핫패스만 측정)
+# ==========================================
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+
+from sqlalchemy import insert
+from database import SessionLocal, Base, engine, DBCompany, DBAgent, DBTrade, DBPosition
+from domain_models import Order, OrderSide, OrderType, get_initial_companies
+from llm_provider import StubLLMClient, set_llm_client
+from market_engine import MarketEngine
+from order_book import OrderBook, RestingOrder, to_ns
+from metrics import REGISTRY, LLM_TOKENS_TOTAL, LLM_SECONDS
+from indicators import INDICATORS
+from event_bus import EVENT_BUS
+from news_cache import NEWS_CACHE
+from news_service import NEWS_PUBLISHER
+from discussion_service import DISCUSSIONS
+from agent_registry import AGENTS
+from response_cache import RESPONSE_CACHE
+from population import Population
+import main_simulation
+import mentor_brain
+
+logging.getLogger("GlobalMarket").setLevel(logging.WARNING)
+
+BENCH_TICKER = "SS011"
+
+
+# ==========================================
+# 1. 공통 도우미 (DB 초기화, 시드 데이터, 통계)
+# ==========================================
+def reset_db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    # id 꼬리 읽기 상태도 새 DB 기준으로
+    INDICATORS.reset()
+    EVENT_BUS.__init__()
+    NEWS_CACHE.invalidate()
+    NEWS_PUBLISHER.__init__()
+    DISCUSSIONS.reset()
+    AGENTS.reset()
+    RESPONSE_CACHE.reset()
+
+
+def seed_companies(db):
+    for c in get_initial_companies():
+        db.add(DBCompany(ticker=c.ticker, name=c.name, sector=c.sector,
+                         current_price=c.current_price, prev_close_price=c.current_price))
+    db.commit()
+
+
+def seed_agents(db, n_agents: int):
+    rows = [{"agent_id": f"Citizen_{i+1:03d}", "cash_balance": 5_000_000.0, "psychology": {}}
+            for i in range(n_agents)]
+    rows.append({"agent_id": "MARKET_MAKER", "cash_balance": 1e15, "psychology": {}})
+    db.execute(insert(DBAgent), rows)
+    db.execute(insert(DBPosition), [{"agent_id": "MARKET_MAKER", "ticker": c.ticker, "qty": 10**9, "avg_cost": c.current_price}
+                                    for c in get_initial_companies()])
+    db.commit()
+
+
+def seed_trades(db, n_trades: int, chunk: int = 50_000):
+    rng = random.Random(7)
+    mm_uid = db.query(DBAgent.id).filter(DBAgent.agent_id == "MARKET_MAKER").scalar()
+    companies = get_initial_companies()
+    prices = {c.ticker: c.current_price for c in companies}
+    start = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(seconds=n_trades)
+    batch = []
+    for i in range(n_trades):
+        c = companies[i % len(companies)]
+        prices[c.ticker] = max(1.0, prices[c.ticker] * rng.uniform(0.995, 1.005))
+        batch.append({"ticker": c.ticker, "price": int(prices[c.ticker]), "quantity": rng.randint(1, 100),
+                      "buyer_uid": mm_uid, "seller_uid": mm_uid,
+                      "timestamp": start + timedelta(seconds=i)})
+        if len(batch) >= chunk:
+            db.execute(insert(DBTrade), batch)
+            batch = []
+    if batch:
+        db.execute(insert(DBTrade), batch)
+    db.commit()
+
+
+def summarize(samples_sec: list) -> dict:
+    ms = sorted(s * 1000.0 for s in samples_sec)
+    if not ms: return {"n": 0}
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 4),
+        "p50_ms": round(ms[len(ms) // 2], 4),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        "max_ms": round(ms[-1], 4),
+        "ops_per_sec": round(len(ms) / (sum(ms) / 1000.0), 2) if sum(ms) > 0 else None,
+    }
+
+
+# ==========================================
+# 2. MarketEngine.place_order 처리량 vs 호가 깊이
+# ==========================================
+def bench_place_order(depths, n_orders: int) -> list:
+    results = []
+    for depth in depths:
+        reset_db()
+        with SessionLocal() as db:
+            seed_companies(db)
+            seed_agents(db, 10)
+            engine_ = MarketEngine()
+            price = int(db.query(DBCompany).filter(DBCompany.ticker == BENCH_TICKER).first().current_price)
+            sim_time = datetime.now()
+
+            # 체결되지 않는 먼 호가로 깊이를 미리 채움
+            for i in range(depth):
+                engine_.place_order(db, Order(agent_id="MARKET_MAKER", ticker=BENCH_TICKER, side=OrderSide.BUY,
+                                              order_type=OrderType.LIMIT, quantity=10, price=price * 0.5 - i), sim_time)
+                engine_.place_order(db, Order(agent_id="MARKET_MAKER", ticker=BENCH_TICKER, side=OrderSide.SELL,
+                                              order_type=OrderType.LIMIT, quantity=10, price=price * 1.5 + i), sim_time)
+
+            for mode in ("rest", "cross"):
+                samples = []
+                for i in range(n_orders):
+                    side = OrderSide.BUY if i % 2 == 0 else OrderSide.SELL
+                    if mode == "rest":
+                        # 스프레드 안쪽에 쌓이기만 하는 주문 (삽입 + 정렬 비용)
+                        p = price * (0.9 if side == OrderSide.BUY else 1.1)
+                    else:
+                        # 반대편 최우선 호가와 즉시 체결되는 주문 (매칭 + 체결 기록 비용)
+                        p = price * (2.0 if side == OrderSide.BUY else 0.25)
+                    agent_id = "Citizen_001" if mode == "rest" else "MARKET_MAKER"
+                    order = Order(agent_id=agent_id, ticker=BENCH_TICKER, side=side,
+                                  order_type=OrderType.LIMIT, quantity=1, price=p)
+                    t0 = time.perf_counter()
+                    engine_.place_order(db, order, sim_time)
+                    samples.append(time.perf_counter() - t0)
+                results.append({"depth": depth, "mode": mode, **summarize(samples)})
+                print(f"  - place_order depth={depth:<6} {mode:<5} {results[-1]['ops_per_sec']} ops/s (p95 {results[-1]['p95_ms']}ms)")
+    return results
+
+
+# ==========================================
+# 2-1. 호가창 자료구조만 (DB 없이): 예전 dict 리스트 vs __slots__ + bisect
+# ==========================================
+class _DictBook:
+    """예전 엔진 방식: 주문 = dict, 삽입마다 전체 sort, 최우선 호가는 pop(0)"""
+    def __init__(self):
+        self.book = {"BUY": [], "SELL": []}
+
+    def add(self, uid, price, qty, side, ts):
+        self.book[side.value].append({"agent_id": "MARKET_MAKER" if uid == 0 else f"Citizen_{uid:03d}", "price": price, "quantity": qty, "side": side, "timestamp": ts})
+        self.book["BUY"].sort(key=lambda x: x["price"], reverse=True)
+        self.book["SELL"].sort(key=lambda x: x["price"])
+
+    def match(self):
+        buys, sells = self.book["BUY"], self.book["SELL"]
+        while buys and sells and buys[0]["price"] >= sells[0]["price"]:
+            qty = min(buys[0]["quantity"], sells[0]["quantity"])
+            buys[0]["quantity"] -= qty
+            sells[0]["quantity"] -= qty
+            if buys[0]["quantity"] <= 0: buys.pop(0)
+            if sells[0]["quantity"] <= 0: sells.pop(0)
+
+
+class _SlotBook:
+    def __init__(self):
+        self.book = OrderBook()
+
+    def add(self, uid, price, qty, side, ts):
+        self.book.add(RestingOrder(uid, price, qty, side == OrderSide.BUY, to_ns(ts)))
+
+    def match(self):
+        bids, asks = self.book.bids, self.book.asks
+        while bids and asks and bids.best().price >= asks.best().price:
+            b, a = bids.best(), asks.best()
+            qty = min(b.quantity, a.quantity)
+            b.quantity -= qty
+            a.quantity -= qty
+            if b.quantity <= 0: bids.pop_best()
+            if a.quantity <= 0: asks.pop_best()
+
+
+def bench_order_book(depths, n_orders: int) -> list:
+    results = []
+    price, ts = 10_000, datetime.now()
+    for depth in depths:
+        for mode, cls in (("dict", _DictBook), ("slots", _SlotBook)):
+            gc.collect()
+            tracemalloc.start()
+            book = cls()
+            for i in range(depth):
+                book.add(0, price // 2 - i % 1000, 10, OrderSide.BUY, ts)
+                book.add(0, price * 2 + i % 1000, 10, OrderSide.SELL, ts)
+            bytes_per_order = tracemalloc.get_traced_memory()[0] / (2 * depth)
+            tracemalloc.stop()
+
+            # 스프레드 안쪽에 쌓였다가 바로 다음 주문과 체결되는 흐름 (삽입 + 매칭)
+            samples = []
+            for i in range(n_orders):
+                side = OrderSide.BUY if i % 2 == 0 else OrderSide.SELL
+                t0 = time.perf_counter()
+                book.add(1, price, 1, side, ts)
+                book.match()
+                samples.append(time.perf_counter() - t0)
+            results.append({"depth": depth, "mode": mode, "bytes_per_order": round(bytes_per_order, 1), **summarize(samples)})
+            print(f"  - order_book depth={depth:<6} {mode:<5} {results[-1]['bytes_per_order']:>7} B/order  "
+                  f"{results[-1]['ops_per_sec']} ops/s (p95 {results[-1]['p95_ms']}ms)")
+    return results
+
+
+# ==========================================
+# 3. run_simulation_loop 1틱 (15 / 100 / 500명)
+# ==========================================
+def _llm_usage() -> tuple:
+    """(호출 수, 입력 토큰, 출력 토큰) - 모든 호출 종류 합계"""
+    calls = sum(s["count"] for s in LLM_SECONDS.series())
+    tokens = {k: sum(s["value"] for s in LLM_TOKENS_TOTAL.series() if s["labels"].get("kind") == k) for k in ("input", "output")}
+    return calls, tokens["input"], tokens["output"]
+
+
+async def _run_ticks(sim_time: datetime, n_ticks: int, n_active: int, gap_ms: float = 0.0) -> list:
+    # 선행 판단(prefetch)이 틱 사이에 이어지도록 같은 이벤트 루프에서 연속 실행
+    # gap_ms: 실제 루프의 틱 간 휴식 (측정 시간에서는 제외)
+    samples = []
+    for _ in range(n_ticks):
+        t0 = time.perf_counter()
+        await main_simulation.run_simulation_tick(sim_time, n_active=n_active)
+        samples.append(time.perf_counter() - t0)
+        sim_time += timedelta(minutes=1)
+        if gap_ms > 0:
+            await asyncio.sleep(gap_ms / 1000.0)
+    main_simulation.PIPELINE.cancel()
+    return samples
+
+
+def bench_simulation_tick(agent_counts, n_ticks: int, llm_latency_ms: float,
+                          decision_modes=("single", "batch", "prefetch", "events"), gap_ms: float = 0.0) -> list:
+    results = []
+    main_simulation.CHATTER_DELAY_RANGE = (0.0, 0.0)
+    set_llm_client(StubLLMClient(latency_ms=llm_latency_ms))
+
+    for n_active in agent_counts:
+        for decisions in decision_modes:
+            # single: 1명 1호출 / batch: 묶음 호출 / prefetch: 묶음 호출 + 다음 틱 선행 판단
+            # events: prefetch + 무작위 추첨 대신 이벤트에 반응한 에이전트만 (n_active는 상한)
+            main_simulation.BATCH_DECISIONS = decisions in ("batch", "prefetch", "events")
+            main_simulation.PIPELINE.enabled = decisions in ("prefetch", "events")
+            main_simulation.TRIGGER_MODE = "events" if decisions == "events" else "random"
+            reset_db()
+            with SessionLocal() as db:
+                seed_companies(db)
+                seed_agents(db, max(n_active, 500))
+            main_simulation.market_engine = MarketEngine()
+            sim_time = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+
+            before = _llm_usage()
+            samples = asyncio.run(_run_ticks(sim_time, n_ticks, n_active, gap_ms))
+
+            # 틱당 LLM 호출 수/토큰 (프롬프트 압축, 배치 효과 측정용)
+            calls, tok_in, tok_out = (round((now - old) / n_ticks, 1) for now, old in zip(_llm_usage(), before))
+            results.append({"active_agents": n_active, "decisions": decisions, "llm_latency_ms": llm_latency_ms, "tick_gap_ms": gap_ms,
+                            "llm_calls_per_tick": calls, "input_tokens_per_tick": tok_in, "output_tokens_per_tick": tok_out,
+                            **summarize(samples)})
+            print(f"  - tick agents={n_active:<4} {decisions:<8} mean {results[-1]['mean_ms']}ms (p95 {results[-1]['p95_ms']}ms)"
+                  f" | LLM {calls} calls, {tok_in}/{tok_out} tokens per tick")
+    return results
+
+
+# ==========================================
+# 3-1. 배경 인구 (numpy struct-of-arrays) 1틱
+# ==========================================
+def bench_population(sizes, n_ticks: int) -> list:
+    results = []
+    tmp = tempfile.mkdtemp(prefix="population_")
+    try:
+        for n in sizes:
+            reset_db()
+            with SessionLocal() as db:
+                seed_companies(db)
+                tickers = [c.ticker for c in db.query(DBCompany).all()]
+                prices = np.array([p for _, p in db.query(DBCompany.ticker, DBCompany.current_price).all()])
+            path = os.path.join(tmp, str(n))
+            pop = Population.create(path, n, tickers, seed=0, prices=prices)
+            bytes_per_agent = sum(getattr(pop, f).nbytes for f in ("cash", "holdings", "fear", "greed", "safety", "social", "persona")) / n
+
+            # step: 판단 + 단일가 체결 + 정산 (순수 벡터 연산)
+            rng = np.random.default_rng(0)
+            zeros = np.zeros(len(tickers))
+            samples = []
+            for _ in range(n_ticks):
+                t0 = time.perf_counter()
+                pop.step(prices, zeros, zeros, rng)
+                samples.append(time.perf_counter() - t0)
+            results.append({"population": n, "mode": "step", "bytes_per_agent": round(bytes_per_agent, 1), **summarize(samples)})
+
+            # tick: 시세 반영 + 종목별 체결 기록 + memmap flush 까지 (run_background_market)
+            main_simulation.BACKGROUND_AGENTS, main_simulation.POPULATION_DIR = n, path
+            main_simulation.population = None
+            main_simulation.market_engine = MarketEngine()
+            sim_time = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+            samples = []
+            with SessionLocal() as db:
+                for _ in range(n_ticks):
+                    t0 = time.perf_counter()
+                    main_simulation.run_background_market(db, tickers, sim_time)
+                    samples.append(time.perf_counter() - t0)
+                    sim_time += timedelta(minutes=1)
+            results.append({"population": n, "mode": "tick", **summarize(samples)})
+            for row in results[-2:]:
+                print(f"  - population={n:<8} {row['mode']:<5} p50 {row['p50_ms']}ms (p95 {row['p95_ms']}ms)"
+                      + (f" | {row['bytes_per_agent']} B/agent" if "bytes_per_agent" in row else ""))
+    finally:
+        main_simulation.BACKGROUND_AGENTS, main_simulation.population = 0, None
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+# ==========================================
+# 4. API 엔드포인트 지연 (/api/companies, /api/chart, /api/rank)
+# ==========================================
+def bench_api(trade_counts, n_requests: int, invalidate_every: int = 0) -> list:
+    from fastapi.testclient import TestClient
+    import api
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    endpoints = ["/api/companies", f"/api/chart/{BENCH_TICKER}", "/api/rank"]
+    results = []
+    for n_trades in trade_counts:
+        reset_db()
+        with SessionLocal() as db:
+            seed_companies(db)
+            seed_agents(db, 500)
+            t0 = time.perf_counter()
+            seed_trades(db, n_trades)
+            print(f"  - seeded {n_trades:,} trades in {time.perf_counter() - t0:.1f}s")
+
+        with TestClient(api.app) as client:
+            for path in endpoints:
+                client.get(path)  # 워밍업
+                samples = []
+                for i in range(n_requests):
+                    if invalidate_every and i % invalidate_every == 0:
+                        RESPONSE_CACHE.invalidate_trades(BENCH_TICKER)  # 체결이 계속 들어오는 장중 흉내
+                    t0 = time.perf_counter()
+                    resp = client.get(path)
+                    samples.append(time.perf_counter() - t0)
+                    resp.raise_for_status()
+                results.append({"trades": n_trades, "endpoint": path, "bytes": len(resp.content),
+                                "cache_hit_ratio": round(RESPONSE_CACHE.hit_ratio(), 3), **summarize(samples)})
+                print(f"  - {path:<20} trades={n_trades:<8} p50 {results[-1]['p50_ms']}ms (p95 {results[-1]['p95_ms']}ms)"
+                      f" hit {results[-1]['cache_hit_ratio']:.0%}")
+                RESPONSE_CACHE.hits = RESPONSE_CACHE.misses = 0
+    return results
+
+
+# ==========================================
+# 3-2. 멘토 응답: 전부 기다리기 vs 스트리밍 (첫 결과까지 / 마지막까지)
+# ==========================================
+def bench_mentor_stream(runs: int, llm_latency_ms: float, jitter_ms: float, chunk_ms: float) -> list:
+    reset_db()
+    with SessionLocal() as db:
+        seed_companies(db)
+        obs = mentor_brain.gather_observation_data(db, BENCH_TICKER)
+
+    async def advice_gather():
+        t0 = time.perf_counter()
+        await asyncio.gather(*(mentor_brain.ask_mentor(m, obs) for m in mentor_brain.ADVICE_MENTORS))
+        return time.perf_counter() - t0, time.perf_counter() - t0
+
+    async def chat_full():
+        t0 = time.perf_counter()
+        await mentor_brain.chat_with_mentor("NEUTRAL", "지금 사도 될까요?")
+        return time.perf_counter() - t0, time.perf_counter() - t0
+
+    async def first_and_last(stream):
+        t0, first = time.perf_counter(), None
+        async for _ in stream:
+            first = first or time.perf_counter() - t0
+        return first, time.perf_counter() - t0
+
+    cases = {
+        "advice": (advice_gather, lambda: first_and_last(mentor_brain.stream_mentors_advice(obs))),
+        "chat": (chat_full, lambda: first_and_last(mentor_brain.stream_chat_with_mentor("NEUTRAL", "지금 사도 될까요?"))),
+    }
+    results = []
+    for endpoint, (blocking, streaming) in cases.items():
+        samples = {"blocking": [], "stream_first": [], "stream_last": []}
+        for i in range(runs):
+            # 시드를 바꿔 멘토별 지연이 매번 다르게 (같은 프롬프트 = 같은 지연)
+            set_llm_client(StubLLMClient(latency_ms=llm_latency_ms, jitter_ms=jitter_ms, seed=str(i), stream_chunk_ms=chunk_ms))
+            samples["blocking"].append(asyncio.run(blocking())[1])
+            set_llm_client(StubLLMClient(latency_ms=llm_latency_ms, jitter_ms=jitter_ms, seed=str(i), stream_chunk_ms=chunk_ms))
+            first, last = asyncio.run(streaming())
+            samples["stream_first"].append(first)
+            samples["stream_last"].append(last)
+        for mode, rows in samples.items():
+            results.append({"endpoint": endpoint, "mode": mode, **summarize(rows)})
+            print(f"  - {endpoint:<7} {mode:<13} p50 {results[-1]['p50_ms']}ms (p95 {results[-1]['p95_ms']}ms)")
+    return results
+
+
+# ==========================================
+# 4-1. 기동 시간 (새 인터프리터 import / 첫 응답 / preload 후 fork 된 워커의 첫 응답)
+# ==========================================
+_STARTUP_SCRIPT = r"""
+import os, sys, time, json
+t0 = time.perf_counter()
+import {module}
+out = {{"import_s": time.perf_counter() - t0}}
+if "{module}" == "api":
+    from fastapi.testclient import TestClient
+    def first_response():
+        t = time.perf_counter()
+        with TestClient(api.app) as client:
+            client.get("/api/companies").raise_for_status()
+        return time.perf_counter() - t
+    out["first_response_s"] = first_response()
+    # gunicorn --preload 와 같은 모델: 부모가 import만 해 둔 상태에서 fork → 자식이 요청 1건 처리 후 종료
+    forks = []
+    for _ in range({forks} if hasattr(os, "fork") else 0):
+        t = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            try: first_response()
+            finally: os._exit(0)
+        os.waitpid(pid, 0)
+        forks.append(time.perf_counter() - t)
+    out["fork_s"] = forks
+print(json.dumps(out))
+"""
+
+
+def bench_startup(n_runs: int, modules=("api", "main_simulation"), forks: int = 5) -> list:
+    results = []
+    for module in modules:
+        wall, imports, firsts, fork_samples = [], [], [], []
+        for _ in range(n_runs):
+            t0 = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT.format(module=module, forks=forks)],
+                                  capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            wall.append(time.perf_counter() - t0)
+            if proc.returncode != 0:
+                raise RuntimeError(f"{module} 기동 실패:\n{proc.stderr[-2000:]}")
+            out = json.loads(proc.stdout.strip().splitlines()[-1])
+            imports.append(out["import_s"])
+            if "first_response_s" in out:
+                firsts.append(out["first_response_s"])
+                fork_samples += out["fork_s"]
+        rows = [("process", wall), ("import", imports), ("first_response", firsts), ("fork_first_response", fork_samples)]
+        for mode, samples in rows:
+            if not samples: continue
+            results.append({"module": module, "mode": mode, **summarize(samples)})
+            print(f"  - {module:<16} {mode:<20} p50 {results[-1]['p50_ms']}ms (p95 {results[-1]['p95_ms']}ms)")
+    return results
+
+
+# ==========================================
+# 5. 결과 저장 및 이전 결과와 비교
+# ==========================================
+def _metric_key(suite: str, row: dict) -> str:
+    ident = {k: v for k, v in row.items() if k in ("depth", "mode", "module", "population", "active_agents", "decisions", "trades", "endpoint")}
+    return f"{suite}:" + ",".join(f"{k}={ident[k]}" for k in sorted(ident))
+
+
+def compare(current: dict, baseline_path: str, threshold: float) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    base_rows = {_metric_key(s, r): r for s, rows in baseline["results"].items() for r in rows}
+
+    regressions = 0
+    print(f"\n[Compare] baseline={baseline_path} (threshold +{threshold:.0%})")
+    for suite, rows in current["results"].items():
+        for row in rows:
+            key = _metric_key(suite, row)
+            old = base_rows.get(key)
+            if not old or not old.get("p50_ms"): continue
+            ratio = row["p50_ms"] / old["p50_ms"]
+            flag = "❌ REGRESSION" if ratio > 1 + threshold else "ok"
+            if ratio > 1 + threshold: regressions += 1
+            print(f"  {key:<60} p50 {old['p50_ms']:>10} → {row['p50_ms']:>10} ms  x{ratio:.2f} {flag}")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="엔진/시뮬레이션 틱/API 핫패스 벤치마크 (로컬 DB + 스텁 LLM)")
+    parser.add_argument("--suites", default="engine,book,tick,population,api,mentor,startup", help="실행할 묶음 (engine,book,tick,population,api,mentor,startup)")
+    parser.add_argument("--depths", default="10,100,1000,5000")
+    parser.add_argument("--orders", type=int, default=200, help="깊이별 측정 주문 수")
+    parser.add_argument("--agents", default="15,100,500")
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="스텁 LLM 응답 지연 (지연 전파 측정용)")
+    parser.add_argument("--tick-gap-ms", type=float, default=0.0, help="틱 사이 휴식 (실제 루프는 1000, 선행 판단이 이 시간에 진행됨)")
+    parser.add_argument("--decision-modes", default="single,batch,prefetch,events", help="틱 벤치 판단 방식 (single,batch,prefetch,events)")
+    parser.add_argument("--population", default="10000,100000", help="배경 인구 규모")
+    parser.add_argument("--trades", default="10000,1000000")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--invalidate-every", type=int, default=0, help="API 벤치에서 N요청마다 체결 무효화 (0=캐시 최상 조건)")
+    parser.add_argument("--mentor-runs", type=int, default=10, help="멘토 스트리밍 측정 반복")
+    parser.add_argument("--mentor-latency-ms", type=float, default=800.0, help="멘토 벤치 스텁 LLM 첫 토큰 지연")
+    parser.add_argument("--mentor-jitter-ms", type=float, default=600.0, help="멘토별 지연 흔들림 (느린 멘토가 전체를 붙잡는 정도)")
+    parser.add_argument("--mentor-chunk-ms", type=float, default=20.0, help="스트리밍 조각 사이 간격")
+    parser.add_argument("--startup-runs", type=int, default=5, help="기동 시간 측정 반복 (새 프로세스)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="이전 결과 JSON과 p50 비교")
+    parser.add_argument("--threshold", type=float, default=0.2, help="회귀로 판단할 p50 증가율")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    ints = lambda s: [int(x) for x in s.split(",") if x]
+    suites = set(args.suites.split(","))
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "storage_backend": os.environ["STORAGE_BACKEND"],
+        "params": vars(args),
+        "results": {},
+    }
+
+    if "engine" in suites:
+        print("\n[1] MarketEngine.place_order")
+        report["results"]["engine"] = bench_place_order(ints(args.depths), args.orders)
+    if "book" in suites:
+        print("\n[1-1] OrderBook (dict vs slots)")
+        report["results"]["book"] = bench_order_book(ints(args.depths), args.orders)
+    if "tick" in suites:
+        print("\n[2] run_simulation_tick")
+        report["results"]["tick"] = bench_simulation_tick(ints(args.agents), args.ticks, args.llm_latency_ms,
+                                                         args.decision_modes.split(","), args.tick_gap_ms)
+    if "population" in suites:
+        print("\n[2-1] Background population (numpy)")
+        report["results"]["population"] = bench_population(ints(args.population), max(args.ticks, 20))
+    if "api" in suites:
+        print("\n[3] API endpoints")
+        report["results"]["api"] = bench_api(ints(args.trades), args.requests, args.invalidate_every)
+    if "mentor" in suites:
+        print("\n[3-2] Mentor responses (blocking vs SSE streaming)")
+        report["results"]["mentor"] = bench_mentor_stream(args.mentor_runs, args.mentor_latency_ms,
+                                                          args.mentor_jitter_ms, args.mentor_chunk_ms)
+    if "startup" in suites:
+        print("\n[4] Cold start / worker fork")
+        report["results"]["startup"] = bench_startup(args.startup_runs)
+    gc.collect()
+    report["metrics"] = REGISTRY.snapshot()  # 실행 중 누적된 핫패스 계측값 (DB 왕복, LLM 토큰 등)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 결과 저장: {args.output}")
+
+    if args.compare:
+        sys.exit(1 if compare(report, args.compare, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
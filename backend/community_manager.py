@@ -1,7 +1,6 @@
 import random
-from sqlalchemy.orm import Session
-from database import DBDiscussion
 from datetime import datetime
+from discussion_service import DISCUSSIONS
 
 # ---------------------------------------------------------
 # 1. 페르소나별 대사 템플릿 (성향 및 현실성 반영 대폭 확장)
@@ -134,7 +133,7 @@ def get_agent_type(agent_id):
     elif mod < 8: return "CONTRARIAN" # 20% 역발상
     else: return "SPECULATOR"        # 20% 투기/단타꾼
 
-def post_comment(db: Session, agent_id: str, ticker: str, action: str, company_name: str, sim_time: datetime = None):
+def post_comment(agent_id: str, ticker: str, action: str, company_name: str, sim_time: datetime = None):
     # 🎲 글 쓰는 확률 (투기꾼일수록 말이 많음)
     agent_type = get_agent_type(agent_id)
     
@@ -169,16 +168,8 @@ def post_comment(db: Session, agent_id: str, ticker: str, action: str, company_n
     # 내용 완성 (가끔 템플릿에 {name} 포맷팅이 있을 경우를 위해)
     content = template.replace("{name}", company_name)
 
-    # DB에 저장
-    new_post = DBDiscussion(
-        ticker=ticker,
-        agent_id=agent_id,
-        content=content,
-        sentiment=sentiment,
-        created_at=sim_time or datetime.now()
-    )
-    db.add(new_post)
-    db.commit()
+    # 링버퍼에 바로 반영, DB에는 틱 끝에 한 번에 저장 (DISCUSSIONS.flush)
+    DISCUSSIONS.add(ticker, agent_id, content, sentiment, sim_time or datetime.now())
     
     # 서버 로그 확인용 (선택)
     # print(f"💬 [{agent_type}] {agent_id}: {content}")
\ No newline at end of file
@@ -2,8 +2,11 @@ import streamlit as st
 import pandas as pd
 import time
 import plotly.graph_objects as go
-from database import SessionLocal, DBTrade, DBCompany, DBAgent, DBNews
+from database import SessionLocal, DBTrade, DBCompany
 from sqlalchemy import desc
+from leaderboard import get_leaderboard
+from indicators import get_indicators
+from news_cache import get_news_cache
 
 # --------------------------------------------------------------------------
 # 1. 페이지 설정
@@ -26,21 +29,24 @@ st.markdown("""
 # --------------------------------------------------------------------------
 st.sidebar.title("🔍 Market Watch")
 
-# DB 세션 연결
-db = SessionLocal()
+# 종목 목록은 거의 바뀌지 않으므로 rerun마다 세션을 열지 않고 캐시 (세션은 조회 직후 닫음)
+@st.cache_data(ttl=60, show_spinner=False)
+def load_ticker_names() -> dict:
+    with SessionLocal() as db:
+        return {ticker: name for ticker, name in db.query(DBCompany.ticker, DBCompany.name).all()}
 
 try:
-    all_companies = db.query(DBCompany).all()
+    ticker_name_map = load_ticker_names()
 except Exception as e:
     st.error("DB 연결 중입니다... 잠시 후 다시 시도해주세요.")
     time.sleep(2)
     st.rerun()
 
-if not all_companies:
+if not ticker_name_map:
+    load_ticker_names.clear()  # 빈 결과는 캐시하지 않음 (초기화 후 바로 보이도록)
     st.error("DB가 비어있습니다. 초기화가 필요합니다.")
     st.stop()
 
-ticker_name_map = {c.ticker: c.name for c in all_companies}
 ticker_list = list(ticker_name_map.keys())
 
 # --- Session State로 선택값 유지 ---
@@ -77,29 +83,20 @@ def run_live_dashboard(ticker, view_count):
         # DB 데이터 조회
         company = db.query(DBCompany).filter(DBCompany.ticker == ticker).first()
         trades = db.query(DBTrade).filter(DBTrade.ticker == ticker).order_by(desc(DBTrade.timestamp)).limit(view_count).all()
-        company_news = db.query(DBNews).filter(DBNews.company_name == company.name).order_by(desc(DBNews.id)).limit(5).all()
-        market_news = db.query(DBNews).order_by(desc(DBNews.id)).limit(10).all()
+        news_cache = get_news_cache(db)
+        company_news = news_cache.recent(ticker, 5)
+        market_news = news_cache.market(10)
         
-        # 자산 랭킹 계산
-        agents = db.query(DBAgent).all()
-        rich_list = []
-        for ag in agents:
-            if ag.agent_id == "MARKET_MAKER": continue 
-            
-            stock_val = 0
-            if ag.portfolio:
-                for tik, qty in ag.portfolio.items():
-                    c_info = db.query(DBCompany).filter(DBCompany.ticker == tik).first()
-                    if c_info:
-                        stock_val += qty * c_info.current_price
-            
-            rich_list.append({
-                "ID": ag.agent_id,
-                "Total": int(ag.cash_balance + stock_val),
-                "Cash": int(ag.cash_balance),
-                "Stock": int(stock_val)
-            })
-        rich_list.sort(key=lambda x: x["Total"], reverse=True)
+        ind = get_indicators(db, max_age=0).get(ticker)
+
+        # 자산 랭킹 (프로세스 공용 랭킹을 RESYNC_SEC 주기로만 재동기화 - 1초마다 전체 재평가하지 않음)
+        board = get_leaderboard(db)
+        rich_list = [{
+            "ID": row["agent_id"],
+            "Total": int(row["total_asset"]),
+            "Cash": int(row["cash"]),
+            "Stock": int(row["stock_value"])
+        } for row in board.top(7)]
 
         # --- UI 그리기 ---
         st.title(f"🌏 {company.name} ({ticker})")
@@ -117,6 +114,13 @@ def run_live_dashboard(ticker, view_count):
                 vol = sum([t.quantity for t in trades]) if trades else 0
                 st.metric("구간 거래량", f"{vol:,}주")
 
+            # 최근 체결 지표 (체결마다 증분 갱신)
+            i1, i2, i3, i4 = st.columns(4)
+            with i1: st.metric("추세", ind["trend"])
+            with i2: st.metric("VWAP", f"{ind['vwap']:,.0f}원" if ind["vwap"] else "-")
+            with i3: st.metric("EMA", f"{ind['ema']:,.0f}원" if ind["ema"] else "-")
+            with i4: st.metric("변동성", f"{ind['volatility_pct']:.2f}%")
+
             st.subheader(f"📈 실시간 시세 (최근 {view_count}건)")
             if trades:
                 data = [{"time": t.timestamp, "price": t.price} for t in trades][::-1]
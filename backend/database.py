@@ -1,34 +1,57 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, JSON
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Index, ForeignKey
+from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from datetime import datetime
+from storage import resolve_backend
+from domain_models import AgentRole
+from metrics import instrument_db_engine
 
 load_dotenv()
 
 # ---------------------------------------------------------
-# DB 연결 설정 (Azure PostgreSQL)
+# DB 연결 설정 (백엔드별 풀/PRAGMA 튜닝은 storage.py 참고)
+# - 엔진은 첫 세션/첫 접근 때 만듦 → import 만으로는 DB에 붙지 않음 (테스트/워커 기동이 빠름)
+# - gunicorn --preload 로 fork 해도 부모가 연 커넥션 풀을 자식이 물려받지 않음
+# - 예전처럼 `from database import engine, STORAGE` 도 동작 (모듈 __getattr__, PEP 562)
 # ---------------------------------------------------------
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
-
-if not SQLALCHEMY_DATABASE_URL:
-    raise ValueError("❌ .env 파일에 'DATABASE_URL'이 없습니다!")
-
-# SQLAlchemy는 postgres:// 대신 postgresql://을 사용해야 함
-if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
-    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
-
-# 🔥 [수정] 15~30명 규모에 맞춘 최적화된 DB 풀 설정
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=20,         # 항시 열어두는 DB 문 20개 (에이전트 수에 맞춤)
-    max_overflow=30,      # 순간적으로 요청이 몰릴 때 30개 추가 오픈 (총 50개 동시 접속)
-    pool_timeout=30,      # 대기 시간 30초 (정상적인 상황에선 30초면 충분함)
-    pool_recycle=1800     # 30분(1800초)마다 안 쓰는 연결 정리하여 Azure DB 끊김 방지
-)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+_storage = None
+_engine = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = resolve_backend()
+    return _storage
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        storage = get_storage()
+        _engine = storage.build_engine()
+        instrument_db_engine(_engine)  # 틱당 DB 왕복 횟수 측정
+        # 인메모리 백엔드는 매 실행마다 빈 DB이므로 테이블을 바로 만들어 둠
+        if storage.ephemeral:
+            Base.metadata.create_all(bind=_engine)
+    return _engine
+
+
+def __getattr__(name):
+    if name == "engine": return get_engine()
+    if name == "STORAGE": return get_storage()
+    if name == "SQLALCHEMY_DATABASE_URL": return get_storage().url
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class _LazySession(Session):
+    """bind 없이 만들면 그때 엔진을 붙임 (SessionLocal() 호출 시점까지 연결을 미룸)"""
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
+
+
+SessionLocal = sessionmaker(class_=_LazySession, autocommit=False, autoflush=False)
 Base = declarative_base()
 
 # ---------------------------------------------------------
@@ -52,7 +75,59 @@ class DBAgent(Base):
     agent_id = Column(String, unique=True, index=True)
     psychology = Column(JSON, default={})
     cash_balance = Column(Float, default=1000000.0) # 에이전트 기본금 100만 유지
-    portfolio = Column(JSON, default={})
+    portfolio = Column(JSON, default={})  # (레거시) 보유 주식은 positions 테이블로 이전 - migrate_positions.py
+    # 역할 비트마스크 (AgentRole). 생성 시 agent_id 규칙으로 자동 설정 - 기존 DB는 migrate_agent_ids.py
+    role_flags = Column(Integer, default=lambda ctx: int(AgentRole.for_agent_id(ctx.get_current_parameters().get("agent_id") or "")))
+
+class DBPosition(Base):
+    __tablename__ = "positions"
+
+    # 에이전트 x 종목 1행 (체결 시 qty/avg_cost를 UPDATE로 바로 증감)
+    agent_id = Column(String, primary_key=True)
+    ticker = Column(String, primary_key=True)
+    qty = Column(Integer, nullable=False, default=0)
+    avg_cost = Column(Float, nullable=False, default=0.0)
+
+    # "X 종목을 누가 들고 있나" / "에이전트 보유 총량" 조회용
+    __table_args__ = (Index("ix_positions_ticker_qty", "ticker", "qty"),)
+
+class DBAgentMemory(Base):
+    __tablename__ = "agent_memories"
+
+    # 에이전트 x 종목별 최근 의사결정 (agent_memory.py가 최근 N개만 유지)
+    id = Column(Integer, primary_key=True)
+    agent_id = Column(String, nullable=False)
+    ticker = Column(String, nullable=False)
+    action = Column(String)
+    order_desc = Column(String)
+    thought = Column(String)
+    price = Column(Float)
+    quantity = Column(Integer)
+    sim_time = Column(DateTime)
+
+    __table_args__ = (Index("ix_agent_memories_agent_ticker", "agent_id", "ticker", "id"),)
+
+class DBUserAnalytics(Base):
+    __tablename__ = "user_analytics"
+
+    # 유저별 매매 습관 누적치 (user_analytics.py가 유저 체결마다 증분 갱신) + 마지막 투자 진단 캐시
+    agent_id = Column(String, primary_key=True)
+    trades = Column(Integer, nullable=False, default=0)
+    buys = Column(Integer, nullable=False, default=0)
+    sells = Column(Integer, nullable=False, default=0)
+    bought_amount = Column(Float, nullable=False, default=0.0)
+    sold_amount = Column(Float, nullable=False, default=0.0)
+    realized_pnl = Column(Float, nullable=False, default=0.0)
+    wins = Column(Integer, nullable=False, default=0)
+    losses = Column(Integer, nullable=False, default=0)
+    closed_qty = Column(Integer, nullable=False, default=0)       # 평균 보유기간 = hold_seconds / closed_qty
+    hold_seconds = Column(Float, nullable=False, default=0.0)     # 수량 가중 보유시간 합
+    panic_sells = Column(Integer, nullable=False, default=0)
+    first_trade_at = Column(DateTime)
+    last_trade_at = Column(DateTime)
+    lots = Column(JSON, default={})                # {ticker: [수량, 평단, 평균 진입시각(epoch)]}
+    solution = Column(JSON)                        # 마지막으로 생성한 진단 카드
+    solution_features = Column(JSON)               # 그 진단을 만들 때의 지표 (변화량 비교용)
 
 class DBTrade(Base):
     __tablename__ = "trades"
@@ -61,8 +136,10 @@ class DBTrade(Base):
     ticker = Column(String, index=True)
     price = Column(Float)
     quantity = Column(Integer)
-    buyer_id = Column(String)
+    buyer_id = Column(String)   # (레거시) 문자열 id - 새 체결은 buyer_uid/seller_uid (agents.id)만 기록
     seller_id = Column(String)
+    buyer_uid = Column(Integer, index=True)   # NULL = 배경 인구(population) 내부 단일가 체결
+    seller_uid = Column(Integer, index=True)
     timestamp = Column(DateTime, default=datetime.now)
 
 # ---------------------------------------------------------
@@ -72,6 +149,8 @@ class DBNews(Base):
     __tablename__ = "news_pool" 
 
     id = Column(Integer, primary_key=True, index=True)
+    # 조회 키는 ticker (company_name은 표시용) - 기존 DB는 migrate_news_ticker.py
+    ticker = Column(String, ForeignKey("companies.ticker"), index=True)
     company_name = Column(String, nullable=False)
     title = Column(String, nullable=False)
     summary = Column(String)
@@ -109,8 +188,8 @@ class DBDiscussion(Base):
 # ---------------------------------------------------------
 def init_db():
     try:
-        Base.metadata.create_all(bind=engine)
-        print("✅ [Azure PostgreSQL] 테이블 생성 및 연결 완료")
+        Base.metadata.create_all(bind=get_engine())
+        print(f"✅ [{get_storage().label}] 테이블 생성 및 연결 완료")
     except Exception as e:
         print(f"❌ 테이블 생성 실패: {e}")
 
@@ -0,0 +1,75 @@
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+from metrics import PREFETCH_DECISIONS_TOTAL, PREFETCH_WAIT_SECONDS
+
+logger = logging.getLogger("DecisionPipeline")
+
+# ---------------------------------------------------------
+# 에이전트 판단 선행 처리 (speculative prefetch)
+# - 이번 틱 주문을 체결하는 동안 다음 틱 에이전트들의 LLM 판단을 미리 시작
+# - 실행 시점에 판단 당시 가격과 비교해 많이 움직였으면 다시 판단(redecide) 또는 폐기(discard)
+# ---------------------------------------------------------
+PREFETCH_ENABLED = os.getenv("AGENT_PREFETCH", "true").lower() in ("1", "true", "yes")
+STALE_PRICE_PCT = float(os.getenv("PREFETCH_STALE_PCT", "0.02"))      # 2% 넘게 움직이면 낡은 판단
+STALE_POLICY = os.getenv("PREFETCH_STALE_POLICY", "redecide").lower()  # redecide | discard
+
+
+@dataclass
+class PendingDecision:
+    agent_id: str
+    ticker: str
+    decision: dict
+    decided_price: float      # 판단할 때 프롬프트에 들어간 현재가
+    decided_at: float = 0.0   # time.monotonic()
+
+    def is_stale(self, current_price: float, threshold: float = STALE_PRICE_PCT) -> bool:
+        if self.decided_price <= 0: return True
+        return abs(current_price - self.decided_price) / self.decided_price > threshold
+
+
+class DecisionPipeline:
+    def __init__(self, enabled: bool = PREFETCH_ENABLED, threshold: float = STALE_PRICE_PCT, policy: str = STALE_POLICY):
+        self.enabled, self.threshold, self.policy = enabled, threshold, policy
+        self._task: Optional[asyncio.Task] = None
+
+    def prefetch(self, decide_coro):
+        """다음 틱 판단을 백그라운드로 시작 (이전 선행 작업이 남아 있으면 취소)
+        이번 틱에 주문하는 에이전트가 다음 틱에 또 뽑히지 않게 하는 건 호출하는 쪽 선발(exclude)에서 처리"""
+        self.cancel()
+        self._task = asyncio.create_task(decide_coro)
+
+    async def take(self) -> Optional[list]:
+        """선행 판단 결과 수거. 없으면 None (첫 틱 / 비활성 / 실패)"""
+        task, self._task = self._task, None
+        if task is None: return None
+        start = time.perf_counter()
+        try:
+            return await task
+        except Exception as e:
+            logger.debug(f"선행 판단 실패: {e}")
+            return None
+        finally:
+            # 대기 시간이 0에 가까울수록 LLM 지연이 체결/DB 작업 뒤에 잘 숨은 것
+            PREFETCH_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+    def split_stale(self, pending: list, prices: dict):
+        """(그대로 실행할 것, 낡은 것) 분리 + 결과별 카운트"""
+        fresh, stale = [], []
+        for p in pending:
+            (stale if p.is_stale(prices.get(p.ticker, 0.0), self.threshold) else fresh).append(p)
+        PREFETCH_DECISIONS_TOTAL.inc(len(fresh), result="fresh")
+        if stale:
+            PREFETCH_DECISIONS_TOTAL.inc(len(stale), result=f"stale_{self.policy}")
+        return fresh, stale
+
+    def cancel(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+
+PIPELINE = DecisionPipeline()
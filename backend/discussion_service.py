@@ -0,0 +1,168 @@
+import os
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import DBDiscussion
+from metrics import record_cache
+from response_cache import RESPONSE_CACHE
+
+# ---------------------------------------------------------
+# 종토방/라운지 글 서비스
+# - 종목별 + GLOBAL 최근 글을 고정 크기 링버퍼로 메모리에 유지 → 최근 글 조회는 DB 안 감
+# - 쓰기는 링버퍼에 바로 넣고(같은 프로세스는 즉시 보임) DB INSERT는 틱 끝에 한 번에 (flush)
+# - 링버퍼 안의 BULL/BEAR 개수는 넣고 밀려날 때 증감 (에이전트 여론 요약용)
+# - 다른 프로세스(API 유저 글 등)가 쓴 글은 id 꼬리 읽기로 반영
+# - API 스레드풀 여러 개가 같은 링버퍼를 만지므로 상태 변경/조회는 락 안에서 (DB 왕복은 락 밖)
+# ---------------------------------------------------------
+RING_SIZE = int(os.getenv("DISCUSSION_RING_SIZE", "50"))   # 가장 긴 조회(라운지 50건)에 맞춤
+SYNC_INTERVAL_SEC = float(os.getenv("DISCUSSION_SYNC_SEC", "1.0"))
+
+
+@dataclass
+class Post:
+    ticker: str
+    agent_id: str
+    content: str
+    sentiment: str
+    created_at: datetime
+    id: Optional[int] = None   # DB에 저장되면 채워짐
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.ticker, row.agent_id, row.content, row.sentiment, row.created_at, row.id)
+
+
+class DiscussionService:
+    def __init__(self, size: int = RING_SIZE):
+        self.size = size
+        self._rings = {}       # ticker -> deque[Post] (오래된 것 → 최신)
+        self._counts = {}      # ticker -> {"BULL": n, "BEAR": n} (링버퍼 안 기준)
+        self._pending = []     # 아직 DB에 안 쓴 글
+        self._own_ids = set()  # 이 프로세스가 쓴 id (꼬리 읽기에서 중복 방지)
+        self._last_id = None   # 여기까지 반영한 stock_discussions.id
+        self.synced_at = 0.0
+        self._lock = threading.RLock()
+
+    def _append(self, post: Post):
+        ring = self._rings.get(post.ticker)
+        if ring is None:
+            ring = self._rings[post.ticker] = deque(maxlen=self.size)
+        counts = self._counts.setdefault(post.ticker, {})
+        if len(ring) == ring.maxlen:
+            old = ring[0].sentiment
+            counts[old] = counts.get(old, 0) - 1
+        ring.append(post)
+        counts[post.sentiment] = counts.get(post.sentiment, 0) + 1
+
+    # ---------- 쓰기 ----------
+    def add(self, ticker: str, agent_id: str, content: str, sentiment: str, created_at: datetime = None) -> Post:
+        post = Post(ticker, agent_id, content, sentiment, created_at or datetime.now())
+        with self._lock:
+            self._append(post)
+            self._pending.append(post)
+        return post
+
+    def flush(self, db: Session) -> int:
+        """쌓인 글을 한 번에 INSERT (RETURNING으로 id까지 받아옴)"""
+        with self._lock:
+            if not self._pending: return 0
+            pending, self._pending = self._pending, []
+        rows = [DBDiscussion(ticker=p.ticker, agent_id=p.agent_id, content=p.content, sentiment=p.sentiment,
+                             created_at=p.created_at) for p in pending]
+        db.add_all(rows)
+        ids = []
+        try:
+            db.flush()
+            # 커밋 전에 내 id로 등록 → 커밋 직후 다른 스레드의 꼬리 읽기가 같은 글을 다시 넣지 않음
+            with self._lock:
+                for post, row in zip(pending, rows):
+                    post.id = row.id
+                    ids.append(row.id)
+                self._own_ids.update(ids)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for post in pending:
+                    post.id = None
+                self._own_ids.difference_update(ids)
+                self._pending = pending + self._pending  # 다음 틱에 다시 시도
+            raise
+        RESPONSE_CACHE.invalidate(*{f"posts:{p.ticker}" for p in pending})
+        return len(pending)
+
+    # ---------- 다른 프로세스 글 반영 ----------
+    def sync_from_db(self, db: Session):
+        with self._lock:
+            start = self._last_id
+            if start is None:
+                # 최초: 종목별 최근 size건으로 워밍업 (ROW_NUMBER 윈도우 1번, 1회라 락을 잡은 채로)
+                self._last_id = db.query(func.coalesce(func.max(DBDiscussion.id), 0)).scalar()
+                rn = func.row_number().over(partition_by=DBDiscussion.ticker, order_by=DBDiscussion.id.desc()).label("rn")
+                ranked = db.query(DBDiscussion, rn).filter(DBDiscussion.id <= self._last_id).subquery()
+                rows = db.query(ranked).filter(ranked.c.rn <= self.size).order_by(ranked.c.ticker, ranked.c.id).all()
+                warm, self._rings, self._counts = self._rings, {}, {}
+                for row in rows:
+                    self._append(Post.from_row(row))
+                for ring in warm.values():  # 워밍업 전에 이 프로세스에서 쓰고 아직 저장(커밋) 안 한 글은 뒤에 이어 붙임
+                    for post in ring:
+                        if post.id is None or post.id > self._last_id:
+                            self._append(post)
+                self._own_ids = {i for i in self._own_ids if i > self._last_id}
+                self.synced_at = time.monotonic()
+                return
+
+        # 꼬리 읽기는 락 밖에서, 반영은 락 안에서 (그 사이 다른 스레드가 반영한 id는 건너뜀)
+        rows = db.query(DBDiscussion).filter(DBDiscussion.id > start).order_by(DBDiscussion.id).all()
+        with self._lock:
+            if self._last_id is None: return  # 읽는 사이 reset
+            for row in rows:
+                if row.id <= self._last_id: continue
+                self._last_id = row.id
+                if row.id in self._own_ids:
+                    self._own_ids.discard(row.id)
+                    continue
+                self._append(Post.from_row(row))
+            self.synced_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._rings, self._counts, self._pending, self._own_ids = {}, {}, [], set()
+            self._last_id, self.synced_at = None, 0.0
+
+    # ---------- 조회 (DB 안 감) ----------
+    def recent(self, ticker: str, n: int = 5) -> list:
+        """최신순 최근 n건"""
+        with self._lock:
+            ring = self._rings.get(ticker)
+            record_cache("discussion", hit=ring is not None)
+            if not ring: return []
+            return [ring[-i] for i in range(1, min(n, len(ring)) + 1)]
+
+    def sentiment(self, ticker: str) -> dict:
+        """최근 size건 안의 {"BULL": n, "BEAR": n}"""
+        with self._lock:
+            counts = self._counts.get(ticker, {})
+            return {"BULL": counts.get("BULL", 0), "BEAR": counts.get("BEAR", 0)}
+
+
+DISCUSSIONS = DiscussionService()
+_sync_lock = threading.Lock()
+
+
+def _stale(max_age: float) -> bool:
+    return DISCUSSIONS._last_id is None or time.monotonic() - DISCUSSIONS.synced_at > max_age
+
+
+def get_discussions(db: Session, max_age: float = SYNC_INTERVAL_SEC) -> DiscussionService:
+    """동시에 여러 스레드가 오래됐다고 봐도 한 스레드씩만 읽고, 락을 얻은 뒤 다시 확인 (indicators.get_indicators 와 같은 방식)"""
+    if _stale(max_age):
+        with _sync_lock:
+            if _stale(max_age):
+                DISCUSSIONS.sync_from_db(db)
+    return DISCUSSIONS
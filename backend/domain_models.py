@@ -1,4 +1,4 @@
-from enum import Enum
+from enum import Enum, IntFlag
 from typing import List, Dict, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
@@ -18,6 +18,21 @@ class OrderType(str, Enum):
     LIMIT = "LIMIT"   # 특정 가격에 사겠다
     MARKET = "MARKET" # 지금 당장 사겠다
 
+class AgentRole(IntFlag):
+    """에이전트 역할 비트마스크 (agents.role_flags)"""
+    HUMAN = 1          # USER_xxx (실제 유저, VIP 유동성 대상)
+    MARKET_MAKER = 2
+    WHALE = 4          # WHALE_xxx
+    CITIZEN = 8        # 그 외 일반 에이전트
+
+    @classmethod
+    def for_agent_id(cls, agent_id: str) -> "AgentRole":
+        """문자열 id 규칙으로 역할 추정 (role_flags가 비어 있는 예전 행 / 신규 생성 기본값)"""
+        if agent_id.startswith("USER_"): return cls.HUMAN
+        if agent_id == "MARKET_MAKER": return cls.MARKET_MAKER
+        if agent_id.startswith("WHALE_"): return cls.WHALE
+        return cls.CITIZEN
+
 # ==========================================
 # 2. Core Models (데이터 구조 정의)
 # ==========================================
@@ -43,6 +58,12 @@ class AgentState(BaseModel):
     greed_index: float = Field(0.0, description="탐욕 지수")
     current_context: Optional[str] = Field(None, description="현재 행동 원인")
 
+    @classmethod
+    def from_psychology(cls, psychology: Optional[dict]) -> "AgentState":
+        """DB psychology JSON에서 정적 성향 필드만 골라 생성 (기억/기타 키는 무시)"""
+        fields = getattr(cls, "model_fields", None) or cls.__fields__
+        return cls(**{k: v for k, v in (psychology or {}).items() if k in fields})
+
 class Agent(BaseModel):
     """
     시뮬레이션 참여자 (에이전트)
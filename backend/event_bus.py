@@ -0,0 +1,137 @@
+import os
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import DBDiscussion
+from positions import holders_of
+from metrics import MARKET_EVENTS_TOTAL, AGENT_TRIGGERS_TOTAL
+
+# ---------------------------------------------------------
+# 시장 이벤트 버스 + 이벤트 기반 에이전트 호출
+# - 가격 급변: 엔진 체결 훅 (같은 프로세스)
+# - 큰 뉴스: 시뮬레이션 틱이 비축 뉴스를 발행할 때 훅 (news_service.NEWS_PUBLISHER)
+# - 종토방 글 폭주: 다른 프로세스가 쓰므로 DB를 id 기준으로 꼬리 읽기(tail)
+# - 보유자 + 관심 페르소나만 깨워서 "반응할 거리가 있는" 에이전트에게 LLM 호출을 씀
+# ---------------------------------------------------------
+PRICE_MOVE_PCT = float(os.getenv("EVENT_PRICE_MOVE_PCT", "0.01"))     # 기준가 대비 1% 이상 움직이면
+NEWS_IMPACT_MIN = int(os.getenv("EVENT_NEWS_IMPACT_MIN", "50"))        # |impact_score| 50 이상 뉴스
+POST_BURST_COUNT = float(os.getenv("EVENT_POST_BURST_COUNT", "5"))     # 틱마다 절반씩 식는 글 열기가 5 이상
+AGENTS_PER_EVENT = int(os.getenv("EVENT_AGENTS_PER_EVENT", "5"))
+BASELINE_AGENTS = int(os.getenv("EVENT_BASELINE_AGENTS", "3"))         # 이벤트가 없어도 움직이는 최소 인원
+
+# 페르소나별로 깨어나는 이벤트 주제 (보유자는 보유 종목의 모든 이벤트에 반응)
+PERSONA_TOPICS = {
+    "Value Investor (가치 투자자)": {"news", "price_down"},
+    "Institutional Investor (기관 투자자)": {"news"},
+    "Contrarian Investor (역발상 투자자)": {"price_up", "price_down", "post_burst"},
+    "Aggressive Speculator (공격적 투기꾼)": {"price_up", "post_burst", "news"},
+}
+
+
+@dataclass
+class MarketEvent:
+    kind: str          # price_move | news | post_burst
+    ticker: str
+    strength: float    # 정렬용 (변동률 %, |impact|, 글 열기)
+    detail: dict = field(default_factory=dict)
+
+    @property
+    def topic(self) -> str:
+        if self.kind == "price_move":
+            return "price_up" if self.detail.get("move", 0) > 0 else "price_down"
+        return self.kind
+
+
+class EventBus:
+    def __init__(self):
+        self._queue = deque(maxlen=1000)
+        self._ref_prices = {}   # ticker -> 마지막 이벤트 기준가
+        self._post_heat = {}    # ticker -> 감쇠 누적 글 수
+        self._last_post_id = None
+
+    def publish(self, event: MarketEvent):
+        self._queue.append(event)
+        MARKET_EVENTS_TOTAL.inc(kind=event.kind)
+
+    def drain(self) -> list:
+        """쌓인 이벤트 수거. 같은 (주제, 종목)은 가장 강한 것 하나로 합침"""
+        strongest = {}
+        for ev in self._queue:
+            key = (ev.topic, ev.ticker)
+            if key not in strongest or ev.strength > strongest[key].strength:
+                strongest[key] = ev
+        self._queue.clear()
+        return list(strongest.values())
+
+    # ---------- 1. 엔진 훅 ----------
+    def observe_price(self, ticker: str, price: float):
+        ref = self._ref_prices.setdefault(ticker, price)
+        if ref <= 0: return
+        move = (price - ref) / ref
+        if abs(move) >= PRICE_MOVE_PCT:
+            self._ref_prices[ticker] = price
+            self.publish(MarketEvent("price_move", ticker, abs(move) * 100, {"move": move, "price": price}))
+
+    def observe_news(self, ticker: str, news_id: int, impact: int):
+        """뉴스 발행 훅 (발행은 시뮬레이션 틱에서만 일어나므로 DB를 다시 읽을 필요 없음)"""
+        if abs(impact or 0) >= NEWS_IMPACT_MIN:
+            self.publish(MarketEvent("news", ticker, abs(impact), {"news_id": news_id, "impact": impact}))
+
+    # ---------- 2. DB 꼬리 읽기 (종토방) ----------
+    def poll_db(self, db: Session):
+        # 첫 호출은 현재 끝 id만 기억 (과거 이력은 재생하지 않음)
+        if self._last_post_id is None:
+            self._last_post_id = db.query(func.coalesce(func.max(DBDiscussion.id), 0)).scalar()
+            return
+
+        counts = {}
+        for row in db.query(DBDiscussion.id, DBDiscussion.ticker).filter(DBDiscussion.id > self._last_post_id).order_by(DBDiscussion.id):
+            self._last_post_id = row.id
+            if row.ticker and row.ticker != "GLOBAL":
+                counts[row.ticker] = counts.get(row.ticker, 0) + 1
+        for ticker in set(self._post_heat) | set(counts):
+            heat = self._post_heat.get(ticker, 0.0) / 2 + counts.get(ticker, 0)
+            if heat >= POST_BURST_COUNT:
+                self.publish(MarketEvent("post_burst", ticker, heat, {"posts": counts.get(ticker, 0)}))
+                heat = 0.0
+            self._post_heat[ticker] = heat
+
+
+EVENT_BUS = EventBus()
+
+
+# ---------------------------------------------------------
+# 3. 이벤트 → 에이전트 배정
+# ---------------------------------------------------------
+def schedule_triggered(db: Session, events: list, all_agents: list, all_tickers: list, n_active: int,
+                       persona_of, exclude=()) -> list:
+    """강한 이벤트부터 보유자 → 관심 페르소나 순으로 깨움. 최대 n_active명 [(agent_id, ticker)]"""
+    # 순서는 all_agents 기준 유지 (set 순회 순서에 따라 결과가 달라지지 않도록)
+    eligible = set(all_agents) - set(exclude)
+    by_topic = {}
+    for agent_id in (a for a in all_agents if a in eligible):
+        for topic in PERSONA_TOPICS.get(persona_of(agent_id), ()):
+            by_topic.setdefault(topic, []).append(agent_id)
+
+    picked = {}
+    for ev in sorted(events, key=lambda e: e.strength, reverse=True):
+        if len(picked) >= n_active: break
+        holders = [a for a, _ in holders_of(db, ev.ticker) if a in eligible and a not in picked]
+        candidates = holders[:AGENTS_PER_EVENT]
+        # 방금 뽑은 보유자도 빼고 표본 추출 (겹치면 같은 사람이 두 번 뽑혀 깨우는 인원이 줄어듦)
+        chosen = set(candidates)
+        fans = [a for a in by_topic.get(ev.topic, ()) if a not in picked and a not in chosen]
+        candidates += random.sample(fans, k=min(len(fans), AGENTS_PER_EVENT - len(candidates)))
+        for agent_id in candidates[:n_active - len(picked)]:
+            picked[agent_id] = ev.ticker
+    AGENT_TRIGGERS_TOTAL.inc(len(picked), reason="event")
+
+    # 조용한 장에서도 시장이 멈추지 않도록 소수는 무작위로
+    rest = [a for a in all_agents if a in eligible and a not in picked]
+    baseline = random.sample(rest, k=min(len(rest), BASELINE_AGENTS, max(0, n_active - len(picked))))
+    for agent_id in baseline:
+        picked[agent_id] = random.choice(all_tickers)
+    AGENT_TRIGGERS_TOTAL.inc(len(baseline), reason="baseline")
+    return list(picked.items())
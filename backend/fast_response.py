@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import gzip
+import hashlib
+from datetime import datetime, date
+from typing import Optional
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from metrics import HTTP_NOT_MODIFIED_TOTAL, HTTP_RESPONSE_BYTES, SSE_FIRST_EVENT_SECONDS
+from response_cache import RESPONSE_CACHE
+
+# ---------------------------------------------------------
+# 읽기 위주 시세/커뮤니티 API 응답 계층
+# - 직렬화: orjson (C 구현, datetime도 직접 처리) → 없으면 표준 json
+# - 압축: 클라이언트 Accept-Encoding 에 맞춰 br(brotli 설치 시) > gzip, 작은 응답은 그대로
+# - ETag / If-None-Match: 내용이 같으면 본문 없이 304
+#   · 기본은 직렬화한 본문 해시, 데이터 버전을 싸게 알 수 있는 곳(차트)은 조회 전에 버전으로 먼저 비교
+# - cached_json: 이벤트로 무효화되는 워커 공유 응답 캐시 경유 (response_cache.py)
+# - sse_response: LLM 멘토처럼 늦게 끝나는 응답을 준비되는 대로 흘려보내는 Server-Sent Events
+# ---------------------------------------------------------
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))  # 이보다 작으면 압축 이득 < 비용
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))             # 실시간 응답용 (11은 너무 느림)
+CACHE_CONTROL = "no-cache"  # 캐시는 하되 매번 ETag로 재검증
+
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"JSON 직렬화 불가: {type(obj).__name__}")
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def make_etag(*parts) -> str:
+    """데이터 버전(마지막 id 등)으로 만드는 약한 ETag - 본문을 만들기 전에 비교 가능"""
+    return 'W/"' + hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=10).hexdigest() + '"'
+
+
+def _body_etag(body: bytes) -> str:
+    return 'W/"' + hashlib.blake2b(body, digest_size=10).hexdigest() + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header: return False
+    tags = {t.strip() for t in header.split(",")}
+    return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+
+def _pick_encoding(request: Request) -> Optional[str]:
+    accepted = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try: q = float(params.strip()[2:])
+            except ValueError: q = 0.0
+        if name: accepted[name.lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0: return "br"
+    if accepted.get("gzip", 0) > 0: return "gzip"
+    return None
+
+
+def _headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+
+def not_modified(request: Request, etag: str, route: str) -> Optional[Response]:
+    """If-None-Match가 etag와 같으면 304 응답, 아니면 None"""
+    if not _etag_matches(request, etag): return None
+    HTTP_NOT_MODIFIED_TOTAL.inc(route=route)
+    return Response(status_code=304, headers=_headers(etag))
+
+
+def send_json(request: Request, body: bytes, route: str, etag: str = None) -> Response:
+    """이미 직렬화된 JSON 본문 → (같으면 304) → 협상된 인코딩으로 압축해 응답"""
+    etag = etag or _body_etag(body)
+    cached = not_modified(request, etag, route)
+    if cached is not None: return cached
+
+    headers = _headers(etag)
+    HTTP_RESPONSE_BYTES.inc(len(body), route=route, kind="raw")
+    encoding = _pick_encoding(request) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    HTTP_RESPONSE_BYTES.inc(len(body), route=route, kind="sent")
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def fast_json(request: Request, payload, route: str, etag: str = None) -> Response:
+    return send_json(request, dumps(payload), route, etag)
+
+
+def cached_json(request: Request, route: str, topics: tuple, build, **params) -> Response:
+    """공유 응답 캐시(response_cache) 경유. 의존 토픽 버전이 그대로면 build()를 부르지 않음
+    (ETag도 버전에서 만들므로 클라이언트 재검증은 본문을 읽지도 않고 304)"""
+    key = route + ("?" + "&".join(f"{k}={v}" for k, v in sorted(params.items())) if params else "")
+    stamp = RESPONSE_CACHE.stamp(topics)
+    etag = make_etag(key, stamp)
+    if _etag_matches(request, etag):
+        RESPONSE_CACHE.record(route, hit=True)
+        return not_modified(request, etag, route)
+    body = RESPONSE_CACHE.get(key, stamp)
+    if body is None:
+        body = dumps(build())
+        RESPONSE_CACHE.put(key, stamp, body)
+    return send_json(request, body, route, etag)
+
+
+# ---------- Server-Sent Events ----------
+def sse_event(event: str, data) -> bytes:
+    # JSON 한 줄(개행은 이스케이프됨)이라 data: 줄 하나로 충분
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def sse_response(events, route: str) -> StreamingResponse:
+    """(이벤트 이름, 데이터) 비동기 이터레이터 → text/event-stream (압축/버퍼링 없이 이벤트마다 바로 전송)"""
+    start = time.perf_counter()
+
+    async def body():
+        first = True
+        async for event, data in events:
+            if first:
+                SSE_FIRST_EVENT_SECONDS.observe(time.perf_counter() - start, route=route)
+                first = False
+            yield sse_event(event, data)
+
+    # X-Accel-Buffering: nginx 같은 프록시가 모아서 보내지 않도록
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
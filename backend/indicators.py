@@ -0,0 +1,181 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import DBTrade
+
+# ---------------------------------------------------------
+# 종목별 추세 지표 (체결마다 증분 갱신)
+# - 최근 WINDOW건 체결을 링버퍼로 들고 합계를 굴려서(rolling sum) 유지 → 갱신/조회 모두 O(1)
+# - 같은 프로세스 체결은 엔진 훅으로, 다른 프로세스 체결은 trades.id 꼬리 읽기로 반영
+# - PostgreSQL은 id를 INSERT 때 받고 커밋은 제각각이라, 작은 id가 나중에 커밋될 수 있음
+#   (API 유저 주문 vs 시뮬레이션 체결) → 꼬리 읽기를 SYNC_OVERLAP 만큼 겹쳐 읽고 이미 반영한 id는 건너뜀
+#   · 겹침 창보다 더 늦게 커밋된 체결은 놓침 (지표는 최근 WINDOW건 추세용이라 허용)
+# - API 스레드풀/이벤트 루프가 같은 객체를 만지므로 갱신·조회는 락 안에서
+# ---------------------------------------------------------
+WINDOW = int(os.getenv("INDICATOR_WINDOW", "20"))          # analyze_market_trend 의 최근 20건과 동일
+EMA_SPAN = int(os.getenv("INDICATOR_EMA_SPAN", "10"))
+SYNC_INTERVAL_SEC = float(os.getenv("INDICATOR_SYNC_SEC", "1.0"))
+SYNC_OVERLAP = int(os.getenv("INDICATOR_SYNC_OVERLAP", "200"))  # 꼬리 읽기 때 다시 훑는 id 폭
+
+
+def trend_label(start_p: float, end_p: float) -> str:
+    if end_p > start_p * 1.02: return "🔥 급등세 (매수세 강함)"
+    elif end_p > start_p: return "📈 완만한 상승"
+    elif end_p < start_p * 0.98: return "😱 급락세 (투매 발생)"
+    elif end_p < start_p: return "📉 하락세"
+    else: return "⚖️ 보합세 (눈치보기)"
+
+
+class TickerIndicators:
+    __slots__ = ("prices", "qtys", "returns", "pv_sum", "vol_sum", "ret_sum", "ret_sq_sum", "ema")
+
+    def __init__(self):
+        self.prices = deque(maxlen=WINDOW)
+        self.qtys = deque(maxlen=WINDOW)
+        self.returns = deque(maxlen=WINDOW - 1)
+        self.pv_sum = self.vol_sum = 0.0        # VWAP = Σ(가격×수량) / Σ수량
+        self.ret_sum = self.ret_sq_sum = 0.0    # 변동성 = 수익률 표준편차
+        self.ema = None
+
+    def update(self, price: float, qty: int):
+        if len(self.prices) == self.prices.maxlen:
+            old_p, old_q = self.prices[0], self.qtys[0]
+            self.pv_sum -= old_p * old_q
+            self.vol_sum -= old_q
+        if self.prices:
+            prev = self.prices[-1]
+            r = (price - prev) / prev if prev else 0.0
+            if len(self.returns) == self.returns.maxlen:
+                old_r = self.returns[0]
+                self.ret_sum -= old_r
+                self.ret_sq_sum -= old_r * old_r
+            self.returns.append(r)
+            self.ret_sum += r
+            self.ret_sq_sum += r * r
+
+        self.prices.append(price)
+        self.qtys.append(qty)
+        self.pv_sum += price * qty
+        self.vol_sum += qty
+        alpha = 2.0 / (EMA_SPAN + 1)
+        self.ema = price if self.ema is None else alpha * price + (1 - alpha) * self.ema
+
+    def volatility(self) -> float:
+        n = len(self.returns)
+        if n < 2: return 0.0
+        mean = self.ret_sum / n
+        return math.sqrt(max(0.0, self.ret_sq_sum / n - mean * mean))
+
+    def snapshot(self) -> dict:
+        if not self.prices:
+            return {"n": 0, "last": None, "return_pct": 0.0, "vwap": None, "ema": None, "volatility_pct": 0.0,
+                    "trend": "정보 없음 (탐색 단계)"}
+        first, last = self.prices[0], self.prices[-1]
+        return {
+            "n": len(self.prices),
+            "last": last,
+            "return_pct": round((last - first) / first * 100, 2) if first else 0.0,
+            "vwap": round(self.pv_sum / self.vol_sum, 2) if self.vol_sum else last,
+            "ema": round(self.ema, 2),
+            "volatility_pct": round(self.volatility() * 100, 3),
+            "trend": trend_label(first, last),
+        }
+
+
+class IndicatorStore:
+    def __init__(self):
+        self.tickers = {}          # ticker -> TickerIndicators
+        self.last_trade_id = None  # 여기까지 반영한 trades.id (최댓값)
+        self.applied = set()       # 겹침 창 안에서 이미 반영한 id (늦게 커밋된 작은 id 찾기용)
+        self.synced_at = 0.0
+        self._lock = threading.RLock()
+
+    def _get(self, ticker: str) -> TickerIndicators:
+        ind = self.tickers.get(ticker)
+        if ind is None:
+            ind = self.tickers[ticker] = TickerIndicators()
+        return ind
+
+    # ---------- 갱신 ----------
+    def on_fill(self, ticker: str, price: float, qty: int, trade_id: int = None):
+        """엔진 체결 훅. id가 바로 다음 번호일 때만 반영 (사이에 다른 프로세스 체결이 끼면 꼬리 읽기에 맡김)"""
+        with self._lock:
+            if self.last_trade_id is None or trade_id != self.last_trade_id + 1: return
+            self._get(ticker).update(float(price), int(qty))
+            self.last_trade_id = trade_id
+            self.applied.add(trade_id)
+
+    def sync_from_db(self, db: Session):
+        with self._lock:
+            start = self.last_trade_id
+            if start is None:
+                # 최초: 종목별 최근 WINDOW건으로 워밍업 (1회라 락을 잡은 채로)
+                self.last_trade_id = db.query(func.coalesce(func.max(DBTrade.id), 0)).scalar()
+                for (ticker,) in db.query(DBTrade.ticker).distinct():
+                    rows = db.query(DBTrade.price, DBTrade.quantity).filter(
+                        DBTrade.ticker == ticker, DBTrade.id <= self.last_trade_id
+                    ).order_by(DBTrade.id.desc()).limit(WINDOW).all()
+                    for price, qty in reversed(rows):
+                        self._get(ticker).update(float(price), int(qty))
+                self.applied = {i for (i,) in db.query(DBTrade.id).filter(
+                    DBTrade.id > self.last_trade_id - SYNC_OVERLAP, DBTrade.id <= self.last_trade_id)}
+                self.synced_at = time.monotonic()
+                return
+
+        # 꼬리 읽기는 락 밖에서 (읽는 동안 엔진 체결 훅/조회가 막히지 않게), 반영만 락 안에서
+        rows = db.query(DBTrade.id, DBTrade.ticker, DBTrade.price, DBTrade.quantity).filter(
+            DBTrade.id > start - SYNC_OVERLAP).order_by(DBTrade.id).all()
+        with self._lock:
+            if self.last_trade_id is None: return  # 읽는 사이 reset
+            for trade_id, ticker, price, qty in rows:
+                if trade_id in self.applied or trade_id <= self.last_trade_id - SYNC_OVERLAP: continue
+                self._get(ticker).update(float(price), int(qty))
+                self.applied.add(trade_id)
+                self.last_trade_id = max(self.last_trade_id, trade_id)
+            floor = self.last_trade_id - SYNC_OVERLAP
+            self.applied = {i for i in self.applied if i > floor}
+            self.synced_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self.tickers, self.last_trade_id, self.applied, self.synced_at = {}, None, set(), 0.0
+
+    # ---------- 조회 (O(1)) ----------
+    def get(self, ticker: str) -> dict:
+        with self._lock:
+            return self._get(ticker).snapshot()
+
+    def trend(self, ticker: str) -> str:
+        return self.get(ticker)["trend"]
+
+    def recent_prices(self, ticker: str, n: int = 10) -> list:
+        """최신순 최근 n개 체결가"""
+        with self._lock:
+            prices = self._get(ticker).prices
+            return [prices[-i] for i in range(1, min(n, len(prices)) + 1)]
+
+    def all(self) -> dict:
+        with self._lock:
+            return {t: ind.snapshot() for t, ind in self.tickers.items()}
+
+
+INDICATORS = IndicatorStore()
+_sync_lock = threading.Lock()
+
+
+def _stale(max_age: float) -> bool:
+    return INDICATORS.last_trade_id is None or time.monotonic() - INDICATORS.synced_at > max_age
+
+
+def get_indicators(db: Session, max_age: float = SYNC_INTERVAL_SEC) -> IndicatorStore:
+    """프로세스 공용 지표. 다른 프로세스의 체결은 max_age 주기로 id 꼬리 읽기
+    동시에 여러 스레드가 오래됐다고 봐도 한 스레드만 읽고, 나머지는 락을 얻은 뒤 다시 확인해서 건너뜀"""
+    if _stale(max_age):
+        with _sync_lock:
+            if _stale(max_age):
+                INDICATORS.sync_from_db(db)
+    return INDICATORS
@@ -1,87 +1,175 @@
-import random
-import uuid
+import os
+import io
+import csv
+import json
+import time
+import argparse
+import numpy as np
+from sqlalchemy import insert, text, func, select
 from sqlalchemy.orm import Session
-from database import SessionLocal, DBAgent, init_db
-from domain_models import AgentState
-
-def create_agents():
-    db: Session = SessionLocal()
-    
-    # 기존 에이전트 싹 지우기 (중복 방지)
-    db.query(DBAgent).delete()
-    db.commit()
-    print("🧹 기존 에이전트 데이터 삭제 완료.")
-
-    agents_data = []
-    
-    # ---------------------------------------------------------
-    # 1. 고래 에이전트 (Whales) - 25명 (시장 주도 세력)
-    # 특징: 돈이 엄청 많음 (1억 ~ 5억), 성향이 극단적임
-    # ---------------------------------------------------------
-    for i in range(25):
-        agent_id = f"WHALE_{i+1:03d}" # 예: WHALE_001
-        
-        # 고래는 자본금이 1억 ~ 5억 원
-        cash = random.randint(100_000_000, 500_000_000)
-        
-        # 고래 성향: 아주 공격적이거나(Greed), 아주 보수적이거나(Fear)
-        if random.random() < 0.5:
-            # 공격적 고래 (상승장 주도)
-            state = AgentState(
-                safety_needs=0.1, social_needs=0.2, 
-                fear_index=0.1, greed_index=0.9, 
-                current_context="나는 시장을 주도한다. 공격적 투자."
-            )
-        else:
-            # 방어적 고래 (하락장 유도/현금보유)
-            state = AgentState(
-                safety_needs=0.9, social_needs=0.1, 
-                fear_index=0.8, greed_index=0.1, 
-                current_context="리스크 관리가 최우선. 보수적 운용."
-            )
-
-        agents_data.append(DBAgent(
-            agent_id=agent_id,
-            cash_balance=float(cash),
-            portfolio={}, # 초기엔 주식 0주
-            psychology=state.dict()
-        ))
-
-    # ---------------------------------------------------------
-    # 2. 일반 에이전트 (Ants) - 475명 (개미 투자자)
-    # 특징: 시드머니 200~500만 원, 일반적인 성향
-    # ---------------------------------------------------------
-    for i in range(475):
-        agent_id = f"Citizen_{i+1:03d}" # 예: Citizen_001
-        
-        # 일반인은 자본금 200만 ~ 500만 원
-        cash = random.randint(2_000_000, 5_000_000)
-        
-        # 성향은 랜덤 분포
-        state = AgentState(
-            safety_needs=random.random(), 
-            social_needs=random.random(),
-            fear_index=random.random(), 
-            greed_index=random.random(),
-            current_context="소액으로 꾸준한 수익을 목표로 함."
-        )
-
-        agents_data.append(DBAgent(
-            agent_id=agent_id,
-            cash_balance=float(cash),
-            portfolio={},
-            psychology=state.dict()
-        ))
-
-    # DB에 일괄 저장
-    db.bulk_save_objects(agents_data)
-    db.commit()
-    
-    # [수정됨] 텍스트를 실제 숫자에 맞게 변경
-    print(f"✅ 총 {len(agents_data)}명 (고래 25명 + 일반 475명) 생성 완료!")
-    db.close()
+from database import SessionLocal, DBAgent, DBPosition, DBAgentMemory, DBUserAnalytics, DBTrade, init_db
+from domain_models import AgentState, AgentRole
+from agent_registry import AGENTS
+
+# ---------------------------------------------------------
+# 에이전트 시딩 파이프라인
+# - 인구 구성은 scenarios/*.json 으로 기술 (그룹별 인원, 자본금 분포, 심리 프로필 혼합 비율)
+# - 속성은 그룹 단위로 numpy 벡터 생성 (에이전트 1명씩 파이썬 객체를 만들지 않음)
+# - 적재: PostgreSQL은 COPY FROM STDIN, 그 외(SQLite)는 한 트랜잭션 안에서 executemany
+# - 기존 데이터는 행 단위 delete() 대신 TRUNCATE (SQLite는 WHERE 없는 DELETE = 내부 truncate 최적화)
+# ---------------------------------------------------------
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+DEFAULT_SCENARIO = os.getenv("AGENT_SCENARIO", "default")
+SEED_CHUNK = int(os.getenv("AGENT_SEED_CHUNK", "50000"))  # COPY/executemany 한 번에 보내는 행 수
+
+_PSYCHOLOGY_FIELDS = ("safety_needs", "social_needs", "fear_index", "greed_index")
+
+
+def load_scenario(name_or_path: str) -> dict:
+    """시나리오 이름(scenarios/<이름>.json) 또는 파일 경로"""
+    path = name_or_path if name_or_path.endswith(".json") else os.path.join(SCENARIO_DIR, f"{name_or_path}.json")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------- 1. 속성 생성 (벡터) ----------
+def _sample(spec, n: int, rng: np.random.Generator) -> np.ndarray:
+    """분포 정의 → 길이 n 배열. 숫자를 그대로 주면 상수"""
+    if not isinstance(spec, dict):
+        return np.full(n, spec, dtype=np.float64)
+    dist = spec.get("dist", "uniform")
+    if dist == "uniform":
+        values = rng.uniform(spec.get("low", 0.0), spec.get("high", 1.0), n)
+    elif dist == "uniform_int":
+        values = rng.integers(spec["low"], spec["high"], n, endpoint=True).astype(np.float64)
+    elif dist == "normal":
+        values = rng.normal(spec["mean"], spec["std"], n)
+    elif dist == "lognormal":
+        values = rng.lognormal(np.log(spec["median"]), spec["sigma"], n)
+    else:
+        raise ValueError(f"❌ 알 수 없는 분포: {dist} (uniform/uniform_int/normal/lognormal 중 선택)")
+    if "min" in spec or "max" in spec:
+        values = np.clip(values, spec.get("min", -np.inf), spec.get("max", np.inf))
+    return values
+
+
+def generate_group(group: dict, rng: np.random.Generator) -> dict:
+    """그룹 1개 → 열 단위 배열 {agent_id, cash_balance, 심리 필드..., current_context}"""
+    n = group["count"]
+    width = group.get("id_width", 3)
+    columns = {
+        "agent_id": [f"{group['prefix']}_{i:0{width}d}" for i in range(1, n + 1)],
+        "cash_balance": np.round(_sample(group["cash"], n, rng), 0),
+    }
+
+    # 프로필 혼합: 에이전트마다 프로필 하나를 가중치대로 배정한 뒤, 프로필별로 한 번에 채움
+    profiles = group.get("profiles") or [{}]
+    weights = np.array([p.get("weight", 1.0) for p in profiles], dtype=np.float64)
+    assigned = rng.choice(len(profiles), n, p=weights / weights.sum())
+    defaults = AgentState().model_dump()
+    for field in _PSYCHOLOGY_FIELDS:
+        columns[field] = np.empty(n, dtype=np.float64)
+    contexts = np.empty(n, dtype=object)
+    for k, profile in enumerate(profiles):
+        mask = assigned == k
+        m = int(mask.sum())
+        if not m: continue
+        for field in _PSYCHOLOGY_FIELDS:
+            columns[field][mask] = _sample(profile.get(field, defaults[field]), m, rng)
+        contexts[mask] = profile.get("current_context", defaults["current_context"])
+    columns["current_context"] = contexts
+    return columns
+
+
+def iter_rows(scenario: dict, chunk: int = SEED_CHUNK):
+    """시나리오 전체를 chunk 행씩 (agent_id, cash_balance, psychology(dict), role_flags) 목록으로"""
+    rng = np.random.default_rng(scenario.get("seed"))
+    for group in scenario["groups"]:
+        cols = generate_group(group, rng)
+        role_flags = int(AgentRole.for_agent_id(f"{group['prefix']}_"))  # 그룹 안에서는 모두 같은 역할
+        psych = {field: cols[field].tolist() for field in _PSYCHOLOGY_FIELDS}
+        cash = cols["cash_balance"].tolist()
+        for start in range(0, group["count"], chunk):
+            yield [
+                (cols["agent_id"][i], cash[i],
+                 {**{field: psych[field][i] for field in _PSYCHOLOGY_FIELDS}, "current_context": cols["current_context"][i]},
+                 role_flags)
+                for i in range(start, min(start + chunk, group["count"]))
+            ]
+
+
+# ---------- 2. 비우기 / 적재 ----------
+def truncate_agents(db: Session):
+    # positions/기억/유저 매매 분석은 에이전트에 딸린 데이터라 같이 비움.
+    # agents.id는 되감지 않음 (trades.buyer_uid/seller_uid가 참조) - PostgreSQL은 시퀀스가 그대로 이어지고,
+    # SQLite(AUTOINCREMENT 없는 INTEGER PRIMARY KEY)는 비우면 1부터 다시 매기므로 _insert_chunk가 id를 직접 지정
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("TRUNCATE TABLE positions, agent_memories, user_analytics, agents"))
+    else:
+        for table in (DBPosition.__table__, DBAgentMemory.__table__, DBUserAnalytics.__table__, DBAgent.__table__):
+            db.execute(table.delete())
+
+
+def _copy_chunk(db: Session, rows: list):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for agent_id, cash, psychology, role_flags in rows:
+        writer.writerow((agent_id, cash, json.dumps(psychology, ensure_ascii=False), "{}", role_flags))
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()  # 같은 트랜잭션의 DBAPI(psycopg2) 커서
+    cursor.copy_expert("COPY agents (agent_id, cash_balance, psychology, portfolio, role_flags) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+def next_agent_id(db: Session) -> int:
+    """지금까지 쓴 적 있는 가장 큰 agents.id + 1 (지워진 에이전트도 체결 기록에 uid로 남아 있으면 포함)"""
+    used = [func.max(DBAgent.id), select(func.max(DBTrade.buyer_uid)).scalar_subquery(),
+            select(func.max(DBTrade.seller_uid)).scalar_subquery()]
+    return max((v or 0) for v in db.query(*used).one()) + 1
+
+
+def _insert_chunk(db: Session, rows: list, first_id: int):
+    db.execute(insert(DBAgent), [
+        {"id": first_id + i, "agent_id": agent_id, "cash_balance": cash, "psychology": psychology, "portfolio": {},
+         "role_flags": role_flags}
+        for i, (agent_id, cash, psychology, role_flags) in enumerate(rows)
+    ])
+
+
+def seed_agents(db: Session, scenario: dict) -> int:
+    """기존 에이전트를 비우고 시나리오대로 적재 (전체가 한 트랜잭션 - 중간에 실패하면 원상태)"""
+    postgres = db.get_bind().dialect.name == "postgresql"
+    total = 0
+    try:
+        first_id = None if postgres else next_agent_id(db)  # 비우기 전에 (SQLite는 비우면 id가 되감김)
+        truncate_agents(db)
+        for rows in iter_rows(scenario):
+            if postgres:
+                _copy_chunk(db, rows)
+            else:
+                _insert_chunk(db, rows, first_id + total)
+            total += len(rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    AGENTS.reset()  # id가 바뀌었으므로 인터닝 캐시도 새로
+    return total
+
+
+def create_agents(scenario_name: str = DEFAULT_SCENARIO):
+    scenario = load_scenario(scenario_name)
+    t0 = time.perf_counter()
+    with SessionLocal() as db:
+        total = seed_agents(db, scenario)
+    groups = " + ".join(f"{g['prefix']} {g['count']:,}명" for g in scenario["groups"])
+    print(f"✅ [{scenario.get('name', scenario_name)}] 총 {total:,}명 ({groups}) 생성 완료! ({time.perf_counter() - t0:.1f}s)")
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="시나리오 파일대로 에이전트 일괄 생성 (기존 에이전트/보유/기억은 비움)")
+    parser.add_argument("scenario", nargs="?", default=DEFAULT_SCENARIO, help="scenarios/<이름>.json 또는 JSON 경로")
+    args = parser.parse_args()
+
     # 테이블이 없으면 생성
     init_db()
-    create_agents()
\ No newline at end of file
+    create_agents(args.scenario)
@@ -0,0 +1,168 @@
+import os
+import time
+import bisect
+import threading
+from sqlalchemy.orm import Session
+from database import DBAgent, DBCompany
+from positions import get_all_holdings
+
+# ---------------------------------------------------------
+# 시가평가(mark-to-market) 자산 랭킹
+# - 순자산 = 현금 + Σ(보유수량 × 현재가)
+# - (-순자산, agent_id) 정렬 인덱스 유지 → Top-K는 슬라이스, 순위는 bisect
+#   · sortedcontainers 설치 시 SortedList (갱신 O(log n)), 없으면 평범한 리스트 (탐색 O(log n) + 삽입/삭제 이동 O(n))
+# - 체결(현금/수량 변화)과 가격 변화 때마다 해당 에이전트만 재계산
+# - 스레드 안전: API의 동기 엔드포인트(스레드풀)와 비동기 주문 핸들러가 같은 객체를 만지므로 모든 갱신/조회를 락 안에서,
+#   재동기화는 새 상태를 따로 다 만든 뒤 락 안에서 한 번에 교체 (만들다 만 인덱스가 보이지 않음)
+# ---------------------------------------------------------
+try:
+    from sortedcontainers import SortedList
+except ImportError:
+    SortedList = None
+
+RESYNC_SEC = float(os.getenv("LEADERBOARD_RESYNC_SEC", "10"))
+EXCLUDED_AGENTS = {"MARKET_MAKER"}
+
+
+class _ListIndex(list):
+    """sortedcontainers 가 없을 때 쓰는 SortedList 대용 (필요한 메서드만)"""
+    def add(self, item):
+        bisect.insort(self, item)
+
+    def discard(self, item):
+        pos = bisect.bisect_left(self, item)
+        if pos < len(self) and self[pos] == item:
+            del self[pos]
+
+    def bisect_left(self, item) -> int:
+        return bisect.bisect_left(self, item)
+
+
+def _new_index(items=()):
+    return SortedList(items) if SortedList is not None else _ListIndex(sorted(items))
+
+
+class Leaderboard:
+    def __init__(self):
+        self.cash = {}        # agent_id -> 현금
+        self.holdings = {}    # agent_id -> {ticker: qty}
+        self.holders = {}     # ticker -> {agent_id} (가격 변동 시 재평가 대상)
+        self.prices = {}      # ticker -> 현재가
+        self.net_worth = {}   # agent_id -> 순자산
+        self._index = _new_index()  # [(-순자산, agent_id)] 오름차순 = 부자 순
+        self.synced_at = 0.0
+        self._lock = threading.RLock()
+
+    # ---------- 내부: 정렬 인덱스 유지 ----------
+    def _stock_value(self, agent_id: str) -> float:
+        return sum(qty * self.prices.get(t, 0.0) for t, qty in self.holdings.get(agent_id, {}).items())
+
+    def _reindex(self, agent_id: str):
+        old = self.net_worth.get(agent_id)
+        if old is not None:
+            self._index.discard((-old, agent_id))
+        new = self.cash.get(agent_id, 0.0) + self._stock_value(agent_id)
+        self.net_worth[agent_id] = new
+        self._index.add((-new, agent_id))
+
+    # ---------- 적재 ----------
+    def load(self, agents, prices: dict):
+        """agents: [(agent_id, cash, {ticker: qty})] 로 전체 재구성 (새 객체에 다 만든 뒤 락 안에서 교체)"""
+        fresh = Leaderboard()
+        fresh.prices = dict(prices)
+        for agent_id, cash, portfolio in agents:
+            if agent_id in EXCLUDED_AGENTS: continue
+            fresh.cash[agent_id] = float(cash or 0.0)
+            fresh.holdings[agent_id] = {t: q for t, q in (portfolio or {}).items() if q}
+            for t in fresh.holdings[agent_id]:
+                fresh.holders.setdefault(t, set()).add(agent_id)
+            fresh.net_worth[agent_id] = fresh.cash[agent_id] + fresh._stock_value(agent_id)
+        fresh._index = _new_index((-nw, a) for a, nw in fresh.net_worth.items())
+        with self._lock:
+            self.cash, self.holdings, self.holders = fresh.cash, fresh.holdings, fresh.holders
+            self.prices, self.net_worth, self._index = fresh.prices, fresh.net_worth, fresh._index
+            self.synced_at = time.monotonic()
+
+    def sync_from_db(self, db: Session):
+        # 회사 1번 + 에이전트 1번 + positions 1번 = 쿼리 3개로 전체 평가 (N×M 개별 조회 없음)
+        prices = {t: p for t, p in db.query(DBCompany.ticker, DBCompany.current_price).all()}
+        holdings = get_all_holdings(db)
+        agents = [(a, cash, holdings.get(a, {})) for a, cash in db.query(DBAgent.agent_id, DBAgent.cash_balance).all()]
+        self.load(agents, prices)
+
+    # ---------- 증분 갱신 (엔진 훅) ----------
+    def set_agent(self, agent_id: str, cash: float, portfolio: dict = None):
+        if agent_id in EXCLUDED_AGENTS: return
+        with self._lock:
+            self.cash[agent_id] = float(cash)
+            if portfolio is not None:
+                for t in self.holdings.get(agent_id, {}):
+                    self.holders.get(t, set()).discard(agent_id)
+                self.holdings[agent_id] = {t: q for t, q in portfolio.items() if q}
+                for t in self.holdings[agent_id]:
+                    self.holders.setdefault(t, set()).add(agent_id)
+            self._reindex(agent_id)
+
+    def apply_fill(self, agent_id: str, ticker: str, qty_delta: int, cash_delta: float):
+        if agent_id in EXCLUDED_AGENTS: return
+        with self._lock:
+            if agent_id not in self.cash: return  # 모르는 에이전트는 다음 재동기화 때 반영
+            self.cash[agent_id] += cash_delta
+            held = self.holdings.setdefault(agent_id, {})
+            new_qty = held.get(ticker, 0) + qty_delta
+            if new_qty > 0:
+                held[ticker] = new_qty
+                self.holders.setdefault(ticker, set()).add(agent_id)
+            else:
+                held.pop(ticker, None)
+                self.holders.get(ticker, set()).discard(agent_id)
+            self._reindex(agent_id)
+
+    def update_price(self, ticker: str, price: float):
+        with self._lock:
+            if self.prices.get(ticker) == price: return
+            self.prices[ticker] = float(price)
+            for agent_id in self.holders.get(ticker, ()):
+                self._reindex(agent_id)
+
+    # ---------- 조회 ----------
+    def top(self, k: int = 10) -> list:
+        with self._lock:
+            return [self.entry(agent_id) for _, agent_id in self._index[:k]]
+
+    def rank(self, agent_id: str):
+        """1부터 시작하는 순위 (bisect 한 번, O(log n))"""
+        with self._lock:
+            nw = self.net_worth.get(agent_id)
+            if nw is None: return None
+            return self._index.bisect_left((-nw, agent_id)) + 1
+
+    def entry(self, agent_id: str) -> dict:
+        with self._lock:
+            cash = self.cash.get(agent_id, 0.0)
+            total = self.net_worth.get(agent_id, cash)
+        return {"agent_id": agent_id, "total_asset": total, "cash": cash, "stock_value": total - cash}
+
+    def __len__(self):
+        return len(self._index)
+
+
+LEADERBOARD = Leaderboard()
+_sync_lock = threading.Lock()
+
+
+def _stale(max_age: float) -> bool:
+    return not LEADERBOARD.synced_at or time.monotonic() - LEADERBOARD.synced_at > max_age
+
+
+def get_leaderboard(db: Session, max_age: float = RESYNC_SEC) -> Leaderboard:
+    """프로세스 공용 랭킹. 다른 프로세스(시뮬레이션)의 체결은 max_age 주기로 DB에서 재동기화
+    재동기화는 한 스레드만 (최초 적재 전이거나 max_age=0 이면 기다리고, 아니면 다른 스레드는 기존 데이터로 바로 응답)
+    응답 캐시 미스(= 체결/신규 유저로 버전이 바뀜)에서 다시 만들 때는 max_age=0 → 옛 랭킹이 새 stamp로 저장되지 않음"""
+    if _stale(max_age) and _sync_lock.acquire(blocking=not LEADERBOARD.synced_at or max_age <= 0):
+        try:
+            if _stale(max_age):
+                LEADERBOARD.sync_from_db(db)
+        finally:
+            _sync_lock.release()
+    return LEADERBOARD
@@ -0,0 +1,64 @@
+import os
+import heapq
+from itertools import count
+from order_book import RestingOrder
+from metrics import LIQUIDITY_INJECTED_TOTAL, LIQUIDITY_INJECTED_SHARES, VIP_QUEUE_DEPTH
+
+# ---------------------------------------------------------
+# 유저(VIP) 주문 유동성 공급
+# - 유저 주문만 따로 "발동 가격" 힙에 보관 → 체결마다 호가창 전체를 훑지 않음
+#   · 매수: 현재가 ≤ 주문가 / 95% 가 되면 발동 (= 주문가가 현재가의 95% 이상) → 최대 힙
+#   · 매도: 현재가 ≥ 주문가 / 105% 가 되면 발동 (= 주문가가 현재가의 105% 이하) → 최소 힙
+# - 발동 확인은 힙 꼭대기만 보면 되므로 O(1), 꺼낼 때 O(log n)
+# - 발동하면 마켓메이커가 같은 가격/잔량의 반대 주문을 넣어줌 (종목별 공급량 집계 + 메트릭)
+# ---------------------------------------------------------
+VIP_BUY_PCT = float(os.getenv("LIQUIDITY_VIP_BUY_PCT", "0.95"))
+VIP_SELL_PCT = float(os.getenv("LIQUIDITY_VIP_SELL_PCT", "1.05"))
+_seq = count()
+
+
+class LiquidityInjector:
+    def __init__(self):
+        self._bids = {}     # ticker -> [(-발동가, seq, order)]
+        self._asks = {}     # ticker -> [(발동가, seq, order)]
+        self.supplied = {}  # ticker -> {"orders", "shares", "notional"} 누적 공급량
+
+    def watch(self, ticker: str, order: RestingOrder):
+        """유저 주문 등록 (호가창에 넣은 직후)"""
+        if order.is_buy:
+            heapq.heappush(self._bids.setdefault(ticker, []), (-order.price / VIP_BUY_PCT, next(_seq), order))
+        else:
+            heapq.heappush(self._asks.setdefault(ticker, []), (order.price / VIP_SELL_PCT, next(_seq), order))
+        VIP_QUEUE_DEPTH.set(self.pending())
+
+    def has_pending(self, ticker: str) -> bool:
+        return bool(self._bids.get(ticker) or self._asks.get(ticker))
+
+    def pending(self) -> int:
+        return sum(len(h) for h in self._bids.values()) + sum(len(h) for h in self._asks.values())
+
+    def _fire(self, heap: list, in_range) -> list:
+        fired = []
+        while heap and in_range(heap[0][0]):
+            order = heapq.heappop(heap)[2]
+            if order.quantity > 0 and not order.vip_filled:  # 이미 다 체결된 주문은 여기서 정리
+                order.vip_filled = True  # 무한 생성 방지
+                fired.append(order)
+        return fired
+
+    def inject(self, ticker: str, current_price: float, mm_uid: int, ts: int) -> list:
+        """현재가 범위에 들어온 유저 주문마다 마켓메이커 반대 주문 생성 (호가창 삽입은 엔진이)"""
+        fired = self._fire(self._bids.get(ticker, []), lambda neg_trigger: -neg_trigger >= current_price)
+        fired += self._fire(self._asks.get(ticker, []), lambda trigger: trigger <= current_price)
+        if not fired: return []
+
+        stats = self.supplied.setdefault(ticker, {"orders": 0, "shares": 0, "notional": 0})
+        for order in fired:
+            stats["orders"] += 1
+            stats["shares"] += order.quantity
+            stats["notional"] += order.quantity * order.price
+            side = "SELL" if order.is_buy else "BUY"
+            LIQUIDITY_INJECTED_TOTAL.inc(ticker=ticker, side=side)
+            LIQUIDITY_INJECTED_SHARES.inc(order.quantity, ticker=ticker, side=side)
+        VIP_QUEUE_DEPTH.set(self.pending())
+        return [RestingOrder(mm_uid, o.price, o.quantity, not o.is_buy, ts) for o in fired]
@@ -0,0 +1,292 @@
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+import time
+from types import SimpleNamespace
+from dotenv import load_dotenv
+from metrics import LLM_SECONDS, LLM_TOKENS_TOTAL, LLM_ERRORS_TOTAL, LLM_PROMPT_TOKENS, LLM_FIRST_TOKEN_SECONDS
+from prompt_templates import count_tokens, count_message_tokens
+
+load_dotenv()
+
+# ---------------------------------------------------------
+# LLM 프로바이더 설정
+# - LLM_PROVIDER=azure (기본값): 실제 Azure OpenAI 호출
+# - LLM_PROVIDER=stub: 네트워크 없이 결정론적 가짜 응답 (부하 테스트/벤치마크용)
+# ---------------------------------------------------------
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "azure").lower()
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "0"))       # 평균 응답 지연
+STUB_JITTER_MS = float(os.getenv("STUB_LLM_JITTER_MS", "0"))         # 지연 흔들림 (±)
+STUB_ERROR_RATE = float(os.getenv("STUB_LLM_ERROR_RATE", "0"))       # 예외 발생 확률 (0~1)
+STUB_SEED = os.getenv("STUB_LLM_SEED", "42")
+STUB_STREAM_CHUNK_MS = float(os.getenv("STUB_LLM_STREAM_CHUNK_MS", "0"))  # stream=True 일 때 조각 사이 간격
+
+_client = None
+
+
+class StubLLMError(Exception):
+    """스텁 프로바이더가 주입한 가짜 통신 장애"""
+
+
+# ---------------------------------------------------------
+# 1. 프롬프트 종류별 가짜 응답 생성기 (스키마는 실제 호출부와 동일)
+# ---------------------------------------------------------
+def _find_int(pattern: str, text: str, default: int = 0) -> int:
+    match = re.search(pattern, text)
+    if not match: return default
+    try: return int(match.group(1).replace(",", ""))
+    except ValueError: return default
+
+
+def _stub_trade_decision(rng: random.Random, text: str) -> dict:
+    price = _find_int(r"현재가: ?([\d,]+)", text)
+    cash = _find_int(r"현금: ?([\d,]+)", text)
+    held = _find_int(r"보유(?: 현황)?: ?(\d+)주", text)
+
+    roll = rng.random()
+    if held > 0 and roll < 0.45:
+        action, qty = "SELL", rng.randint(1, held)
+    elif price > 0 and cash >= price and roll < 0.85:
+        action, qty = "BUY", rng.randint(1, max(1, min(20, cash // price)))
+    else:
+        action, qty = "HOLD", 0
+
+    return {
+        "thought_process": f"[stub] {action} 판단 (난수 {roll:.2f})",
+        "action": action,
+        "price": int(price * rng.uniform(0.97, 1.03)) if price > 0 else 0,
+        "quantity": qty,
+    }
+
+
+def _stub_trade_batch(rng: random.Random, text: str) -> dict:
+    # 공통 현재가 줄 + 에이전트 한 줄씩 → 단건 생성기를 에이전트마다 재사용
+    header = _find_int(r"현재가: ?([\d,]+)", text)
+    decisions = []
+    for match in re.finditer(r"^- 나:(\S+) (.*)$", text, re.M):
+        decision = _stub_trade_decision(rng, f"현재가:{header} {match.group(2)}")
+        decisions.append({"agent": match.group(1), **decision})
+    return {"decisions": decisions}
+
+
+def _stub_chatter(rng: random.Random, text: str) -> dict:
+    lines = ["오늘 장 분위기 좋네요, 가즈아", "변동성이 너무 커서 관망 중입니다.", "손절할까 고민되네요..."]
+    return {"thought_process": rng.choice(lines), "action": "HOLD", "price": 0, "quantity": 0}
+
+
+def _stub_mentor_advice(rng: random.Random, text: str) -> dict:
+    return {
+        "opinion": rng.choice(["STRONG BUY", "BUY", "HOLD", "SELL", "STRONG SELL"]),
+        "core_logic": "[stub] 최근 가격 흐름과 여론을 종합한 판단입니다.",
+        "feedback_to_user": "[stub] 현재 비중은 무난합니다.",
+        "chat_message": "[stub] 차분하게 대응하세요!",
+    }
+
+
+def _stub_mentor_solution(rng: random.Random, text: str) -> dict:
+    name = re.search(r"진단가 '([^']+)'", text)
+    return {
+        "type": f"{name.group(1) if name else '멘토'}의 진단",
+        "text": "[stub] 매매 빈도와 종목 집중도를 점검해 보세요.",
+    }
+
+
+def _stub_news(rng: random.Random, text: str) -> dict:
+    return {
+        "title": f"[stub] 가상 기업 공시 #{rng.randint(1000, 9999)}",
+        "summary": "[stub] 부하 테스트용으로 생성된 뉴스 요약입니다.",
+        "impact_score": rng.randint(-90, 90),
+    }
+
+
+def _stub_chat(rng: random.Random, text: str) -> str:
+    return "[stub] 좋은 질문이에요. 시장은 늘 변하니 분산 투자와 원칙 매매를 지키세요."
+
+
+# (종류, 판별 함수, 생성기) - 위에서부터 먼저 맞는 것을 사용
+PROMPT_KINDS = [
+    ("trade_batch", lambda t, j: '"decisions"' in t, _stub_trade_batch),
+    ("mentor_advice", lambda t, j: '"opinion"' in t, _stub_mentor_advice),
+    ("mentor_solution", lambda t, j: "진단가" in t, _stub_mentor_solution),
+    ("chatter", lambda t, j: "thought_process" in t and "커뮤니티 라운지" in t, _stub_chatter),
+    ("trade_decision", lambda t, j: "thought_process" in t, _stub_trade_decision),
+    ("news", lambda t, j: "title, summary" in t, _stub_news),
+    ("chat", lambda t, j: not j, _stub_chat),
+]
+
+
+def classify_prompt(messages: list, json_mode: bool) -> str:
+    text = "\n".join(str(m.get("content", "")) for m in messages)
+    for kind, match, _ in PROMPT_KINDS:
+        if match(text, json_mode):
+            return kind
+    return "unknown"
+
+
+# ---------------------------------------------------------
+# 2. OpenAI SDK와 동일한 모양의 스텁 클라이언트
+# ---------------------------------------------------------
+def _stream_pieces(content: str) -> list:
+    """스트리밍 조각 단위 (단어 + 뒤따르는 공백 ≈ 토큰 몇 개)"""
+    return re.findall(r"\S+\s*|\s+", content) or [content]
+
+
+class _StubCompletions:
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float, seed: str,
+                 stream_chunk_ms: float = STUB_STREAM_CHUNK_MS):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.seed = seed
+        self.stream_chunk_ms = stream_chunk_ms
+        self.call_count = 0
+
+    async def _stream(self, model, content: str):
+        # 실제 SDK의 ChatCompletionChunk 모양 (choices[0].delta.content, 마지막 조각에 finish_reason)
+        pieces = _stream_pieces(content)
+        for i, piece in enumerate(pieces):
+            if i and self.stream_chunk_ms > 0:
+                await asyncio.sleep(self.stream_chunk_ms / 1000.0)
+            last = i == len(pieces) - 1
+            yield SimpleNamespace(
+                model=model or "stub", usage=None,
+                choices=[SimpleNamespace(index=0, finish_reason="stop" if last else None,
+                                         delta=SimpleNamespace(role="assistant" if i == 0 else None, content=piece))],
+            )
+
+    async def create(self, model=None, messages=None, response_format=None, stream=False, **kwargs):
+        messages = messages or []
+        self.call_count += 1
+        text = "\n".join(str(m.get("content", "")) for m in messages)
+
+        # 같은 프롬프트에는 항상 같은 답 (재현 가능한 벤치마크)
+        digest = hashlib.sha256(f"{self.seed}|{text}".encode("utf-8")).hexdigest()
+        rng = random.Random(int(digest[:16], 16))
+
+        delay = self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        if self.error_rate > 0 and rng.random() < self.error_rate:
+            raise StubLLMError("stub LLM injected failure")
+
+        json_mode = bool(response_format and response_format.get("type") == "json_object")
+        kind = classify_prompt(messages, json_mode)
+        generator = next((g for k, _, g in PROMPT_KINDS if k == kind), None)
+        if generator is None:
+            payload = {}
+        else:
+            payload = generator(rng, text)
+        content = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+        if stream:
+            # 지연(첫 토큰까지)은 위에서 이미 기다렸고, 본문은 조각으로 흘려보냄
+            return self._stream(model, content)
+        if self.stream_chunk_ms > 0:
+            # 생성 시간은 스트리밍 여부와 같음 → 한 번에 받으면 마지막 조각까지 기다린 뒤 도착
+            await asyncio.sleep((len(_stream_pieces(content)) - 1) * self.stream_chunk_ms / 1000.0)
+
+        prompt_tokens = max(1, count_message_tokens(messages))
+        completion_tokens = max(1, count_tokens(content))
+        return SimpleNamespace(
+            model=model or "stub",
+            choices=[SimpleNamespace(index=0, finish_reason="stop", message=SimpleNamespace(role="assistant", content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens),
+        )
+
+
+class StubLLMClient:
+    """AsyncAzureOpenAI 대신 쓰는 로컬 결정론적 클라이언트 (client.chat.completions.create 호환)"""
+
+    def __init__(self, latency_ms: float = STUB_LATENCY_MS, jitter_ms: float = STUB_JITTER_MS,
+                 error_rate: float = STUB_ERROR_RATE, seed: str = STUB_SEED, stream_chunk_ms: float = STUB_STREAM_CHUNK_MS):
+        self.chat = SimpleNamespace(completions=_StubCompletions(latency_ms, jitter_ms, error_rate, seed, stream_chunk_ms))
+
+
+def _build_azure_client():
+    from openai import AsyncAzureOpenAI
+    return AsyncAzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+    )
+
+
+def get_llm_client():
+    """프로세스 전체가 공유하는 LLM 클라이언트 (최초 호출 시 생성)"""
+    global _client
+    if _client is None:
+        _client = StubLLMClient() if LLM_PROVIDER == "stub" else _build_azure_client()
+    return _client
+
+
+async def close_llm_client():
+    """서버 종료 시 연결 풀 정리 (다음 get_llm_client 호출 때 새로 만듦)"""
+    global _client
+    client, _client = _client, None
+    close = getattr(client, "close", None)
+    if close is not None:
+        await close()
+
+
+def set_llm_client(client):
+    """벤치마크/테스트에서 지연·에러율이 다른 클라이언트로 교체할 때 사용"""
+    global _client
+    _client = client
+
+
+async def chat_completion(call_type: str, **kwargs):
+    """client.chat.completions.create 래퍼 - 호출 종류별 지연/토큰/에러를 메트릭에 기록"""
+    prompt_tokens = count_message_tokens(kwargs.get("messages") or [])
+    LLM_PROMPT_TOKENS.observe(prompt_tokens, call_type=call_type)
+    start = time.perf_counter()
+    try:
+        response = await get_llm_client().chat.completions.create(**kwargs)
+    except Exception:
+        LLM_ERRORS_TOTAL.inc(call_type=call_type)
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - start, call_type=call_type)
+
+    # 서버가 usage를 안 주면(일부 프록시/스트리밍) 전송 전에 센 값으로 대신 기록
+    usage = getattr(response, "usage", None)
+    LLM_TOKENS_TOTAL.inc(getattr(usage, "prompt_tokens", None) or prompt_tokens, call_type=call_type, kind="input")
+    if usage is not None:
+        LLM_TOKENS_TOTAL.inc(usage.completion_tokens or 0, call_type=call_type, kind="output")
+    return response
+
+
+async def chat_completion_stream(call_type: str, **kwargs):
+    """stream=True 버전 - 본문 조각을 도착하는 대로 yield (메트릭은 chat_completion과 같고 첫 토큰 지연을 추가 기록)
+    소비하는 쪽이 중간에 그만두면(클라이언트 연결 끊김) 업스트림 스트림도 바로 닫음"""
+    prompt_tokens = count_message_tokens(kwargs.get("messages") or [])
+    LLM_PROMPT_TOKENS.observe(prompt_tokens, call_type=call_type)
+    start = time.perf_counter()
+    stream, parts, usage, failed = None, [], None, False
+    try:
+        stream = await get_llm_client().chat.completions.create(stream=True, **kwargs)
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices: continue  # Azure 콘텐츠 필터 결과처럼 본문 없는 조각
+            delta = chunk.choices[0].delta.content
+            if not delta: continue
+            if not parts:
+                LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, call_type=call_type)
+            parts.append(delta)
+            yield delta
+    except Exception:
+        failed = True
+        LLM_ERRORS_TOTAL.inc(call_type=call_type)
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - start, call_type=call_type)
+        close = getattr(stream, "close", None) or getattr(stream, "aclose", None)
+        if close is not None:
+            await close()
+        if not failed:
+            # 스트리밍은 usage를 안 주는 경우가 많음 → 받은 본문을 직접 셈
+            LLM_TOKENS_TOTAL.inc(getattr(usage, "prompt_tokens", None) or prompt_tokens, call_type=call_type, kind="input")
+            LLM_TOKENS_TOTAL.inc(getattr(usage, "completion_tokens", None) or count_tokens("".join(parts)),
+                                 call_type=call_type, kind="output")
@@ -1,14 +1,28 @@
+import os
+import time
 import asyncio
 import logging
 import random
+import numpy as np
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from database import SessionLocal, DBAgent, DBNews, DBCompany, DBTrade, DBDiscussion
+from database import SessionLocal, DBAgent, DBCompany, DBTrade
 from market_engine import MarketEngine
 from community_manager import post_comment
+from positions import get_position, get_portfolio, set_portfolio
 from domain_models import Order, OrderSide, OrderType, AgentState
-from agent_society_brain import agent_society_think
+from agent_society_brain import agent_society_think, agent_society_think_batch, get_agent_persona, BATCH_SIZER
+from agent_memory import AGENT_MEMORY, Decision
+from decision_pipeline import PIPELINE, PendingDecision
+from event_bus import EVENT_BUS, schedule_triggered
+from news_service import NEWS_PUBLISHER
+from news_cache import get_news_cache
+from discussion_service import DISCUSSIONS, get_discussions
+from indicators import get_indicators
+from response_cache import RESPONSE_CACHE
+from population import Population, BACKGROUND_AGENTS, POPULATION_DIR, POPULATION_SEED
+from metrics import ERRORS_TOTAL, DB_QUERIES_TOTAL, TICK_SECONDS, TICK_DB_QUERIES, monitor_event_loop_lag, push_metrics_loop
 
 # ------------------------------------------------------------------
 # 0. 로깅 및 엔진 설정
@@ -22,6 +36,14 @@ logging.getLogger("httpcore").setLevel(logging.WARNING)
 
 market_engine = MarketEngine()
 
+# 틱당 행동하는 에이전트 수 / 라운지 글쓰기 전 대기 시간 (벤치마크에서 조정 가능)
+ACTIVE_AGENTS_PER_TICK = 15
+CHATTER_DELAY_RANGE = (0.5, 2.0)
+# 배치 판단 모드: 같은 종목 x 같은 페르소나끼리 묶어 LLM 호출 1번으로 결정
+BATCH_DECISIONS = os.getenv("AGENT_BATCH_DECISIONS", "true").lower() in ("1", "true", "yes")
+# 에이전트 선발 방식: events (가격 급변/큰 뉴스/글 폭주에 반응하는 에이전트만) | random (기존 무작위 추첨)
+TRIGGER_MODE = os.getenv("AGENT_TRIGGER_MODE", "events").lower()
+
 # ------------------------------------------------------------------
 # 시뮬레이션 시작 시간 (DB에서 마지막 시간을 찾아 이어달리기)
 # ------------------------------------------------------------------
@@ -34,7 +56,7 @@ def get_latest_sim_time():
         # 만약 DB가 텅 비어있는 완전 초기 상태라면 오늘 09시로 시작
         return datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
 
-current_sim_time = get_latest_sim_time()
+current_sim_time = None  # 루프 시작 시 DB에서 채움 (import 시점에는 DB 조회 없음)
 
 # ------------------------------------------------------------------
 # 1. 마켓 메이커 (Market Maker)
@@ -44,9 +66,9 @@ def run_global_market_maker(db: Session, all_tickers: list, sim_time: datetime):
     mm_agent = db.query(DBAgent).filter(DBAgent.agent_id == mm_id).first()
    
     if not mm_agent:
-        initial_portfolio = {ticker: 1000000 for ticker in all_tickers}
-        mm_agent = DBAgent(agent_id=mm_id, cash_balance=1e15, portfolio=initial_portfolio, psychology={})
+        mm_agent = DBAgent(agent_id=mm_id, cash_balance=1e15, psychology={})
         db.add(mm_agent)
+        set_portfolio(db, mm_id, {ticker: 1000000 for ticker in all_tickers})
         db.commit()
 
     for ticker in all_tickers:
@@ -60,152 +82,260 @@ def run_global_market_maker(db: Session, all_tickers: list, sim_time: datetime):
         try:
             market_engine.place_order(db, Order(agent_id=mm_id, ticker=ticker, side=OrderSide.BUY, order_type=OrderType.LIMIT, quantity=qty, price=curr_price - spread), sim_time)
             market_engine.place_order(db, Order(agent_id=mm_id, ticker=ticker, side=OrderSide.SELL, order_type=OrderType.LIMIT, quantity=qty, price=curr_price + spread), sim_time)
-        except: pass
+        except Exception as e:
+            db.rollback()
+            ERRORS_TOTAL.inc(component="market_maker")
+            logger.debug(f"마켓메이커 호가 실패 ({ticker}): {e}")
+
+# ------------------------------------------------------------------
+# 1-1. 배경 인구 (BACKGROUND_AGENTS명, 벡터 연산 단일가 매매)
+# ------------------------------------------------------------------
+population = None
+_population_rng = np.random.default_rng(POPULATION_SEED)
+
+def run_background_market(db: Session, all_tickers: list, sim_time: datetime):
+    """배경 인구가 한 번에 판단/주문 → 종목별 단일가 체결 → 체결가를 시세와 체결 기록에 반영"""
+    global population
+    if BACKGROUND_AGENTS <= 0 or not all_tickers: return
+    prices = {t: p for t, p in db.query(DBCompany.ticker, DBCompany.current_price).all()}
+    px = np.array([prices.get(t) or 0.0 for t in all_tickers], dtype=np.float64)
+    if population is None or population.tickers != list(all_tickers):
+        population = Population.load_or_create(POPULATION_DIR, BACKGROUND_AGENTS, all_tickers, POPULATION_SEED, px)
+
+    indicators = get_indicators(db)
+    snaps = [indicators.get(t) for t in population.tickers]
+    momentum = np.array([s["return_pct"] for s in snaps], dtype=np.float64)
+    # VWAP 대비 저평가 정도 (%) - 가치 투자자는 싸면 삼
+    vwap = np.array([s["vwap"] or p for s, p in zip(snaps, px)], dtype=np.float64)
+    value_gap = np.where(px > 0, (vwap - px) / np.maximum(px, 1) * 100, 0.0)
+
+    try:
+        for ticker, (price, qty) in population.step(px, momentum, value_gap, _population_rng).items():
+            market_engine.record_auction(db, ticker, price, qty, sim_time)
+        population.flush()
+    except Exception as e:
+        db.rollback()
+        ERRORS_TOTAL.inc(component="population")
+        logger.debug(f"배경 인구 체결 실패: {e}")
 
 # ------------------------------------------------------------------
 # [Helper] 추세 분석
 # ------------------------------------------------------------------
 def analyze_market_trend(db: Session, ticker: str):
-    trades = db.query(DBTrade).filter(DBTrade.ticker == ticker).order_by(desc(DBTrade.timestamp)).limit(20).all()
-    if not trades: return "정보 없음 (탐색 단계)"
-   
-    start_p = trades[-1].price
-    end_p = trades[0].price
-   
-    if end_p > start_p * 1.02: return "🔥 급등세 (매수세 강함)"
-    elif end_p > start_p: return "📈 완만한 상승"
-    elif end_p < start_p * 0.98: return "😱 급락세 (투매 발생)"
-    elif end_p < start_p: return "📉 하락세"
-    else: return "⚖️ 보합세 (눈치보기)"
+    # 최근 20건 체결 기준 추세 (체결마다 증분 갱신되는 지표에서 O(1) 조회)
+    return get_indicators(db).trend(ticker)
 
 # ------------------------------------------------------------------
 # 2. 에이전트 거래 실행
 # ------------------------------------------------------------------
-async def run_agent_trade(agent_id: str, ticker: str, sim_time: datetime):
+def _ticker_context(db: Session, company: DBCompany):
+    """종목 공통 정보 (뉴스 제목, 추세 + 종토방 여론) - 배치 모드에선 종목당 1번만 조회"""
+    news_obj = get_news_cache(db).latest(company.ticker)
+    news_text = news_obj.title if news_obj else "특이사항 없음"
+    trend_info = analyze_market_trend(db, company.ticker)
+
+    discussions = get_discussions(db)
+    recent_posts = discussions.recent(company.ticker, 3)
+    social_context = "커뮤니티 글 없음"
+    if recent_posts:
+        posts_summary = " | ".join([f"[{p.sentiment}] {p.content}" for p in recent_posts])
+        counts = discussions.sentiment(company.ticker)
+        social_context = f"🗣️ 투자자들 반응(BULL {counts['BULL']}:BEAR {counts['BEAR']}): {posts_summary}"
+    return news_text, f"{trend_info} / {social_context}"
+
+
+def _agent_context(db: Session, agent: DBAgent, company: DBCompany) -> dict:
+    # 보유 수량/평균단가는 positions 원장에서 (체결가 기준 가중평균)
+    portfolio_qty, avg_price = get_position(db, agent.agent_id, company.ticker)
+    if portfolio_qty > 0 and avg_price == 0: avg_price = company.current_price
+    return {
+        "agent_name": agent.agent_id,
+        "cash": agent.cash_balance,
+        "portfolio_qty": portfolio_qty,
+        "avg_price": avg_price,
+        # 직전 기억은 psychology가 아니라 기억 저장소(종목별 링버퍼)에서
+        "last_action_desc": AGENT_MEMORY.last_thought(db, agent.agent_id, company.ticker),
+    }
+
+
+async def decide_agent_trade(agent_id: str, ticker: str) -> list:
+    """에이전트 1명 판단 (LLM) → [PendingDecision] (주문은 execute_decisions에서)"""
     with SessionLocal() as db:
         try:
             agent = db.query(DBAgent).filter(DBAgent.agent_id == agent_id).first()
             company = db.query(DBCompany).filter(DBCompany.ticker == ticker).first()
-            if not agent or not company: return
+            if not agent or not company: return []
 
-            news_obj = db.query(DBNews).filter(DBNews.company_name == company.name).order_by(desc(DBNews.id)).first()
-            news_text = news_obj.title if news_obj else "특이사항 없음"
-            trend_info = analyze_market_trend(db, ticker)
+            news_text, market_sentiment = _ticker_context(db, company)
+            ctx = _agent_context(db, agent, company)
+            price = company.current_price
+        except Exception as e:
+            db.rollback()
+            ERRORS_TOTAL.inc(component="agent_trade")
+            logger.debug(f"❌ [{agent_id}] {ticker} 판단 준비 실패: {e}")
+            return []
 
-            recent_posts = db.query(DBDiscussion).filter(DBDiscussion.ticker == ticker).order_by(desc(DBDiscussion.created_at)).limit(3).all()
-            social_context = "커뮤니티 글 없음"
-            if recent_posts:
-                posts_summary = " | ".join([f"[{p.sentiment}] {p.content}" for p in recent_posts])
-                social_context = f"🗣️ 투자자들 반응: {posts_summary}"
+        decision = await agent_society_think(
+            agent_name=agent_id,
+            agent_state=AgentState.from_psychology(agent.psychology),
+            context_info=news_text,
+            current_price=price,
+            cash=ctx["cash"],
+            portfolio_qty=ctx["portfolio_qty"],
+            avg_price=ctx["avg_price"],
+            last_action_desc=ctx["last_action_desc"],
+            market_sentiment=market_sentiment
+        )
+        return [PendingDecision(agent_id, ticker, decision, price, time.monotonic())]
 
-            portfolio_qty = agent.portfolio.get(ticker, 0)
-            avg_price = agent.psychology.get(f"avg_price_{ticker}", 0)
-            if portfolio_qty > 0 and avg_price == 0: avg_price = company.current_price
-            last_thought = agent.psychology.get(f"last_thought_{ticker}", None)
 
-            decision = await agent_society_think(
-                agent_name=agent.agent_id,
-                agent_state=AgentState(**agent.psychology),
-                context_info=news_text,
-                current_price=company.current_price,
-                cash=agent.cash_balance,
-                portfolio_qty=portfolio_qty,
-                avg_price=avg_price,
-                last_action_desc=last_thought,
-                market_sentiment=f"{trend_info} / {social_context}"
-            )
-           
-            action = str(decision.get("action", "HOLD")).upper()
-            thought = str(decision.get("thought_process", "생각 없음"))
-           
-            # 파싱 에러 방어벽
-            try:
-                qty_raw = decision.get("quantity", 0)
-                if qty_raw in [None, "None", "null", ""]:
-                    qty = 0
-                else:
-                    qty = int(float(qty_raw))
-            except (ValueError, TypeError):
-                qty = 0
-           
+async def decide_agent_trade_batch(agent_ids: list, ticker: str) -> list:
+    """같은 종목 x 같은 페르소나 에이전트들을 LLM 호출 1번으로 판단"""
+    with SessionLocal() as db:
+        try:
+            company = db.query(DBCompany).filter(DBCompany.ticker == ticker).first()
+            agents = db.query(DBAgent).filter(DBAgent.agent_id.in_(agent_ids)).all()
+            if not company or not agents: return []
+
+            news_text, market_sentiment = _ticker_context(db, company)
+            contexts = [_agent_context(db, agent, company) for agent in agents]
+            price = company.current_price
+        except Exception as e:
+            db.rollback()
+            ERRORS_TOTAL.inc(component="agent_trade")
+            logger.debug(f"❌ {ticker} 배치 판단 준비 실패 ({len(agent_ids)}명): {e}")
+            return []
+
+        decisions = await agent_society_think_batch(
+            get_agent_persona(agents[0].agent_id), price, news_text, market_sentiment, contexts
+        )
+        now = time.monotonic()
+        return [PendingDecision(ctx["agent_name"], ticker, d, price, now) for ctx, d in zip(contexts, decisions)]
+
+
+async def decide_trades(assignments: list) -> list:
+    """[(agent_id, ticker)] 전체 판단. 배치 모드면 (종목, 페르소나)별로 묶고 현재 배치 크기로 자름"""
+    if not BATCH_DECISIONS:
+        jobs = [decide_agent_trade(agent_id, ticker) for agent_id, ticker in assignments]
+    else:
+        groups = {}
+        for agent_id, ticker in assignments:
+            groups.setdefault((ticker, get_agent_persona(agent_id)[0]), []).append(agent_id)
+
+        jobs, size = [], BATCH_SIZER.size
+        for (ticker, _), agent_ids in groups.items():
+            for i in range(0, len(agent_ids), size):
+                chunk = agent_ids[i:i + size]
+                # 혼자면 단건 프롬프트가 더 짧음
+                jobs.append(decide_agent_trade(chunk[0], ticker) if len(chunk) == 1 else decide_agent_trade_batch(chunk, ticker))
+    results = await asyncio.gather(*jobs)
+    return [p for group in results for p in group]
+
+
+async def execute_decisions(pending: list, sim_time: datetime):
+    """판단 결과를 주문으로 제출 (한 명의 실패가 나머지를 막지 않도록 개별 처리)
+    체결/DB 작업은 동기라 주문 1건마다 이벤트 루프에 양보 → 선행 판단 태스크가 LLM 요청을 보내고 응답을 받음"""
+    with SessionLocal() as db:
+        companies = {c.ticker: c for c in db.query(DBCompany).filter(DBCompany.ticker.in_({p.ticker for p in pending}))}
+        for p in pending:
+            company = companies.get(p.ticker)
+            if not company: continue
             try:
-                price_raw = decision.get("price", company.current_price)
-                if price_raw in [None, "None", "null", ""]:
-                    ai_target_price = int(company.current_price)
-                else:
-                    ai_target_price = int(float(price_raw))
-            except (ValueError, TypeError):
-                ai_target_price = int(company.current_price)
-           
-            # 🔥 [로깅 추가] 관망(HOLD) 결정 시 터미널에 이유 출력
-            if action == "HOLD" or qty == 0:
-                logger.info(f"🤔 [{agent_id}] {ticker} 관망: {thought[:30]}...")
-                return
+                _execute_decision(db, p.agent_id, company, p.decision, sim_time)
+            except Exception as e:
+                db.rollback()
+                ERRORS_TOTAL.inc(component="agent_trade")
+                logger.debug(f"❌ [{p.agent_id}] {p.ticker} 매매 처리 실패: {e}")
+            await asyncio.sleep(0)
 
-            is_market_order = random.random() < 0.7
-            curr_p = company.current_price
-            final_price = ai_target_price
-            order_desc = "지정가"
-
-            if action == "BUY":
-                if is_market_order:
-                    final_price = int(curr_p * 1.02)
-                    order_desc = "시장가(돌파)"
-                else:
-                    final_price = min(ai_target_price, int(curr_p * 0.99))
-           
-            elif action == "SELL":
-                if is_market_order:
-                    final_price = int(curr_p * 0.98)
-                    order_desc = "시장가(투매)"
-                else:
-                    final_price = max(ai_target_price, int(curr_p * 1.01))
-
-            new_psychology = dict(agent.psychology)
-            new_psychology[f"last_thought_{ticker}"] = f"{action} ({order_desc}) 선택: {thought}"
-           
-            if action == "BUY" and qty > 0 and is_market_order:
-                old_total = portfolio_qty * avg_price
-                new_total = qty * final_price
-                new_avg = (old_total + new_total) / (portfolio_qty + qty)
-                new_psychology[f"avg_price_{ticker}"] = new_avg
-
-            agent.psychology = new_psychology
-            db.commit()
-
-            if action in ["BUY", "SELL"] and qty > 0:
-                side = OrderSide.BUY if action == "BUY" else OrderSide.SELL
-                order = Order(agent_id=agent.agent_id, ticker=ticker, side=side, order_type=OrderType.LIMIT, quantity=qty, price=final_price)
-               
-                # 🔥 [로깅 추가] 주문 제출 시 터미널 출력
-                action_kor = "매수" if action == "BUY" else "매도"
-                logger.info(f"📝 [{agent_id}] {ticker} {action_kor} 주문 접수! ({qty}주, {final_price}원) - {thought[:20]}...")
-               
-                result = market_engine.place_order(db, order, sim_time=sim_time)
-               
-                if result['status'] == 'SUCCESS':
-                    # 즉시 체결 완료
-                    logger.info(f"⚡ [{agent_id}] {ticker} 거래 즉시 체결! | {action_kor} {qty}주 | 🕒 {sim_time.strftime('%H:%M')}")
-                    post_comment(db, agent_id, ticker, action, company.name, sim_time=sim_time)
-                else:
-                    # 호가창에 등록되어 대기 중
-                    logger.info(f"⏳ [{agent_id}] {ticker} 호가창 대기 중 (PENDING)")
 
-        except Exception as e:
-            pass
+async def run_agent_trade(agent_id: str, ticker: str, sim_time: datetime):
+    """판단 후 바로 주문 (선행 처리 없이 에이전트 1명만 움직일 때)"""
+    await execute_decisions(await decide_agent_trade(agent_id, ticker), sim_time)
+
+
+def _execute_decision(db: Session, agent_id: str, company: DBCompany, decision: dict, sim_time: datetime):
+    """LLM 결정 → 주문가 산정 → 기억 저장 → 주문 제출 (단건/배치 공용)"""
+    ticker = company.ticker
+    action = str(decision.get("action", "HOLD")).upper()
+    thought = str(decision.get("thought_process", "생각 없음"))
+   
+    # 파싱 에러 방어벽
+    try:
+        qty_raw = decision.get("quantity", 0)
+        if qty_raw in [None, "None", "null", ""]:
+            qty = 0
+        else:
+            qty = int(float(qty_raw))
+    except (ValueError, TypeError):
+        qty = 0
+   
+    try:
+        price_raw = decision.get("price", company.current_price)
+        if price_raw in [None, "None", "null", ""]:
+            ai_target_price = int(company.current_price)
+        else:
+            ai_target_price = int(float(price_raw))
+    except (ValueError, TypeError):
+        ai_target_price = int(company.current_price)
+   
+    # 🔥 [로깅 추가] 관망(HOLD) 결정 시 터미널에 이유 출력
+    if action == "HOLD" or qty == 0:
+        logger.info(f"🤔 [{agent_id}] {ticker} 관망: {thought[:30]}...")
+        return
+
+    is_market_order = random.random() < 0.7
+    curr_p = company.current_price
+    final_price = ai_target_price
+    order_desc = "지정가"
+
+    if action == "BUY":
+        if is_market_order:
+            final_price = int(curr_p * 1.02)
+            order_desc = "시장가(돌파)"
+        else:
+            final_price = min(ai_target_price, int(curr_p * 0.99))
+   
+    elif action == "SELL":
+        if is_market_order:
+            final_price = int(curr_p * 0.98)
+            order_desc = "시장가(투매)"
+        else:
+            final_price = max(ai_target_price, int(curr_p * 1.01))
+
+    # 기억은 메모리에 쌓아두고 틱 끝에서 한 번에 DB flush
+    AGENT_MEMORY.remember(agent_id, ticker, Decision(action, order_desc, thought, final_price, qty, sim_time))
+
+    if action in ["BUY", "SELL"] and qty > 0:
+        side = OrderSide.BUY if action == "BUY" else OrderSide.SELL
+        order = Order(agent_id=agent_id, ticker=ticker, side=side, order_type=OrderType.LIMIT, quantity=qty, price=final_price)
+       
+        # 🔥 [로깅 추가] 주문 제출 시 터미널 출력
+        action_kor = "매수" if action == "BUY" else "매도"
+        logger.info(f"📝 [{agent_id}] {ticker} {action_kor} 주문 접수! ({qty}주, {final_price}원) - {thought[:20]}...")
+       
+        result = market_engine.place_order(db, order, sim_time=sim_time)
+       
+        if result['status'] == 'SUCCESS':
+            # 즉시 체결 완료
+            logger.info(f"⚡ [{agent_id}] {ticker} 거래 즉시 체결! | {action_kor} {qty}주 | 🕒 {sim_time.strftime('%H:%M')}")
+            post_comment(agent_id, ticker, action, company.name, sim_time=sim_time)
+        else:
+            # 호가창에 등록되어 대기 중
+            logger.info(f"⏳ [{agent_id}] {ticker} 호가창 대기 중 (PENDING)")
 
 # ------------------------------------------------------------------
 # 3. 글로벌 라운지 (커뮤니티)
 # ------------------------------------------------------------------
 async def run_global_chatter(agent_id: str, sim_time: datetime):
-    await asyncio.sleep(random.uniform(0.5, 2.0))
+    await asyncio.sleep(random.uniform(*CHATTER_DELAY_RANGE))
    
     with SessionLocal() as db:
         try:
             agent = db.query(DBAgent).filter(DBAgent.agent_id == agent_id).first()
             if not agent: return
            
-            port_summary = ", ".join([f"{k} {v}주" for k, v in agent.portfolio.items()]) or "보유 주식 없음"
+            port_summary = ", ".join([f"{k} {v}주" for k, v in get_portfolio(db, agent_id).items()]) or "보유 주식 없음"
            
             context_prompt = (
                 f"현재 당신의 계좌 상태 - 잔고: {agent.cash_balance}원, 보유주식: {port_summary}. "
@@ -217,7 +347,7 @@ async def run_global_chatter(agent_id: str, sim_time: datetime):
            
             decision = await agent_society_think(
                 agent_name=agent.agent_id,
-                agent_state=AgentState(**agent.psychology),
+                agent_state=AgentState.from_psychology(agent.psychology),
                 context_info=context_prompt,
                 current_price=0,
                 cash=agent.cash_balance,
@@ -236,20 +366,13 @@ async def run_global_chatter(agent_id: str, sim_time: datetime):
             bull_keywords = ["가즈아", "수익", "풀매수", "달달", "떡상", "기회", "반등", "샀", "오른다"]
             sentiment = "BULL" if any(w in chatter for w in bull_keywords) else "BEAR"
            
-            new_post = DBDiscussion(
-                ticker="GLOBAL",
-                agent_id=agent.agent_id,
-                content=chatter,
-                sentiment=sentiment,
-                created_at=sim_time
-            )
-            db.add(new_post)
-            db.commit()
+            DISCUSSIONS.add("GLOBAL", agent.agent_id, chatter, sentiment, sim_time)
            
             # 🔥 [로깅 유지] 종토방에 글 썼을 때 터미널 출력
             logger.info(f"💬 [시장 라운지] {agent_id}: {chatter}")
            
         except Exception as e:
+            ERRORS_TOTAL.inc(component="global_chatter")
             logger.error(f"❌ [시장 라운지 에러] {agent_id} 글쓰기 실패: {e}")
 
 # ------------------------------------------------------------------
@@ -277,9 +400,11 @@ async def clock_ticker():
                         # 현재 가격을 전일 종가 칸에 저장
                         comp.prev_close_price = comp.current_price
                     db.commit()
+                    RESPONSE_CACHE.invalidate("trades")  # 등락률 기준가가 바뀜
                     logger.info(f"✅ 총 {len(all_companies)}개 종목 전일 종가 업데이트 완료.")
                 except Exception as e:
                     db.rollback()
+                    ERRORS_TOTAL.inc(component="market_close")
                     logger.error(f"❌ 장 마감 종가 저장 중 오류: {e}")
             
             # 다음날 아침 09:00으로 점프
@@ -289,45 +414,113 @@ async def clock_ticker():
 # ------------------------------------------------------------------
 # 4. 메인 시뮬레이션 루프
 # ------------------------------------------------------------------
+async def run_simulation_tick(sim_time: datetime, n_active: int = ACTIVE_AGENTS_PER_TICK):
+    """한 틱: 마켓메이커 호가 → (미리 받아둔) 판단 수거 → 다음 틱 판단 시작 → 주문/커뮤니티"""
+    queries_before = DB_QUERIES_TOTAL.value()
+    with TICK_SECONDS.time():
+        await _run_tick_body(sim_time, n_active)
+    TICK_DB_QUERIES.observe(DB_QUERIES_TOTAL.value() - queries_before)
+
+def _pick_assignments(all_agents: list, all_tickers: list, n_active: int, exclude=()) -> list:
+    """n_active명 선발 + 종목 배정 [(agent_id, ticker)]"""
+    if TRIGGER_MODE == "events":
+        with SessionLocal() as db:
+            return schedule_triggered(db, EVENT_BUS.drain(), all_agents, all_tickers, n_active,
+                                      persona_of=lambda a: get_agent_persona(a)[0], exclude=exclude)
+
+    candidates = [a for a in all_agents if a not in exclude]
+    active_agents = random.sample(candidates, k=n_active) if len(candidates) > n_active else candidates
+    return [(agent_id, random.choice(all_tickers)) for agent_id in active_agents]
+
+async def _run_tick_body(sim_time: datetime, n_active: int):
+    # 1. 에이전트들의 행동 로직
+    with SessionLocal() as db:
+        all_companies = db.query(DBCompany).all()
+        all_tickers = [c.ticker for c in all_companies]
+        # 뉴스 공장이 비축해 둔 뉴스를 가상 시간에 맞춰 발행 (틱은 뉴스 생성을 기다리지 않음)
+        try:
+            for item in NEWS_PUBLISHER.release_due(db, sim_time):
+                if item.ticker:
+                    EVENT_BUS.observe_news(item.ticker, item.id, item.impact_score)
+        except Exception as e:
+            db.rollback()
+            ERRORS_TOTAL.inc(component="news_publisher")
+            logger.debug(f"뉴스 발행 실패: {e}")
+        if TRIGGER_MODE == "events":
+            # 다른 프로세스가 쓴 새 종토방 글을 이벤트로 변환
+            EVENT_BUS.poll_db(db)
+
+        run_global_market_maker(db, all_tickers, sim_time)
+        run_background_market(db, all_tickers, sim_time)
+        all_agents = [a.agent_id for a in db.query(DBAgent.agent_id).all() if a.agent_id != "MARKET_MAKER" and not a.agent_id.startswith("USER_")]
+        prices = {t: p for t, p in db.query(DBCompany.ticker, DBCompany.current_price).all()}
+
+    if not all_tickers: return
+
+    # 2. 이번 틱 판단: 지난 틱에 미리 시작해 둔 것이 있으면 수거, 없으면 지금 판단
+    pending = await PIPELINE.take()
+    if pending is None:
+        pending = await decide_trades(_pick_assignments(all_agents, all_tickers, n_active))
+    else:
+        pending, stale = PIPELINE.split_stale(pending, prices)
+        if stale and PIPELINE.policy == "redecide":
+            pending += await decide_trades([(p.agent_id, p.ticker) for p in stale])
+
+    # 3. 다음 틱 판단을 미리 시작 → LLM 대기가 아래 체결/DB 작업과 겹침
+    if PIPELINE.enabled:
+        busy = {p.agent_id for p in pending}
+        next_assignments = _pick_assignments(all_agents, all_tickers, n_active, exclude=busy)
+        PIPELINE.prefetch(decide_trades(next_assignments))
+
+    # 커뮤니티 작성 세팅
+    chatter = None
+    if pending and random.random() < 0.3:
+        chatter = asyncio.create_task(run_global_chatter(random.choice(pending).agent_id, sim_time))
+
+    # 4. 주문 제출/체결 (주문마다 양보하므로 위에서 시작한 선행 판단이 그 사이에 진행됨)
+    await execute_decisions(pending, sim_time)
+    if chatter:
+        await chatter
+
+    # 이번 틱의 의사결정 기억 / 종토방 글을 한 번에 저장
+    with SessionLocal() as db:
+        try:
+            AGENT_MEMORY.flush(db)
+        except Exception as e:
+            db.rollback()
+            ERRORS_TOTAL.inc(component="agent_memory")
+            logger.debug(f"❌ 에이전트 기억 저장 실패: {e}")
+        try:
+            DISCUSSIONS.flush(db)
+        except Exception as e:
+            ERRORS_TOTAL.inc(component="discussion")
+            logger.debug(f"❌ 종토방 글 저장 실패: {e}")
+
 async def run_simulation_loop():
     global current_sim_time
+    if current_sim_time is None:
+        current_sim_time = get_latest_sim_time()
     logger.info(f"🚀 [Time Warp] 시뮬레이션 가동! 시작 시간: {current_sim_time.strftime('%H:%M')} (현실 2초 = 가상 1분)")
    
     # 1. 시계를 백그라운드에서 돌리기 시작합니다 (에이전트 행동과 완전 분리)
     asyncio.create_task(clock_ticker())
+
+    # 📊 이벤트 루프 지연 측정 + API 서버로 메트릭 push (METRICS_PUSH_URL 설정 시)
+    asyncio.create_task(monitor_event_loop_lag())
+    push_url = os.getenv("METRICS_PUSH_URL")
+    if push_url:
+        asyncio.create_task(push_metrics_loop(push_url, job="simulation"))
    
     while True:
         try:
-            # 2. 에이전트들의 행동 로직
-            with SessionLocal() as db:
-                all_companies = db.query(DBCompany).all()
-                all_tickers = [c.ticker for c in all_companies]
-               
-                run_global_market_maker(db, all_tickers, current_sim_time)
-                all_agents = [a.agent_id for a in db.query(DBAgent.agent_id).all() if a.agent_id != "MARKET_MAKER" and not a.agent_id.startswith("USER_")]
-
-            # 15명 선발
-            active_agents = random.sample(all_agents, k=15) if len(all_agents) > 15 else all_agents
-           
-            tasks = []
-           
-            # 에이전트 매매 세팅
-            for agent_id in active_agents:
-                my_ticker = random.choice(all_tickers)
-                tasks.append(run_agent_trade(agent_id, my_ticker, current_sim_time))
-           
-            # 커뮤니티 작성 세팅
-            if active_agents and random.random() < 0.3:
-                chatty_agent = random.choice(active_agents)
-                tasks.append(run_global_chatter(chatty_agent, current_sim_time))
-           
-            # 에이전트 행동 시작
-            await asyncio.gather(*tasks)
+            # 2. 한 틱 실행
+            await run_simulation_tick(current_sim_time)
            
             # 너무 빨리 끝났을 경우를 대비한 짧은 휴식
             await asyncio.sleep(1)
 
         except Exception as e:
+            ERRORS_TOTAL.inc(component="main_loop")
             logger.error(f"🚨 메인 루프 치명적 에러: {e}")
             await asyncio.sleep(5)
 
@@ -1,14 +1,26 @@
 from sqlalchemy.orm import Session
-from database import DBCompany, DBAgent, DBTrade
+from database import DBCompany, DBTrade
 from domain_models import Order, OrderSide
+from order_book import OrderBook, RestingOrder, to_ticks, to_ns
+from liquidity import LiquidityInjector
 from datetime import datetime
+from leaderboard import LEADERBOARD
+from event_bus import EVENT_BUS
+from indicators import INDICATORS, get_indicators
+from agent_registry import AGENTS
+from response_cache import RESPONSE_CACHE
+from user_analytics import record_fill
+from positions import debit_cash, credit_cash, add_shares, remove_shares
+from metrics import ORDERS_TOTAL, ORDER_SECONDS, MATCH_SECONDS, TRADE_SECONDS, TRADES_TOTAL
 
 class MarketEngine:
     def __init__(self):
-        # 인메모리 호가창
+        # 인메모리 호가창 (ticker -> OrderBook)
         self.order_books = {}
         # 종목별 마지막 거래 '날짜'를 기억하는 메모리
         self.last_trade_dates = {}
+        # 유저 주문 발동가 인덱스 + 마켓메이커 유동성 공급
+        self.liquidity = LiquidityInjector()
 
     def _get_safe_time(self, db: Session, sim_time: datetime = None):
         if sim_time:
@@ -19,135 +31,127 @@ class MarketEngine:
         return datetime.now()
 
     def place_order(self, db: Session, order: Order, sim_time: datetime = None):
+        with ORDER_SECONDS.time():
+            return self._place_order(db, order, sim_time)
+
+    def _place_order(self, db: Session, order: Order, sim_time: datetime = None):
         safe_time = self._get_safe_time(db, sim_time)
         
         ticker = order.ticker
         if ticker not in self.order_books:
-            self.order_books[ticker] = {'BUY': [], 'SELL': []}
+            self.order_books[ticker] = OrderBook()
 
-        # 1. 유효성 검사 
-        agent = db.query(DBAgent).filter(DBAgent.agent_id == order.agent_id).first()
-        if not agent: return {"status": "FAIL", "msg": "에이전트 없음"}
+        # 1. 유효성 검사 (정수 id로 인터닝 - 처음 보는 에이전트만 DB 조회)
+        uid = AGENTS.uid(db, order.agent_id)
+        if uid is None: return {"status": "FAIL", "msg": "에이전트 없음"}
+        ORDERS_TOTAL.inc(side=order.side.value)
         
-        # 2. 주문서 작성
-        new_order = {
-            "agent_id": order.agent_id,
-            "price": int(order.price) if order.price else 0,
-            "quantity": order.quantity,
-            "side": order.side,
-            "timestamp": safe_time 
-        }
-
-        # 3. 호가창에 등록 및 정렬
-        book = self.order_books[ticker]
-        if order.side == OrderSide.BUY:
-            book['BUY'].append(new_order)
-            book['BUY'].sort(key=lambda x: x['price'], reverse=True)
-        else:
-            book['SELL'].append(new_order)
-            book['SELL'].sort(key=lambda x: x['price'])
+        # 2. 주문서 작성 + 3. 호가창에 우선순위 자리로 삽입
+        resting = RestingOrder(uid, to_ticks(order.price), order.quantity, order.side == OrderSide.BUY, to_ns(safe_time))
+        self.order_books[ticker].add(resting)
+        if AGENTS.is_human(uid):
+            self.liquidity.watch(ticker, resting)
 
         # 4. 매칭 엔진 가동
-        return self._match_orders(db, ticker, safe_time)
+        with MATCH_SECONDS.time():
+            return self._match_orders(db, ticker, safe_time)
 
     def _match_orders(self, db: Session, ticker: str, safe_time: datetime):
         book = self.order_books[ticker]
         logs = []
         
         # -------------------------------------------------------------
-        # 🚀 [핵심 추가] 유저 VIP 스마트 대기열 시스템 (가격이 얼추 비슷해지면 가짜물량 투입!)
+        # 🚀 유저 VIP 스마트 대기열 (가격이 얼추 비슷해지면 마켓메이커 물량 투입!)
+        # 대기 중인 유저 주문이 없으면 현재가 조회조차 하지 않음
         # -------------------------------------------------------------
-        company = db.query(DBCompany).filter(DBCompany.ticker == ticker).first()
-        if company and company.current_price > 0:
-            curr_p = company.current_price
-            
-            # 매수(BUY) 대기열 검사: 내 매수 희망가가 현재가의 95% 이상으로 얼추 가까워졌다면!
-            for b_order in book['BUY']:
-                if b_order['agent_id'].startswith("USER_") and not b_order.get('is_vip_filled'):
-                    if b_order['price'] >= (curr_p * 0.95):  
-                        # 마켓메이커가 즉시 판매 물량을 만들어줌
-                        book['SELL'].append({
-                            "agent_id": "MARKET_MAKER",
-                            "price": b_order['price'],
-                            "quantity": b_order['quantity'],
-                            "side": OrderSide.SELL,
-                            "timestamp": safe_time
-                        })
-                        b_order['is_vip_filled'] = True # 무한 생성 방지
-
-            # 매도(SELL) 대기열 검사: 내 매도 희망가가 현재가의 105% 이하로 얼추 가까워졌다면!
-            for s_order in book['SELL']:
-                if s_order['agent_id'].startswith("USER_") and not s_order.get('is_vip_filled'):
-                    if s_order['price'] <= (curr_p * 1.05):  
-                        # 마켓메이커가 즉시 구매 물량을 만들어줌
-                        book['BUY'].append({
-                            "agent_id": "MARKET_MAKER",
-                            "price": s_order['price'],
-                            "quantity": s_order['quantity'],
-                            "side": OrderSide.BUY,
-                            "timestamp": safe_time
-                        })
-                        s_order['is_vip_filled'] = True
-                        
-            # 가짜 물량 투입 후 가격순 재정렬
-            book['BUY'].sort(key=lambda x: x['price'], reverse=True)
-            book['SELL'].sort(key=lambda x: x['price'])
+        if self.liquidity.has_pending(ticker):
+            curr_p = db.query(DBCompany.current_price).filter(DBCompany.ticker == ticker).scalar()
+            mm_uid = AGENTS.uid(db, "MARKET_MAKER")
+            if curr_p and mm_uid is not None:
+                for mm_order in self.liquidity.inject(ticker, curr_p, mm_uid, to_ns(safe_time)):
+                    book.add(mm_order)
 
         # -------------------------------------------------------------
         # 기존 체결 로직
         # -------------------------------------------------------------
-        while book['BUY'] and book['SELL']:
-            best_buy = book['BUY'][0]
-            best_sell = book['SELL'][0]
+        bids, asks = book.bids, book.asks
+        while bids and asks:
+            best_buy = bids.best()
+            best_sell = asks.best()
             
             # 가격이 안 맞으면 체결 중지
-            if best_buy['price'] < best_sell['price']:
+            if best_buy.price < best_sell.price:
                 break
             
             # 합리적 중간가 체결
-            trade_price = int((best_buy['price'] + best_sell['price']) / 2)
-            trade_qty = min(best_buy['quantity'], best_sell['quantity'])
+            trade_price = int((best_buy.price + best_sell.price) / 2)
+            trade_qty = min(best_buy.quantity, best_sell.quantity)
             
             # DB 업데이트 실행
             self._execute_trade(db, ticker, best_buy, best_sell, trade_price, trade_qty, safe_time)
             
             logs.append(f"✅ 체결! {trade_price}원 ({trade_qty}주)")
             
-            best_buy['quantity'] -= trade_qty
-            best_sell['quantity'] -= trade_qty
+            best_buy.quantity -= trade_qty
+            best_sell.quantity -= trade_qty
             
-            if best_buy['quantity'] <= 0: book['BUY'].pop(0)
-            if best_sell['quantity'] <= 0: book['SELL'].pop(0)
+            if best_buy.quantity <= 0: bids.pop_best()
+            if best_sell.quantity <= 0: asks.pop_best()
 
         if logs:
+            RESPONSE_CACHE.invalidate_trades(ticker)  # 시세/랭킹/지표 응답 캐시 무효화 (매칭 1번에 1회)
             return {"status": "SUCCESS", "msg": ", ".join(logs)}
         else:
             return {"status": "PENDING", "msg": "주문 접수됨 (체결 대기 중)"}
 
     def _execute_trade(self, db: Session, ticker, buy_order, sell_order, price, qty, safe_time):
-        buyer = db.query(DBAgent).filter(DBAgent.agent_id == buy_order['agent_id']).first()
-        seller = db.query(DBAgent).filter(DBAgent.agent_id == sell_order['agent_id']).first()
+        with TRADE_SECONDS.time():
+            settled = self._settle_trade(db, ticker, buy_order, sell_order, price, qty, safe_time)
+        if settled:
+            TRADES_TOTAL.inc(ticker=ticker)
+
+    def _settle_trade(self, db: Session, ticker, buy_order, sell_order, price, qty, safe_time):
+        # 호가창에는 인터닝된 정수 id만 있음 → positions 원장/랭킹은 문자열 id를 쓰므로 여기서 풀어줌
+        buyer_uid, seller_uid = buy_order.uid, sell_order.uid
+        buyer_id, seller_id = AGENTS.name(buyer_uid), AGENTS.name(seller_uid)
         company = db.query(DBCompany).filter(DBCompany.ticker == ticker).first()
         
-        if not buyer or not seller: return
+        if buyer_id is None or seller_id is None: return False
         
         total_amt = price * qty
         
-        # 1. 구매자 처리
-        if buyer.cash_balance >= total_amt:
-            buyer.cash_balance -= total_amt
-            port = dict(buyer.portfolio)
-            port[ticker] = port.get(ticker, 0) + qty
-            buyer.portfolio = port
+        # 1. 구매자 처리 (잔고가 충분할 때만 원자적으로 차감 후 positions 증가)
+        if debit_cash(db, buyer_id, total_amt):
+            add_shares(db, buyer_id, ticker, qty, price)
+            LEADERBOARD.apply_fill(buyer_id, ticker, qty, -total_amt)
+            if AGENTS.is_human(buyer_uid):
+                record_fill(db, buyer_id, ticker, True, qty, price, safe_time)
             
-        # 2. 판매자 처리
-        if seller.portfolio.get(ticker, 0) >= qty:
-            seller.cash_balance += total_amt
-            port = dict(seller.portfolio)
-            port[ticker] -= qty
-            if port[ticker] <= 0: del port[ticker]
-            seller.portfolio = port
+        # 2. 판매자 처리 (보유 수량이 충분할 때만 원자적으로 차감 후 현금 입금)
+        if remove_shares(db, seller_id, ticker, qty):
+            credit_cash(db, seller_id, total_amt)
+            LEADERBOARD.apply_fill(seller_id, ticker, -qty, total_amt)
+            if AGENTS.is_human(seller_uid):
+                # 공포 매도 판정용 종목 최근 수익률 (이번 체결 직전 기준, 유저 매도 때만 꼬리 읽기)
+                recent_return = get_indicators(db).get(ticker)["return_pct"]
+                record_fill(db, seller_id, ticker, False, qty, price, safe_time, recent_return)
             
+        self._apply_price(company, ticker, price, safe_time)
+        self._record_trade(db, ticker, price, qty, buyer_uid, seller_uid, safe_time)
+        return True
+
+    def record_auction(self, db: Session, ticker: str, price: int, qty: int, sim_time: datetime = None):
+        """배경 인구(population) 단일가 체결 반영 - 인구 내부 거래라 원장 정산 없이 시세/체결 기록만 (uid 없음)"""
+        safe_time = self._get_safe_time(db, sim_time)
+        company = db.query(DBCompany).filter(DBCompany.ticker == ticker).first()
+        if not company: return False
+        self._apply_price(company, ticker, price, safe_time)
+        self._record_trade(db, ticker, price, qty, None, None, safe_time)
+        TRADES_TOTAL.inc(ticker=ticker)
+        RESPONSE_CACHE.invalidate_trades(ticker)
+        return True
+
+    def _apply_price(self, company: DBCompany, ticker: str, price, safe_time: datetime):
         # -------------------------------------------------------------
         # 시뮬레이션 날짜 변경 감지 및 전일 종가 완벽 업데이트 로직
         # -------------------------------------------------------------
@@ -169,12 +173,18 @@ class MarketEngine:
             
         company.current_price = float(price)
         company.change_rate = round(float(new_change_rate), 2)
-        
+        LEADERBOARD.update_price(ticker, float(price))  # 보유자들의 시가평가 자산 갱신
+        EVENT_BUS.observe_price(ticker, float(price))   # 급변 시 보유자/관심 에이전트 호출
+
+    def _record_trade(self, db: Session, ticker, price, qty, buyer_uid, seller_uid, safe_time: datetime):
         # 4. 거래 기록 저장
         trade = DBTrade(
             ticker=ticker, price=price, quantity=qty,
-            buyer_id=buyer.agent_id, seller_id=seller.agent_id,
+            buyer_uid=buyer_uid, seller_uid=seller_uid,
             timestamp=safe_time
         )
         db.add(trade)
-        db.commit()
\ No newline at end of file
+        db.flush()
+        trade_id = trade.id  # commit 후에는 만료되므로 flush 시점에 읽어둠
+        db.commit()
+        INDICATORS.on_fill(ticker, price, qty, trade_id)
\ No newline at end of file
@@ -2,22 +2,21 @@ import os
 import json
 import asyncio
 from datetime import datetime
-from openai import AsyncAzureOpenAI
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
 
 # 기존에 만든 파일들 임포트
-from database import DBAgent, DBCompany, DBNews, DBDiscussion, DBTrade
+from database import SessionLocal, DBAgent, DBCompany
 from mentor_personas import MentorType, MENTOR_PROFILES
+from llm_provider import chat_completion, chat_completion_stream
+from positions import get_position, get_portfolio
+from indicators import get_indicators
+from news_cache import get_news_cache
+from discussion_service import get_discussions
+from user_analytics import get_user_features, format_features, get_cached_solution, save_solution
 
 # -----------------------------------------------------------------------------
-# [설정] Azure OpenAI 클라이언트 세팅
+# [설정] LLM 클라이언트는 llm_provider에서 공유 (LLM_PROVIDER=stub 이면 로컬 스텁)
 # -----------------------------------------------------------------------------
-client = AsyncAzureOpenAI(
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT", "https://your-endpoint.openai.azure.com/"),
-    api_key=os.getenv("AZURE_OPENAI_API_KEY", "your-api-key"),
-    api_version="2024-02-15-preview"
-)
 DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
 
 # -----------------------------------------------------------------------------
@@ -31,20 +30,19 @@ def gather_observation_data(db: Session, ticker: str, user_id: str = "USER_01"):
         return None
 
     current_price = company.current_price
-    recent_trades = db.query(DBTrade).filter(DBTrade.ticker == ticker).order_by(desc(DBTrade.timestamp)).limit(10).all()
-    price_trend = [t.price for t in recent_trades] if recent_trades else [current_price]
+    indicators = get_indicators(db)
+    price_trend = indicators.recent_prices(ticker, 10) or [current_price]
 
-    recent_news = db.query(DBNews).filter(DBNews.company_name == company.name).order_by(desc(DBNews.id)).limit(3).all()
+    recent_news = get_news_cache(db).recent(ticker, 3)
     news_summaries = [f"- {n.title} ({n.summary})" for n in recent_news] if recent_news else ["- 최근 특별한 뉴스가 없습니다."]
 
-    recent_posts = db.query(DBDiscussion).filter(DBDiscussion.ticker == ticker).order_by(desc(DBDiscussion.created_at)).limit(5).all()
+    recent_posts = get_discussions(db).recent(ticker, 5)
     community_vibe = [f"[{p.sentiment}] {p.content}" for p in recent_posts] if recent_posts else ["- 조용함"]
 
     user_portfolio_qty = 0
     user_avg_price = 0
     if user:
-        user_portfolio_qty = user.portfolio.get(ticker, 0)
-        user_avg_price = user.psychology.get(f"avg_price_{ticker}", 0)
+        user_portfolio_qty, user_avg_price = get_position(db, user_id, ticker)
 
     profit_rate = 0
     if user_avg_price > 0:
@@ -54,6 +52,7 @@ def gather_observation_data(db: Session, ticker: str, user_id: str = "USER_01"):
         "company_name": company.name,
         "current_price": current_price,
         "price_trend": price_trend,
+        "indicators": indicators.get(ticker),
         "news": "\n".join(news_summaries),
         "community_vibe": "\n".join(community_vibe),
         "user_state": {
@@ -63,31 +62,29 @@ def gather_observation_data(db: Session, ticker: str, user_id: str = "USER_01"):
         }
     }
 
+def format_indicators(ind: dict) -> str:
+    if not ind or not ind.get("n"): return "체결 이력 부족"
+    return (f"{ind['trend']}, 최근 {ind['n']}건 수익률 {ind['return_pct']:+.2f}%, "
+            f"VWAP {ind['vwap']:,.0f}원, EMA {ind['ema']:,.0f}원, 변동성 {ind['volatility_pct']:.2f}%")
+
 # -----------------------------------------------------------------------------
-# 🔥 2. [NEW] 솔루션용 데이터 수집 (전체 계좌 및 매매 이력 요약)
+# 🔥 2. [NEW] 솔루션용 데이터 수집 (전체 계좌 + 미리 계산된 매매 습관 지표)
 # -----------------------------------------------------------------------------
 def gather_user_history_data(db: Session, user_id: str):
-    """유저의 전체 거래 내역과 현재 자산 상태를 분석하기 위해 수집합니다."""
+    """유저의 현재 자산 상태와 매매 습관 지표(user_analytics, 체결마다 증분 갱신)를 모읍니다."""
     user = db.query(DBAgent).filter(DBAgent.agent_id == user_id).first()
     if not user:
         return None
 
-    # 유저의 모든 종목에 걸친 최근 거래 내역 20개
-    trades = db.query(DBTrade).filter(DBTrade.agent_id == user_id).order_by(desc(DBTrade.timestamp)).limit(20).all()
-    
-    trade_logs = []
-    for t in trades:
-        side_kr = "매수" if t.side.name == "BUY" else "매도"
-        trade_logs.append(f"[{t.timestamp.strftime('%H:%M')}] {t.ticker} {t.quantity}주 {side_kr} (가격: {t.price:,.0f}원)")
-
-    history_summary = "\n".join(trade_logs) if trade_logs else "최근 거래 내역이 없습니다."
-    portfolio_summary = ", ".join([f"{ticker}: {qty}주" for ticker, qty in user.portfolio.items()]) or "보유 주식 없음"
+    features = get_user_features(db, user_id, user.cash_balance)
+    portfolio_summary = ", ".join([f"{ticker}: {qty}주" for ticker, qty in get_portfolio(db, user_id).items()]) or "보유 주식 없음"
 
     return {
         "user_id": user_id,
         "balance": f"{user.cash_balance:,.0f}원",
         "portfolio": portfolio_summary,
-        "trade_history": history_summary
+        "features": features,
+        "trade_habits": format_features(features)
     }
 
 # -----------------------------------------------------------------------------
@@ -113,13 +110,15 @@ async def ask_mentor(mentor_type: MentorType, obs_data: dict) -> dict:
 
     user_prompt = f"""
     [종목상황] {obs_data['company_name']}, 현재가 {obs_data['current_price']}원
+    [지표] {format_indicators(obs_data['indicators'])}
     [뉴스] {obs_data['news']}
     [여론] {obs_data['community_vibe']}
     [유저] 보유 {obs_data['user_state']['held_quantity']}주, 수익률 {obs_data['user_state']['profit_rate']}
     """
 
     try:
-        response = await client.chat.completions.create(
+        response = await chat_completion(
+            "mentor_advice",
             model=DEPLOYMENT_NAME,
             messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
             temperature=0.7,
@@ -131,13 +130,15 @@ async def ask_mentor(mentor_type: MentorType, obs_data: dict) -> dict:
         return {"opinion": "HOLD", "core_logic": "통신 장애", "feedback_to_user": "대기 중", "chat_message": "잠시만요!"}
 
 # 🔥 [NEW] 솔루션(투자 진단) 전용 멘토 질문 함수
+SOLUTION_FALLBACK_TEXT = "거래를 더 진행하시면 분석해 드릴게요!"
+
 async def ask_mentor_for_solution(mentor_type: MentorType, history_data: dict) -> dict:
     """유저의 거래 패턴을 보고 멘토의 성향대로 투자 진단을 내립니다."""
     persona = MENTOR_PROFILES[mentor_type]
     
     system_prompt = f"""
     당신은 투자 습관 진단가 '{persona.name}'입니다. {persona.tone}
-    유저의 최근 20개 거래 내역과 포트폴리오를 보고, 당신의 관점에서 독설하거나 조언하세요.
+    유저의 매매 습관 지표와 포트폴리오를 보고, 당신의 관점에서 독설하거나 조언하세요.
     
     반드시 아래 JSON으로만 응답하세요:
     {{
@@ -149,12 +150,12 @@ async def ask_mentor_for_solution(mentor_type: MentorType, history_data: dict) -
     user_prompt = f"""
     [유저 잔고] {history_data['balance']}
     [보유 주식] {history_data['portfolio']}
-    [최근 거래 이력]
-    {history_data['trade_history']}
+    [매매 습관] {history_data['trade_habits']}
     """
 
     try:
-        response = await client.chat.completions.create(
+        response = await chat_completion(
+            "mentor_solution",
             model=DEPLOYMENT_NAME,
             messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
             temperature=0.8,
@@ -162,59 +163,92 @@ async def ask_mentor_for_solution(mentor_type: MentorType, history_data: dict) -
         )
         return json.loads(response.choices[0].message.content)
     except:
-        return {"type": f"{persona.name}의 진단", "text": "거래를 더 진행하시면 분석해 드릴게요!"}
+        return {"type": f"{persona.name}의 진단", "text": SOLUTION_FALLBACK_TEXT}
 
 # -----------------------------------------------------------------------------
 # 4. [기존 유지] 통합 실행 함수
 # -----------------------------------------------------------------------------
+ADVICE_MENTORS = (MentorType.NEUTRAL, MentorType.VALUE, MentorType.MOMENTUM, MentorType.CONTRARIAN)
+
+async def _as_completed(coros):
+    """끝나는 순서대로 결과를 yield. 소비하는 쪽이 중간에 그만두면(연결 끊김) 남은 LLM 호출은 취소"""
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks: t.cancel()
+
 async def generate_all_mentors_advice(db: Session, ticker: str, user_id: str = "USER_01"):
     obs_data = gather_observation_data(db, ticker, user_id)
     if not obs_data: return {"error": "종목 데이터를 찾을 수 없습니다."}
 
-    tasks = [
-        ask_mentor(MentorType.NEUTRAL, obs_data),
-        ask_mentor(MentorType.VALUE, obs_data),
-        ask_mentor(MentorType.MOMENTUM, obs_data),
-        ask_mentor(MentorType.CONTRARIAN, obs_data)
-    ]
-    results = await asyncio.gather(*tasks)
-    
+    results = await asyncio.gather(*(ask_mentor(m, obs_data) for m in ADVICE_MENTORS))
     return {
-        MentorType.NEUTRAL.value: results[0],
-        MentorType.VALUE.value: results[1],
-        MentorType.MOMENTUM.value: results[2],
-        MentorType.CONTRARIAN.value: results[3],
+        **{m.value: r for m, r in zip(ADVICE_MENTORS, results)},
         "generated_at": datetime.now().isoformat()
     }
 
+async def stream_mentors_advice(obs_data: dict):
+    """스트리밍용: 멘토 4명 중 먼저 끝난 순서대로 (멘토 키, 조언) - 가장 느린 멘토를 기다리지 않음"""
+    async def run(mentor: MentorType):
+        return mentor.value, await ask_mentor(mentor, obs_data)
+    async for item in _as_completed(run(m) for m in ADVICE_MENTORS):
+        yield item
+
 # -----------------------------------------------------------------------------
 # 🔥 5. [NEW] 전체 솔루션 생성 (StockStatusContent.tsx 연동용)
 # -----------------------------------------------------------------------------
+# 프론트엔드 이미지와 매칭: 1:공격형(MOMENTUM), 2:안정형(VALUE), 3:비관형(CONTRARIAN)
+SOLUTION_MENTORS = (
+    (1, MentorType.MOMENTUM, "/Aggressive_Fox.png"),
+    (2, MentorType.VALUE, "/Stable_Fox.png"),
+    (3, MentorType.CONTRARIAN, "/Pessimistic_Fox.png"),
+)
+
+async def _solution_card(card_id: int, mentor: MentorType, image_url: str, history_data: dict) -> dict:
+    result = await ask_mentor_for_solution(mentor, history_data)
+    return {"id": card_id, "type": result.get("type"), "text": result.get("text"), "imageUrl": image_url}
+
+def _save_if_complete(db: Session, history_data: dict, cards: list):
+    # 통신 장애로 대체 문구가 섞인 결과는 저장하지 않음 (다음 요청 때 다시 시도)
+    if len(cards) == len(SOLUTION_MENTORS) and all(c["text"] != SOLUTION_FALLBACK_TEXT for c in cards):
+        save_solution(db, history_data["user_id"], history_data["features"], sorted(cards, key=lambda c: c["id"]))
+
 async def generate_user_investment_solution(db: Session, user_id: str):
-    """유저의 거래 내역을 분석하여 3가지 페르소나의 솔루션을 리스트로 반환합니다."""
+    """유저의 매매 습관 지표로 3가지 페르소나의 솔루션을 리스트로 반환합니다.
+    지표가 지난 진단 때와 크게 다르지 않으면 LLM을 부르지 않고 저장된 진단을 그대로 씁니다."""
     history_data = gather_user_history_data(db, user_id)
     if not history_data:
         return {"error": "유저 정보를 찾을 수 없습니다."}
 
-    # 프론트엔드 이미지와 매칭: 1:공격형(MOMENTUM), 2:안정형(VALUE), 3:비관형(CONTRARIAN)
-    tasks = [
-        ask_mentor_for_solution(MentorType.MOMENTUM, history_data),
-        ask_mentor_for_solution(MentorType.VALUE, history_data),
-        ask_mentor_for_solution(MentorType.CONTRARIAN, history_data)
-    ]
-    
-    results = await asyncio.gather(*tasks)
+    cached = get_cached_solution(db, user_id, history_data["features"])
+    if cached is not None:
+        return cached
+    cards = list(await asyncio.gather(*(_solution_card(*slot, history_data) for slot in SOLUTION_MENTORS)))
+    _save_if_complete(db, history_data, cards)
+    return cards
 
-    return [
-        {"id": 1, "type": results[0].get("type"), "text": results[0].get("text"), "imageUrl": "/Aggressive_Fox.png"},
-        {"id": 2, "type": results[1].get("type"), "text": results[1].get("text"), "imageUrl": "/Stable_Fox.png"},
-        {"id": 3, "type": results[2].get("type"), "text": results[2].get("text"), "imageUrl": "/Pessimistic_Fox.png"}
-    ]
+async def stream_user_solution(history_data: dict, cached: list = None):
+    """스트리밍용: 끝난 멘토부터 카드 1장씩 (id로 프론트 자리 매칭). 저장된 진단이 유효하면 바로 그것을 흘려보냄"""
+    if cached is not None:
+        for card in cached:
+            yield card
+        return
+    cards = []
+    async for card in _as_completed(_solution_card(*slot, history_data) for slot in SOLUTION_MENTORS):
+        cards.append(card)
+        yield card
+    # 요청 세션은 응답 시작 전에 닫혔을 수 있으므로 저장은 짧은 세션으로 따로
+    with SessionLocal() as db:
+        _save_if_complete(db, history_data, cards)
 
 # -----------------------------------------------------------------------------
 # 6. [기존 유지] 챗봇용 자유 대화
 # -----------------------------------------------------------------------------
-async def chat_with_mentor(agent_type_str: str, user_message: str) -> str:
+CHAT_ERROR_REPLY = "죄송합니다. 통신 오류가 발생했습니다."
+
+def _chat_messages(agent_type_str: str, user_message: str) -> list:
     try:
         mentor_type = MentorType[agent_type_str.upper()]
     except:
@@ -222,20 +256,38 @@ async def chat_with_mentor(agent_type_str: str, user_message: str) -> str:
 
     persona = MENTOR_PROFILES[mentor_type]
     system_prompt = f"당신은 {persona.name}입니다. {persona.tone}. 짧게 3~4문장으로 대답하세요."
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}]
 
+async def chat_with_mentor(agent_type_str: str, user_message: str) -> str:
     try:
-        response = await client.chat.completions.create(
+        response = await chat_completion(
+            "mentor_chat",
             model=DEPLOYMENT_NAME,
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}],
+            messages=_chat_messages(agent_type_str, user_message),
             temperature=0.8
         )
         return response.choices[0].message.content
     except Exception as e:
-        return "죄송합니다. 통신 오류가 발생했습니다."
+        return CHAT_ERROR_REPLY
+
+async def stream_chat_with_mentor(agent_type_str: str, user_message: str):
+    """토큰이 도착하는 대로 yield. 첫 조각 전에 실패하면 안내 문구로 대신하고, 도중에 끊기면 예외를 그대로 올림"""
+    sent = False
+    try:
+        async for delta in chat_completion_stream(
+            "mentor_chat",
+            model=DEPLOYMENT_NAME,
+            messages=_chat_messages(agent_type_str, user_message),
+            temperature=0.8
+        ):
+            sent = True
+            yield delta
+    except Exception:
+        if sent: raise
+        yield CHAT_ERROR_REPLY
 
 # [테스트용 실행 로직 유지]
 if __name__ == "__main__":
-    from database import SessionLocal
     async def test():
         db = SessionLocal()
         # 종목 조언 테스트
@@ -0,0 +1,234 @@
+import os
+import hmac
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+
+logger = logging.getLogger("Metrics")
+
+# ---------------------------------------------------------
+# 가벼운 Prometheus 스타일 메트릭 (외부 의존성 없음)
+# - 라벨 조합별로 dict 하나에 누적 → 핫패스 비용은 락 1번 + 덧셈 1번
+# - snapshot()은 JSON으로 직렬화 가능 → 시뮬레이션 프로세스가 API로 push
+# ---------------------------------------------------------
+# /metrics/push 공유 토큰 (API와 push 하는 프로세스가 같은 값). 비어 있으면 API는 localhost 에서 온 push만 받음
+METRICS_PUSH_TOKEN = os.getenv("METRICS_PUSH_TOKEN", "")
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name, self.help = name, help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def series(self):
+        return [{"labels": dict(k), "value": v} for k, v in list(self._values.items())]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name, self.help = name, help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            row = self._series.get(key)
+            if row is None:
+                row = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def series(self):
+        return [{"labels": dict(k), "buckets": row[:-2], "sum": row[-2], "count": row[-1]}
+                for k, row in list(self._series.items())]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text):
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, buckets))
+
+    def snapshot(self) -> dict:
+        snap = {}
+        for m in self._metrics.values():
+            entry = {"type": m.type, "help": m.help, "series": m.series()}
+            if m.type == "histogram":
+                entry["bucket_bounds"] = list(m.buckets)
+            snap[m.name] = entry
+        return snap
+
+
+def _escape_label(value) -> str:
+    """text exposition 포맷 라벨 값 이스케이프 (역슬래시, 큰따옴표, 줄바꿈)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: dict) -> str:
+    if not labels: return ""
+    body = ",".join(f'{k}="{_escape_label(v)}"' for k, v in sorted(labels.items()))
+    return "{" + body + "}"
+
+
+def render_prometheus(snapshots: dict) -> str:
+    """{job: snapshot} 여러 개를 메트릭 이름별로 묶어 text exposition 포맷으로 출력"""
+    families = {}
+    for job, snap in snapshots.items():
+        for name, entry in snap.items():
+            fam = families.setdefault(name, {"type": entry["type"], "help": entry["help"], "rows": []})
+            for s in entry["series"]:
+                fam["rows"].append((dict(s["labels"], job=job), s, entry.get("bucket_bounds")))
+
+    lines = []
+    for name in sorted(families):
+        fam = families[name]
+        if not fam["rows"]: continue
+        lines.append(f"# HELP {name} {fam['help']}")
+        lines.append(f"# TYPE {name} {fam['type']}")
+        for labels, s, bounds in fam["rows"]:
+            if fam["type"] == "histogram":
+                for bound, count in zip(bounds, s["buckets"]):
+                    lines.append(f"{name}_bucket{_fmt_labels(dict(labels, le=bound))} {count}")
+                lines.append(f"{name}_bucket{_fmt_labels(dict(labels, le='+Inf'))} {s['count']}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {s['sum']}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {s['count']}")
+            else:
+                lines.append(f"{name}{_fmt_labels(labels)} {s['value']}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ---------------------------------------------------------
+# 핫패스 메트릭 정의 (여기 한 곳에서 관리)
+# ---------------------------------------------------------
+ORDERS_TOTAL = REGISTRY.counter("engine_orders_total", "Orders accepted by the matching engine")
+ORDER_SECONDS = REGISTRY.histogram("engine_place_order_seconds", "MarketEngine.place_order latency")
+MATCH_SECONDS = REGISTRY.histogram("engine_match_seconds", "MarketEngine._match_orders latency")
+TRADE_SECONDS = REGISTRY.histogram("engine_trade_execute_seconds", "MarketEngine._execute_trade latency")
+TRADES_TOTAL = REGISTRY.counter("engine_trades_total", "Executed trades")
+LIQUIDITY_INJECTED_TOTAL = REGISTRY.counter("engine_liquidity_injected_total", "Market-maker orders injected for resting user orders")
+LIQUIDITY_INJECTED_SHARES = REGISTRY.counter("engine_liquidity_injected_shares", "Shares of market-maker liquidity injected for user orders")
+VIP_QUEUE_DEPTH = REGISTRY.gauge("engine_vip_queue_depth", "User orders waiting for their liquidity trigger price")
+
+DB_QUERIES_TOTAL = REGISTRY.counter("db_queries_total", "SQL statements sent to the database")
+TICK_SECONDS = REGISTRY.histogram("sim_tick_seconds", "Wall-clock time of one simulation tick")
+TICK_DB_QUERIES = REGISTRY.histogram("sim_tick_db_queries", "SQL round trips per simulation tick",
+                                     buckets=(10, 25, 50, 100, 250, 500, 1000, 2500, 5000))
+
+LLM_SECONDS = REGISTRY.histogram("llm_request_seconds", "LLM completion latency")
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram("llm_first_token_seconds", "Time to the first streamed LLM token")
+LLM_TOKENS_TOTAL = REGISTRY.counter("llm_tokens_total", "LLM tokens consumed")
+LLM_ERRORS_TOTAL = REGISTRY.counter("llm_errors_total", "Failed LLM completions")
+LLM_PROMPT_TOKENS = REGISTRY.histogram("llm_prompt_tokens", "Prompt size counted before sending",
+                                       buckets=(64, 128, 256, 384, 512, 768, 1024, 2048, 4096))
+LLM_CALLS_SKIPPED_TOTAL = REGISTRY.counter("llm_calls_skipped_total", "LLM calls avoided because the answer was forced")
+PREFETCH_DECISIONS_TOTAL = REGISTRY.counter("prefetch_decisions_total", "Prefetched agent decisions by staleness outcome")
+PREFETCH_WAIT_SECONDS = REGISTRY.histogram("prefetch_wait_seconds", "Time a tick waited for its prefetched decisions")
+MARKET_EVENTS_TOTAL = REGISTRY.counter("market_events_total", "Market events published on the event bus")
+AGENT_TRIGGERS_TOTAL = REGISTRY.counter("agent_triggers_total", "Agents scheduled for a decision, by reason")
+AGENT_BATCH_SIZE = REGISTRY.gauge("agent_batch_size", "Current adaptive batch size for batched agent decisions")
+NEWS_GENERATED_TOTAL = REGISTRY.counter("news_generated_total", "News items generated into the unpublished buffer")
+NEWS_PUBLISHED_TOTAL = REGISTRY.counter("news_published_total", "Buffered news items released on the simulation clock")
+NEWS_BUFFER_SIZE = REGISTRY.gauge("news_buffer_size", "Unpublished news items waiting to be released")
+
+CACHE_REQUESTS_TOTAL = REGISTRY.counter("cache_requests_total", "Cache lookups by result (hit/miss)")
+RESPONSE_CACHE_HIT_RATIO = REGISTRY.gauge("response_cache_hit_ratio", "Shared API response cache hit ratio in this process")
+HTTP_NOT_MODIFIED_TOTAL = REGISTRY.counter("http_not_modified_total", "Responses answered with 304 via If-None-Match")
+SSE_FIRST_EVENT_SECONDS = REGISTRY.histogram("sse_first_event_seconds", "Time from request to the first server-sent event")
+HTTP_RESPONSE_BYTES = REGISTRY.counter("http_response_bytes_total", "JSON response bytes before (raw) and after (sent) compression")
+LOOP_LAG_SECONDS = REGISTRY.histogram("event_loop_lag_seconds", "asyncio event loop scheduling lag")
+ERRORS_TOTAL = REGISTRY.counter("errors_total", "Exceptions caught and handled, by component")
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS_TOTAL.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def instrument_db_engine(engine):
+    """SQLAlchemy 엔진의 모든 SQL 실행 횟수를 센다 (틱당 DB 왕복 측정용)"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERIES_TOTAL.inc()
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """interval만큼 잠든 뒤 실제로 깨어난 시각과의 차이 = 이벤트 루프 지연"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+def push_token_ok(token: str, client_host: str) -> bool:
+    """/metrics/push 인증: 토큰이 설정돼 있으면 일치해야 하고, 없으면 같은 머신에서 온 요청만"""
+    if METRICS_PUSH_TOKEN:
+        return hmac.compare_digest(token or "", METRICS_PUSH_TOKEN)
+    return client_host in ("127.0.0.1", "::1", "localhost")
+
+
+async def push_metrics_loop(url: str, job: str, interval: float = 5.0):
+    """별도 프로세스(시뮬레이션)의 메트릭을 API의 /metrics/push 로 주기적으로 전송"""
+    import httpx
+    headers = {"X-Metrics-Token": METRICS_PUSH_TOKEN} if METRICS_PUSH_TOKEN else {}
+    async with httpx.AsyncClient(timeout=5.0, headers=headers) as http_client:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await http_client.post(url, json={"job": job, "metrics": REGISTRY.snapshot()})
+            except Exception as e:
+                ERRORS_TOTAL.inc(component="metrics_push")
+                logger.debug(f"metrics push 실패: {e}")
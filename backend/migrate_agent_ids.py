@@ -0,0 +1,47 @@
+from sqlalchemy import inspect, text, update, select, case
+from database import SessionLocal, DBAgent, DBTrade, engine, init_db
+from domain_models import AgentRole
+
+# 테이블별로 새로 생긴 컬럼 (기존 테이블엔 create_all이 추가해 주지 않음)
+NEW_COLUMNS = {
+    "agents": ["role_flags"],
+    "trades": ["buyer_uid", "seller_uid"],
+}
+
+def migrate():
+    """(1회성) agents.role_flags / trades.buyer_uid·seller_uid 추가 후 문자열 id 기준으로 채우기"""
+    init_db()
+    with engine.begin() as conn:
+        for table, columns in NEW_COLUMNS.items():
+            existing = {c["name"] for c in inspect(conn).get_columns(table)}
+            for column in columns:
+                if column not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER"))
+                    if table == "trades":
+                        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_trades_{column} ON trades ({column})"))
+
+    db = SessionLocal()
+    try:
+        # 1. 역할 비트 (AgentRole.for_agent_id와 같은 규칙)
+        roles = case(
+            (DBAgent.agent_id.like("USER\\_%", escape="\\"), int(AgentRole.HUMAN)),
+            (DBAgent.agent_id == "MARKET_MAKER", int(AgentRole.MARKET_MAKER)),
+            (DBAgent.agent_id.like("WHALE\\_%", escape="\\"), int(AgentRole.WHALE)),
+            else_=int(AgentRole.CITIZEN),
+        )
+        flagged = db.execute(update(DBAgent).where(DBAgent.role_flags.is_(None)).values(role_flags=roles)).rowcount
+
+        # 2. 체결 기록의 문자열 id → agents.id (지금 없는 에이전트는 NULL로 남음)
+        uid_of = lambda col: select(DBAgent.id).where(DBAgent.agent_id == col).scalar_subquery()
+        filled = db.execute(update(DBTrade).where(DBTrade.buyer_uid.is_(None), DBTrade.buyer_id.isnot(None)).values(
+            buyer_uid=uid_of(DBTrade.buyer_id), seller_uid=uid_of(DBTrade.seller_id))).rowcount
+        db.commit()
+        print(f"🎉 에이전트 {flagged}명 역할 설정, 체결 {filled}건 정수 id 변환 완료")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 마이그레이션 실패: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
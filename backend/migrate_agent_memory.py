@@ -0,0 +1,40 @@
+import re
+from database import SessionLocal, DBAgent, DBAgentMemory, init_db
+
+# 예전에 psychology JSON에 종목마다 쌓이던 키들
+LEGACY_KEY = re.compile(r"^(last_thought|avg_price)_(.+)$")
+# last_thought 값 형식: "BUY (지정가) 선택: 생각..."
+THOUGHT_FORMAT = re.compile(r"^(\w+) \((.*?)\) 선택: (.*)$", re.S)
+
+def migrate():
+    """(1회성) psychology의 last_thought_XXX → agent_memories 테이블, avg_price_XXX 등 잔여 키 삭제"""
+    init_db()  # agent_memories 테이블이 없으면 생성
+    db = SessionLocal()
+    try:
+        cleaned = 0
+        for agent in db.query(DBAgent).all():
+            psychology = agent.psychology or {}
+            legacy = {k: LEGACY_KEY.match(k) for k in psychology}
+            legacy = {k: m for k, m in legacy.items() if m}
+            if not legacy:
+                continue
+
+            for key, m in legacy.items():
+                if m.group(1) == "last_thought" and psychology[key]:
+                    parsed = THOUGHT_FORMAT.match(str(psychology[key]))
+                    action, order_desc, thought = parsed.groups() if parsed else ("HOLD", "이전 기록", str(psychology[key]))
+                    db.add(DBAgentMemory(agent_id=agent.agent_id, ticker=m.group(2), action=action,
+                                         order_desc=order_desc, thought=thought))
+            agent.psychology = {k: v for k, v in psychology.items() if k not in legacy}
+            cleaned += 1
+
+        db.commit()
+        print(f"🎉 {cleaned}명의 psychology에서 기억 키를 분리했습니다.")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 마이그레이션 실패: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
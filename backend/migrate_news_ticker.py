@@ -0,0 +1,27 @@
+from sqlalchemy import inspect, text, update, select
+from database import SessionLocal, DBNews, DBCompany, engine, init_db
+
+def migrate():
+    """(1회성) news_pool에 ticker 컬럼(+인덱스) 추가 후 company_name으로 채우기"""
+    init_db()
+    columns = {c["name"] for c in inspect(engine).get_columns("news_pool")}
+    if "ticker" not in columns:
+        # 기존 테이블엔 create_all이 컬럼을 추가해 주지 않으므로 직접 ALTER (FK는 새로 만드는 DB에서만)
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE news_pool ADD COLUMN ticker VARCHAR"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_news_pool_ticker ON news_pool (ticker)"))
+
+    db = SessionLocal()
+    try:
+        ticker_of = select(DBCompany.ticker).where(DBCompany.name == DBNews.company_name).scalar_subquery()
+        filled = db.execute(update(DBNews).where(DBNews.ticker.is_(None), DBNews.company_name.in_(select(DBCompany.name))).values(ticker=ticker_of)).rowcount
+        db.commit()
+        print(f"🎉 뉴스 {filled}건에 ticker를 채웠습니다.")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 마이그레이션 실패: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,32 @@
+from database import SessionLocal, DBAgent, DBCompany, DBPosition, init_db
+from positions import set_portfolio
+
+def migrate():
+    """(1회성) DBAgent.portfolio JSON → positions 테이블 이전"""
+    init_db()  # positions 테이블이 없으면 생성
+    db = SessionLocal()
+    try:
+        already = {a for (a,) in db.query(DBPosition.agent_id).distinct()}
+        prices = {t: p for t, p in db.query(DBCompany.ticker, DBCompany.current_price).all()}
+
+        moved = 0
+        for agent in db.query(DBAgent).filter(DBAgent.portfolio.isnot(None)).all():
+            if agent.agent_id in already or not agent.portfolio:
+                continue
+            psychology = agent.psychology or {}
+            # 예전 평단 기록(avg_price_XXX)이 있으면 그대로, 없으면 현재가를 평단으로 사용
+            avg_costs = {t: psychology.get(f"avg_price_{t}") or prices.get(t, 0.0) for t in agent.portfolio}
+            set_portfolio(db, agent.agent_id, agent.portfolio, avg_costs)
+            agent.portfolio = {}
+            moved += 1
+
+        db.commit()
+        print(f"🎉 {moved}명의 보유 주식을 positions 테이블로 옮겼습니다.")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 마이그레이션 실패: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,105 @@
+import os
+import time
+import heapq
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import DBCompany, DBNews
+from metrics import record_cache
+
+# ---------------------------------------------------------
+# 종목별 최신 뉴스 캐시 (에이전트 / 멘토 / API / 대시보드 공용)
+# - ticker -> 최근 발행 뉴스 N건 (최신이 앞)
+# - 발행하는 프로세스(시뮬레이션)는 발행 훅으로 바로 반영 (write-through)
+# - 다른 프로세스는 max_age 주기로 "발행 건수" 한 번만 확인 → 바뀌었을 때만 다시 읽음
+# ---------------------------------------------------------
+RECENT_PER_TICKER = int(os.getenv("NEWS_CACHE_SIZE", "10"))
+SYNC_INTERVAL_SEC = float(os.getenv("NEWS_CACHE_SYNC_SEC", "2.0"))
+
+
+@dataclass(frozen=True)
+class NewsItem:
+    id: int
+    ticker: str
+    company_name: str
+    title: str
+    summary: Optional[str]
+    impact_score: Optional[int]
+    reason: Optional[str]
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row.ticker, row.company_name, row.title, row.summary, row.impact_score, row.reason, row.created_at)
+
+
+class NewsCache:
+    def __init__(self, size: int = RECENT_PER_TICKER):
+        self.size = size
+        self._recent = {}          # ticker -> deque[NewsItem]
+        self._name_to_ticker = {}
+        self._tickers = set()      # 회사 테이블에 있는 종목 (API 경로 파라미터 검증용)
+        self._version = None       # 반영한 발행 건수 (None = 아직 안 읽음)
+        self.synced_at = 0.0
+
+    # ---------- 갱신 ----------
+    def on_publish(self, item: NewsItem):
+        """발행 훅 (같은 프로세스)"""
+        if self._version is None or not item.ticker: return  # 아직 한 번도 안 읽었으면 다음 동기화 때 통째로
+        self._recent.setdefault(item.ticker, deque(maxlen=self.size)).appendleft(item)
+        self._name_to_ticker[item.company_name] = item.ticker
+        self._tickers.add(item.ticker)
+        self._version += 1
+
+    def invalidate(self):
+        """다음 조회 때 DB에서 통째로 다시 읽게 함 (뉴스 삭제/초기화 스크립트 후)"""
+        self.__init__(self.size)
+
+    def sync_from_db(self, db: Session):
+        version = db.query(func.count(DBNews.id)).filter(DBNews.is_published == 1).scalar()
+        if version != self._version:
+            # 종목별 최신 N건을 한 번에 (ROW_NUMBER 윈도우)
+            rn = func.row_number().over(partition_by=DBNews.ticker, order_by=DBNews.id.desc()).label("rn")
+            ranked = db.query(DBNews.id, DBNews.ticker, DBNews.company_name, DBNews.title, DBNews.summary,
+                              DBNews.impact_score, DBNews.reason, DBNews.created_at, rn).filter(
+                DBNews.is_published == 1, DBNews.ticker.isnot(None)).subquery()
+            recent = {}
+            for row in db.query(ranked).filter(ranked.c.rn <= self.size).order_by(ranked.c.ticker, ranked.c.id.desc()):
+                recent.setdefault(row.ticker, deque(maxlen=self.size)).append(NewsItem.from_row(row))
+            self._recent = recent
+            self._name_to_ticker = {name: ticker for ticker, name in db.query(DBCompany.ticker, DBCompany.name)}
+            self._tickers = set(self._name_to_ticker.values())
+            self._version = version
+        self.synced_at = time.monotonic()
+
+    # ---------- 조회 (DB 안 감) ----------
+    def ticker_of(self, company_name: str) -> Optional[str]:
+        return self._name_to_ticker.get(company_name)
+
+    def has_ticker(self, ticker: str) -> bool:
+        return ticker in self._tickers
+
+    def recent(self, ticker: str, n: int = 5) -> list:
+        items = self._recent.get(ticker)
+        record_cache("news", hit=items is not None)
+        return list(items)[:n] if items else []
+
+    def latest(self, ticker: str) -> Optional[NewsItem]:
+        items = self.recent(ticker, 1)
+        return items[0] if items else None
+
+    def market(self, n: int = 10) -> list:
+        """전 종목 최신 n건 (n <= size 이면 종목별 목록만 합쳐도 정확)"""
+        return heapq.nlargest(n, (item for items in self._recent.values() for item in items), key=lambda i: i.id)
+
+
+NEWS_CACHE = NewsCache()
+
+
+def get_news_cache(db: Session, max_age: float = SYNC_INTERVAL_SEC) -> NewsCache:
+    if NEWS_CACHE._version is None or time.monotonic() - NEWS_CACHE.synced_at > max_age:
+        NEWS_CACHE.sync_from_db(db)
+    return NEWS_CACHE
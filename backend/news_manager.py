@@ -1,21 +1,17 @@
-import sqlite3
+from database import SessionLocal, DBNews, DBCompany
 
 def save_news_to_db(company_name, news_list):
-    conn = sqlite3.connect('stock_game.db')
-    cursor = conn.cursor()
-
-    for news in news_list:
-        cursor.execute('''
-            INSERT INTO news_pool (company_name, title, summary, impact_score, reason)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            company_name, 
-            news.get('title'), 
-            news.get('summary'), 
-            news.get('impact_score'), 
-            news.get('reason')
-        ))
-    
-    conn.commit()
-    conn.close()
-    print(f"--- {company_name}의 뉴스 {len(news_list)}개 저장 완료 ---")
\ No newline at end of file
+    # 다른 모듈과 동일하게 database.py의 스토리지 백엔드(Postgres/SQLite/메모리)를 거쳐 저장
+    with SessionLocal() as db:
+        ticker = db.query(DBCompany.ticker).filter(DBCompany.name == company_name).scalar()
+        for news in news_list:
+            db.add(DBNews(
+                ticker=ticker,
+                company_name=company_name,
+                title=news.get('title'),
+                summary=news.get('summary'),
+                impact_score=news.get('impact_score'),
+                reason=news.get('reason')
+            ))
+        db.commit()
+    print(f"--- {company_name}의 뉴스 {len(news_list)}개 저장 완료 ---")
@@ -0,0 +1,125 @@
+import os
+import random
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database import SessionLocal, DBCompany, DBNews
+from agent_service import generate_market_news, close_http_client
+from news_cache import NEWS_CACHE, NewsItem
+from response_cache import RESPONSE_CACHE
+from metrics import NEWS_GENERATED_TOTAL, NEWS_PUBLISHED_TOTAL, NEWS_BUFFER_SIZE, ERRORS_TOTAL
+
+logger = logging.getLogger("NewsService")
+
+# ---------------------------------------------------------
+# 뉴스 생산자/소비자
+# - 생산자(batch_update.py 프로세스): 회사별로 미발행(is_published=0) 뉴스를 N개씩 미리 만들어 둠 (동시 생성)
+# - 소비자(시뮬레이션 틱): 가상 시간 기준으로 일정 간격마다 쌓아둔 뉴스를 발행 (is_published=1)
+# → 틱은 뉴스 생성(LLM/Bing)을 기다리지 않고, 생성 처리량은 회사 수만큼 늘어남
+# ---------------------------------------------------------
+BUFFER_PER_COMPANY = int(os.getenv("NEWS_BUFFER_PER_COMPANY", "2"))
+GENERATION_CONCURRENCY = int(os.getenv("NEWS_CONCURRENCY", "4"))
+PRODUCER_INTERVAL_SEC = float(os.getenv("NEWS_PRODUCER_INTERVAL_SEC", "5"))
+RELEASE_EVERY_MIN = int(os.getenv("NEWS_RELEASE_EVERY_MIN", "5"))   # 가상 시간 5분(현실 10초)마다 1건
+
+
+# ---------- 1. 생산자 ----------
+def buffered_counts(db: Session) -> dict:
+    """{회사명: 미발행 뉴스 수} (GROUP BY 1번)"""
+    rows = db.query(DBNews.company_name, func.count(DBNews.id)).filter(DBNews.is_published == 0).group_by(DBNews.company_name)
+    return {name: count for name, count in rows}
+
+
+async def _generate_for(company_name: str, missing: int, sem: asyncio.Semaphore) -> list:
+    items = []
+    for _ in range(missing):
+        async with sem:
+            try:
+                news_list = await generate_market_news(company_name)
+            except Exception as e:
+                ERRORS_TOTAL.inc(component="news_generate")
+                logger.debug(f"❌ {company_name} 뉴스 생성 실패: {e}")
+                break
+        if not news_list: break  # 실제 뉴스만 쓰는 회사는 새 기사가 없으면 빈 목록
+        items += [(company_name, n) for n in news_list]
+    return items
+
+
+async def fill_buffers(target: int = BUFFER_PER_COMPANY, concurrency: int = GENERATION_CONCURRENCY) -> int:
+    """미발행 뉴스가 target개보다 적은 회사들을 동시에 채움. 새로 저장한 건수 반환"""
+    with SessionLocal() as db:
+        tickers = {name: ticker for ticker, name in db.query(DBCompany.ticker, DBCompany.name)}
+        counts = buffered_counts(db)
+    NEWS_BUFFER_SIZE.set(sum(counts.values()))
+
+    sem = asyncio.Semaphore(concurrency)
+    jobs = [_generate_for(name, target - counts.get(name, 0), sem) for name in tickers if counts.get(name, 0) < target]
+    if not jobs: return 0
+    generated = [item for group in await asyncio.gather(*jobs) for item in group]
+    if not generated: return 0
+
+    with SessionLocal() as db:
+        db.add_all([DBNews(
+            ticker=tickers[name],
+            company_name=name,
+            title=n.get("title") or "제목 없음",
+            summary=n.get("summary") or "내용 없음",
+            impact_score=int(n.get("impact_score") or 0),
+            reason=n.get("reason"),
+            is_published=0,
+        ) for name, n in generated])
+        db.commit()
+    NEWS_GENERATED_TOTAL.inc(len(generated))
+    return len(generated)
+
+
+async def run_news_producer(interval: float = PRODUCER_INTERVAL_SEC):
+    logger.info(f"🏭 [뉴스 공장] 가동 시작! 회사당 {BUFFER_PER_COMPANY}건 비축, 동시 생성 {GENERATION_CONCURRENCY}개")
+    try:
+        while True:
+            try:
+                saved = await fill_buffers()
+                if saved: logger.info(f"✅ 미발행 뉴스 {saved}건 비축")
+            except Exception as e:
+                ERRORS_TOTAL.inc(component="news_producer")
+                logger.error(f"❌ 뉴스 비축 실패: {e}")
+            await asyncio.sleep(interval)
+    finally:
+        await close_http_client()
+
+
+# ---------- 2. 소비자 (가상 시간 기준 발행) ----------
+class NewsPublisher:
+    def __init__(self, every_min: int = RELEASE_EVERY_MIN):
+        self.every = timedelta(minutes=every_min)
+        self.next_release_at = None
+
+    def release_due(self, db: Session, sim_time: datetime) -> list:
+        """발행 시각이 된 만큼 비축분을 발행 + 최신 뉴스 캐시에 바로 반영. 발행한 [NewsItem] 반환"""
+        if self.next_release_at is None or sim_time - self.next_release_at > self.every:
+            # 첫 호출이거나 한 슬롯 넘게 밀렸으면 (장 마감 19:00 → 다음날 09:00 점프 등) 밀린 슬롯은 버리고 지금부터 다시
+            self.next_release_at = sim_time
+        released = []
+        while sim_time >= self.next_release_at:
+            self.next_release_at += self.every
+            names = [name for (name,) in db.query(DBNews.company_name).filter(DBNews.is_published == 0).distinct()]
+            if not names:
+                self.next_release_at = sim_time + self.every  # 비축분이 없으면 밀린 슬롯은 버림
+                break
+            news = db.query(DBNews).filter(DBNews.is_published == 0, DBNews.company_name == random.choice(names)).order_by(DBNews.id).first()
+            news.is_published = 1
+            news.created_at = sim_time  # 발행 시각 = 가상 시간
+            db.flush()  # autoflush 꺼져 있음 → 다음 슬롯이 같은 뉴스를 다시 고르지 않도록
+            released.append(NewsItem.from_row(news))
+        if released:
+            db.commit()
+            for item in released:
+                NEWS_CACHE.on_publish(item)
+            NEWS_PUBLISHED_TOTAL.inc(len(released))
+            RESPONSE_CACHE.invalidate("news")
+        return released
+
+
+NEWS_PUBLISHER = NewsPublisher()
@@ -5,19 +5,14 @@ import time
 import math
 import matplotlib.pyplot as plt
 import numpy as np
-from openai import AsyncAzureOpenAI
 from dotenv import load_dotenv
+from llm_provider import get_llm_client
 
 # ==========================================
-# Azure OpenAI 세팅 (.env 연동)
+# Azure OpenAI 세팅 (.env 연동, LLM_PROVIDER=stub 이면 로컬 스텁으로 실행)
 # ==========================================
 load_dotenv()
 
-client = AsyncAzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),  
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-)
 # gpt-4o-mini를 기본값으로 사용
 DEPLOYMENT_NAME = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o-mini")
 
@@ -35,7 +30,7 @@ async def real_evaluate_workflow(settings):
 
     start_time = time.time()
     try:
-        response = await client.chat.completions.create(
+        response = await get_llm_client().chat.completions.create(
             model=DEPLOYMENT_NAME,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+# ---------------------------------------------------------
+# 호가창 자료구조
+# - 주문 1건 = __slots__ 레코드 (dict 대비 메모리 약 절반, 속성 접근도 빠름)
+# - 가격은 정수 틱 (1틱 = 1원, 엔진 체결가도 원 단위 정수), 접수 시각은 int64 나노초
+# - 한쪽 호가(BookSide)는 우선순위 오름차순 리스트 → 최우선 호가가 맨 끝
+#   (삽입은 이진 탐색, 최우선 호가 꺼내기는 list.pop() O(1), 매번 전체 sort 하지 않음)
+# - 같은 가격이면 기존 주문들 "앞"(끝에서 먼 쪽)에 넣으므로 먼저 들어온 주문이 먼저 체결 (별도 순번 불필요)
+# ---------------------------------------------------------
+_last_ts = (None, 0)
+
+
+def to_ticks(price) -> int:
+    return int(price) if price else 0
+
+
+def to_ns(ts: datetime) -> int:
+    # 같은 틱의 주문들은 시각이 같으므로 변환 결과(int 객체)를 공유
+    global _last_ts
+    if _last_ts[0] is not ts:
+        _last_ts = (ts, int(ts.timestamp() * 1_000_000_000))
+    return _last_ts[1]
+
+
+class RestingOrder:
+    __slots__ = ("uid", "price", "quantity", "is_buy", "ts", "vip_filled")
+
+    def __init__(self, uid: int, price: int, quantity: int, is_buy: bool, ts: int):
+        self.uid = uid              # agents.id (agent_registry)
+        self.price = price          # 틱
+        self.quantity = quantity
+        self.is_buy = is_buy
+        self.ts = ts                # 접수 시각 (ns)
+        self.vip_filled = False     # VIP 유동성 공급을 이미 받았는지
+
+    def __repr__(self):
+        side = "BUY" if self.is_buy else "SELL"
+        return f"RestingOrder(uid={self.uid}, {side} {self.quantity}@{self.price})"
+
+
+class BookSide:
+    __slots__ = ("is_buy", "_orders")
+
+    def __init__(self, is_buy: bool):
+        self.is_buy = is_buy
+        self._orders = []  # 우선순위 오름차순 (끝이 최우선)
+
+    def add(self, order: RestingOrder):
+        # 매수는 비쌀수록, 매도는 쌀수록 끝쪽. 같은 가격 묶음의 맨 앞 자리 (bisect_left)
+        orders, price = self._orders, order.price
+        lo, hi = 0, len(orders)
+        if self.is_buy:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if orders[mid].price < price: lo = mid + 1
+                else: hi = mid
+        else:
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if orders[mid].price > price: lo = mid + 1
+                else: hi = mid
+        orders.insert(lo, order)
+
+    def best(self):
+        return self._orders[-1] if self._orders else None
+
+    def pop_best(self) -> RestingOrder:
+        return self._orders.pop()
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __iter__(self):
+        """우선순위 순 (최우선 호가부터)"""
+        return reversed(self._orders)
+
+
+class OrderBook:
+    __slots__ = ("bids", "asks")
+
+    def __init__(self):
+        self.bids = BookSide(is_buy=True)
+        self.asks = BookSide(is_buy=False)
+
+    def side(self, is_buy: bool) -> BookSide:
+        return self.bids if is_buy else self.asks
+
+    def add(self, order: RestingOrder):
+        self.side(order.is_buy).add(order)
@@ -0,0 +1,209 @@
+import os
+import json
+from typing import NamedTuple
+import numpy as np
+from numpy.lib.format import open_memmap
+
+# ---------------------------------------------------------
+# 배경 인구 (수십만 명 단위 비-LLM 에이전트)
+# - 에이전트 1명 = DB 행이 아니라 배열의 한 칸 (struct-of-arrays)
+#   · cash[n], holdings[n, 종목], fear/greed/safety/social[n], persona[n]
+# - 배열은 POPULATION_DIR 아래 .npy 메모리맵 → 프로세스를 재시작해도 이어서 씀 (flush 시 디스크 반영)
+# - 판단/주문 생성/정산 모두 벡터 연산 (파이썬 루프는 종목 수만큼만)
+# - LLM 판단 에이전트(고래/시민)와 유저는 지금처럼 agents 테이블 행으로 유지
+# ---------------------------------------------------------
+POPULATION_DIR = os.getenv("POPULATION_DIR", "population_data")
+BACKGROUND_AGENTS = int(os.getenv("BACKGROUND_AGENTS", "0"))           # 0이면 배경 인구 비활성
+POPULATION_ACTIVITY = float(os.getenv("POPULATION_ACTIVITY", "0.02"))  # 틱당 행동하는 비율
+POPULATION_SEED = int(os.environ["POPULATION_SEED"]) if os.getenv("POPULATION_SEED") else None  # 재현용
+
+# 페르소나 코드 (get_agent_persona 의 id % 10 분포와 같은 비율: 4:2:2:2)
+PERSONAS = ("VALUE", "INSTITUTIONAL", "CONTRARIAN", "SPECULATOR")
+_PERSONA_P = (0.4, 0.2, 0.2, 0.2)
+# 페르소나별 신호 가중치 (모멘텀 = 최근 수익률 %, 괴리 = VWAP 대비 저평가 %)
+_W_MOMENTUM = np.array([0.0, 0.3, -1.0, 1.0], dtype=np.float32)
+_W_VALUE_GAP = np.array([1.0, 0.5, 0.0, 0.0], dtype=np.float32)
+
+MOOD_WEIGHT = 1.0      # (탐욕 - 공포) 가 점수에 더해지는 비중
+NOISE_STD = 1.0        # 개인차 (같은 신호라도 제각각 반응)
+THRESHOLD = 1.0        # |점수|가 이 이상이어야 주문
+AGGRESSION_STD = 0.005  # 현재가에서 얼마나 양보한 지정가를 내는지 (|N(0, σ)|)
+
+# 필드명 -> (dtype, 종목 축 여부)
+_FIELDS = {
+    "cash": (np.float64, False),
+    "holdings": (np.int32, True),
+    "fear": (np.float32, False),
+    "greed": (np.float32, False),
+    "safety": (np.float32, False),
+    "social": (np.float32, False),
+    "persona": (np.int8, False),
+}
+
+
+def _round_random(x: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """확률적 반올림 (2.3주 → 30% 확률로 3주) - 고가 종목도 수량이 0으로 깎여 한쪽 주문만 사라지지 않게"""
+    return np.floor(x + rng.random(x.shape)).astype(np.int64)
+
+
+class OrderBatch(NamedTuple):
+    """한 틱에 배경 인구가 낸 주문들 (인덱스가 같으면 같은 주문)"""
+    agent: np.ndarray    # 인구 내 인덱스
+    ticker: np.ndarray   # 종목 인덱스 (Population.tickers 순서)
+    side: np.ndarray     # +1 매수 / -1 매도
+    qty: np.ndarray
+    price: np.ndarray    # 지정가 (정수 틱)
+
+
+class Population:
+    def __init__(self, path: str, tickers: list, arrays: dict):
+        self.path = path
+        self.tickers = list(tickers)
+        self.ticker_index = {t: i for i, t in enumerate(self.tickers)}
+        for name, arr in arrays.items():
+            setattr(self, name, arr)
+
+    # ---------- 생성 / 열기 ----------
+    @classmethod
+    def create(cls, path: str, n: int, tickers: list, seed=None, prices=None):
+        """새 인구 생성 (기존 파일은 덮어씀). prices를 주면 현금의 절반 정도를 종목에 고루 나눠 들고 시작"""
+        os.makedirs(path, exist_ok=True)
+        arrays = {
+            name: open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=dtype,
+                              shape=(n, len(tickers)) if per_ticker else (n,))
+            for name, (dtype, per_ticker) in _FIELDS.items()
+        }
+        rng = np.random.default_rng(seed)
+        # 시민 에이전트와 비슷한 규모: 중앙값 약 350만 원, 오른쪽 꼬리
+        arrays["cash"][:] = np.clip(rng.lognormal(np.log(3_500_000), 0.5, n), 500_000, 50_000_000)
+        if prices is None:
+            arrays["holdings"][:] = rng.poisson(5, (n, len(tickers)))
+        else:
+            lam = arrays["cash"][:, None] * 0.5 / len(tickers) / np.maximum(np.asarray(prices, dtype=np.float64), 1)
+            arrays["holdings"][:] = rng.poisson(lam)
+        for name in ("fear", "greed", "safety", "social"):
+            arrays[name][:] = rng.random(n, dtype=np.float32)
+        arrays["persona"][:] = rng.choice(len(PERSONAS), n, p=_PERSONA_P)
+
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"n": n, "tickers": list(tickers)}, f)
+        pop = cls(path, tickers, arrays)
+        pop.flush()
+        return pop
+
+    @classmethod
+    def open(cls, path: str):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: open_memmap(os.path.join(path, f"{name}.npy"), mode="r+") for name in _FIELDS}
+        return cls(path, meta["tickers"], arrays)
+
+    @classmethod
+    def load_or_create(cls, path: str, n: int, tickers: list, seed=None, prices=None):
+        """같은 규모/종목 구성으로 저장된 인구가 있으면 이어서, 아니면 새로 생성"""
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("n") == n and meta.get("tickers") == list(tickers):
+                return cls.open(path)
+        return cls.create(path, n, tickers, seed, prices)
+
+    def flush(self):
+        for name in _FIELDS:
+            getattr(self, name).flush()
+
+    def __len__(self):
+        return len(self.cash)
+
+    # ---------- 판단 + 주문 생성 ----------
+    def decide(self, prices: np.ndarray, momentum: np.ndarray, value_gap: np.ndarray,
+               rng: np.random.Generator, activity: float = POPULATION_ACTIVITY) -> OrderBatch:
+        """activity 비율만큼 무작위로 깨어나 종목 1개씩 골라 매수/매도/관망 결정 (종목별 배열은 tickers 순서)"""
+        idx = np.flatnonzero(rng.random(len(self)) < activity)
+        t = rng.integers(0, len(self.tickers), idx.size)
+        persona = self.persona[idx]
+        greed, fear = self.greed[idx], self.fear[idx]
+
+        score = (_W_MOMENTUM[persona] * momentum[t] + _W_VALUE_GAP[persona] * value_gap[t]
+                 + MOOD_WEIGHT * (greed - fear) + rng.normal(0.0, NOISE_STD, idx.size))
+        aggression = np.abs(rng.normal(0.0, AGGRESSION_STD, idx.size))
+        price = prices[t]
+
+        # 매수: 현금의 0.5~2.5% (탐욕할수록 크게, 평균 매도 금액과 비슷한 규모), 현재가보다 조금 높게
+        buy_px = np.floor(price * (1 + aggression)).astype(np.int64)
+        buy_qty = _round_random(self.cash[idx] * (0.005 + 0.02 * greed) / np.maximum(buy_px, 1), rng)
+        # 확률적 반올림으로 올라간 1주 때문에 현금이 음수가 되지 않게 (체결가 ≤ 매수 호가이므로 호가 기준이면 충분)
+        buy_qty = np.minimum(buy_qty, np.floor(np.maximum(self.cash[idx], 0) / np.maximum(buy_px, 1)).astype(np.int64))
+        # 매도: 보유분의 10~50% (공포가 클수록 많이), 현재가보다 조금 낮게
+        held = self.holdings[idx, t].astype(np.int64)
+        sell_px = np.maximum(np.ceil(price * (1 - aggression)), 1).astype(np.int64)
+        sell_qty = np.minimum(_round_random(held * (0.1 + 0.4 * fear), rng), held)
+
+        buy = (score > THRESHOLD) & (buy_qty > 0)
+        sell = (score < -THRESHOLD) & (sell_qty > 0)
+        act = buy | sell
+        return OrderBatch(
+            agent=idx[act], ticker=t[act],
+            side=np.where(buy, 1, -1)[act].astype(np.int8),
+            qty=np.where(buy, buy_qty, sell_qty)[act],
+            price=np.where(buy, buy_px, sell_px)[act],
+        )
+
+    # ---------- 단일가 매매 + 정산 ----------
+    def clear(self, batch: OrderBatch, last_prices: np.ndarray) -> dict:
+        """종목별 단일가 매매 (체결량 최대 → 매수/매도 잔량 차이 최소 → 직전가에 가까운 가격)
+        체결분은 가격 우선으로 배분하고 현금/보유량을 한 번에 정산. {종목 인덱스: (체결가, 체결량)}"""
+        fills = np.zeros(len(batch.agent), dtype=np.int64)
+        results = {}
+        for ti in np.unique(batch.ticker):
+            on_ticker = batch.ticker == ti
+            b = np.flatnonzero(on_ticker & (batch.side > 0))
+            s = np.flatnonzero(on_ticker & (batch.side < 0))
+            if not b.size or not s.size: continue
+            b = b[np.argsort(-batch.price[b], kind="stable")]  # 비싼 매수부터
+            s = s[np.argsort(batch.price[s], kind="stable")]   # 싼 매도부터
+            bp, sp = batch.price[b], batch.price[s]
+            if bp[0] < sp[0]: continue
+
+            b_cum, s_cum = np.cumsum(batch.qty[b]), np.cumsum(batch.qty[s])
+            cand = np.unique(np.concatenate([bp, sp]))
+            cand = cand[(cand >= sp[0]) & (cand <= bp[0])]
+            nb = np.searchsorted(-bp, -cand, side="right")  # 가격 p 이상 매수 주문 수
+            ns = np.searchsorted(sp, cand, side="right")    # 가격 p 이하 매도 주문 수
+            demand = np.where(nb > 0, b_cum[nb - 1], 0)
+            supply = np.where(ns > 0, s_cum[ns - 1], 0)
+            volume = np.minimum(demand, supply)
+            k = np.lexsort((np.abs(cand - last_prices[ti]), np.abs(demand - supply), -volume))[0]
+            price, vol = int(cand[k]), int(volume[k])
+            if vol <= 0: continue
+
+            fills[b] = np.clip(vol - (b_cum - batch.qty[b]), 0, batch.qty[b])
+            fills[s] = np.clip(vol - (s_cum - batch.qty[s]), 0, batch.qty[s])
+            results[int(ti)] = (price, vol)
+
+        done = np.flatnonzero(fills)
+        if done.size:
+            clearing = np.zeros(len(self.tickers))
+            for ti, (price, _) in results.items():
+                clearing[ti] = price
+            agent, ticker = batch.agent[done], batch.ticker[done]
+            signed = fills[done] * batch.side[done]  # 매수 +, 매도 -
+            np.add.at(self.holdings, (agent, ticker), signed.astype(self.holdings.dtype))
+            np.add.at(self.cash, agent, -signed * clearing[ticker])
+        return results
+
+    def step(self, prices: np.ndarray, momentum: np.ndarray, value_gap: np.ndarray,
+             rng: np.random.Generator) -> dict:
+        """한 틱: 판단 → 주문 → 단일가 체결/정산. {ticker: (체결가, 체결량)}"""
+        batch = self.decide(prices, momentum, value_gap, rng)
+        results = self.clear(batch, prices)
+        return {self.tickers[ti]: r for ti, r in results.items()}
+
+    # ---------- 조회 ----------
+    def net_worth(self, prices: np.ndarray) -> np.ndarray:
+        """에이전트별 평가 자산 (현금 + 보유 주식 시가)"""
+        return self.cash + self.holdings @ prices
+
+    def persona_counts(self) -> dict:
+        return dict(zip(PERSONAS, np.bincount(self.persona, minlength=len(PERSONAS)).tolist()))
@@ -0,0 +1,109 @@
+from sqlalchemy import func, update, delete
+from sqlalchemy.orm import Session
+from database import DBAgent, DBCompany, DBPosition
+
+# ---------------------------------------------------------
+# 보유 주식 원장 (positions 테이블)
+# - 체결 시 JSON 통째 복사/재저장 대신 해당 행만 원자적으로 증감
+# - 보유자 조회 / 평가액 계산은 전부 집합 쿼리(set-based)로 처리
+# ---------------------------------------------------------
+
+def _upsert(db: Session):
+    """DB 종류에 맞는 INSERT ... ON CONFLICT 생성기 (PostgreSQL / SQLite 모두 지원)"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(DBPosition)
+
+
+# ---------- 1. 현금 (조건부 원자적 증감) ----------
+def debit_cash(db: Session, agent_id: str, amount: float) -> bool:
+    """잔고가 충분할 때만 차감. 동시에 두 주문이 와도 음수 잔고가 되지 않음"""
+    result = db.execute(
+        update(DBAgent)
+        .where(DBAgent.agent_id == agent_id, DBAgent.cash_balance >= amount)
+        .values(cash_balance=DBAgent.cash_balance - amount)
+    )
+    return result.rowcount == 1
+
+
+def credit_cash(db: Session, agent_id: str, amount: float):
+    db.execute(update(DBAgent).where(DBAgent.agent_id == agent_id).values(cash_balance=DBAgent.cash_balance + amount))
+
+
+# ---------- 2. 보유 수량 (체결 반영) ----------
+def add_shares(db: Session, agent_id: str, ticker: str, qty: int, price: float):
+    """매수 체결: 수량 증가 + 평균단가 가중평균 갱신 (행이 없으면 생성)"""
+    stmt = _upsert(db).values(agent_id=agent_id, ticker=ticker, qty=qty, avg_cost=float(price))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DBPosition.agent_id, DBPosition.ticker],
+        set_={
+            "qty": DBPosition.qty + stmt.excluded.qty,
+            "avg_cost": (DBPosition.qty * DBPosition.avg_cost + stmt.excluded.qty * stmt.excluded.avg_cost)
+                        / (DBPosition.qty + stmt.excluded.qty),
+        },
+    )
+    db.execute(stmt)
+
+
+def remove_shares(db: Session, agent_id: str, ticker: str, qty: int) -> bool:
+    """매도 체결: 보유 수량이 충분할 때만 차감, 0주가 되면 행 삭제"""
+    result = db.execute(
+        update(DBPosition)
+        .where(DBPosition.agent_id == agent_id, DBPosition.ticker == ticker, DBPosition.qty >= qty)
+        .values(qty=DBPosition.qty - qty)
+    )
+    if result.rowcount != 1:
+        return False
+    db.execute(delete(DBPosition).where(DBPosition.agent_id == agent_id, DBPosition.ticker == ticker, DBPosition.qty <= 0))
+    return True
+
+
+def set_portfolio(db: Session, agent_id: str, holdings: dict, avg_costs: dict = None):
+    """초기 물량 세팅용 (마켓메이커, 마이그레이션): 기존 행을 지우고 통째로 기록"""
+    db.execute(delete(DBPosition).where(DBPosition.agent_id == agent_id))
+    avg_costs = avg_costs or {}
+    db.add_all([DBPosition(agent_id=agent_id, ticker=t, qty=int(q), avg_cost=float(avg_costs.get(t, 0.0)))
+                for t, q in holdings.items() if q > 0])
+
+
+# ---------- 3. 조회 ----------
+def get_position(db: Session, agent_id: str, ticker: str):
+    """(수량, 평균단가) - 없으면 (0, 0.0)"""
+    row = db.query(DBPosition.qty, DBPosition.avg_cost).filter(
+        DBPosition.agent_id == agent_id, DBPosition.ticker == ticker).first()
+    return (row.qty, row.avg_cost) if row else (0, 0.0)
+
+
+def get_portfolio(db: Session, agent_id: str) -> dict:
+    """{ticker: qty} - API 응답 등 기존 portfolio 모양이 필요한 곳에서 사용"""
+    rows = db.query(DBPosition.ticker, DBPosition.qty).filter(DBPosition.agent_id == agent_id, DBPosition.qty > 0).all()
+    return {t: q for t, q in rows}
+
+
+def get_all_holdings(db: Session) -> dict:
+    """{agent_id: {ticker: qty}} - 랭킹 전체 재구성용 (쿼리 1번)"""
+    holdings = {}
+    for agent_id, ticker, qty in db.query(DBPosition.agent_id, DBPosition.ticker, DBPosition.qty).filter(DBPosition.qty > 0):
+        holdings.setdefault(agent_id, {})[ticker] = qty
+    return holdings
+
+
+def holders_of(db: Session, ticker: str, exclude=("MARKET_MAKER",)) -> list:
+    """X 종목 보유자 [(agent_id, qty)] - 보유량 많은 순"""
+    return db.query(DBPosition.agent_id, DBPosition.qty).filter(
+        DBPosition.ticker == ticker, DBPosition.qty > 0, DBPosition.agent_id.notin_(exclude)
+    ).order_by(DBPosition.qty.desc()).all()
+
+
+def total_shares_held(db: Session, ticker: str, exclude=("MARKET_MAKER",)) -> int:
+    return db.query(func.coalesce(func.sum(DBPosition.qty), 0)).filter(
+        DBPosition.ticker == ticker, DBPosition.agent_id.notin_(exclude)).scalar()
+
+
+def stock_values(db: Session) -> dict:
+    """{agent_id: Σ(qty × 현재가)} - positions ⋈ companies 집계 한 번"""
+    rows = db.query(DBPosition.agent_id, func.sum(DBPosition.qty * DBCompany.current_price)).join(
+        DBCompany, DBCompany.ticker == DBPosition.ticker).group_by(DBPosition.agent_id).all()
+    return {agent_id: float(value or 0.0) for agent_id, value in rows}
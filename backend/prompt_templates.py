@@ -0,0 +1,130 @@
+import os
+from functools import lru_cache
+
+# ---------------------------------------------------------
+# 에이전트 프롬프트 템플릿
+# - system = 페르소나별 고정 문구 (에이전트 이름/숫자 없음) → 같은 페르소나끼리 접두어가 100% 동일
+#   (프롬프트 캐시가 앞부분 일치를 기준으로 동작하므로 변하는 값은 전부 user 쪽 뒤로)
+# - user = 숫자 위주의 한 줄 요약 (k=v) + 필요할 때만 붙는 텍스트
+# - 전송 전에 토큰 수를 세고, 예산을 넘으면 긴 텍스트부터 잘라냄
+# ---------------------------------------------------------
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "600"))
+TRADE_MAX_TOKENS = int(os.getenv("TRADE_MAX_TOKENS", "120"))
+CHATTER_MAX_TOKENS = int(os.getenv("CHATTER_MAX_TOKENS", "100"))
+TEXT_FIELD_CHARS = 160  # 뉴스/여론 등 자유 텍스트 한 항목 최대 길이
+BATCH_AGENT_TOKENS = 80  # 배치 프롬프트에서 에이전트 1명당 늘어나는 예산
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # 설치 안 됐거나 인코딩 파일을 못 받는 환경
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken이 있으면 정확히, 없으면 근사치 (한글 1글자 ≈ 1토큰, 그 외 4글자 ≈ 1토큰)"""
+    if not text: return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def count_message_tokens(messages: list) -> int:
+    # 메시지당 역할/구분자 오버헤드 약 4토큰
+    return sum(count_tokens(str(m.get("content", ""))) + 4 for m in messages)
+
+
+# ---------- 1. 고정 접두어 (페르소나별 1번만 생성) ----------
+_OUTPUT_SCHEMA = '{"thought_process": "한 문장", "action": "BUY|SELL|HOLD", "price": 정수, "quantity": 정수}'
+
+_TRADE_RULES = """[행동 원칙]
+1. 당신의 성격대로, 사람처럼 감정을 담아 판단하세요.
+2. HOLD를 남발하지 마세요. 보유 중이면 익절/손절(SELL)로 현금을 자주 회수하세요.
+3. '가능' 목록에 없는 행동은 고르지 마세요.
+[입력 형식] 현재가/현금/평단은 원, 보유는 주, 수익률은 %. 기억=직전 내 판단, 여론=시장 분위기.
+[출력] JSON만, thought_process는 딱 한 문장: """ + _OUTPUT_SCHEMA
+
+_SOCIAL_RULES = """[행동 원칙]
+1. 커뮤니티 라운지 잡담입니다. 매매하지 말고 당신의 성격대로 한 마디 던지세요.
+2. 기계적이지 않게 사람처럼 표현하세요.
+[출력] JSON만 (action은 항상 HOLD): """ + _OUTPUT_SCHEMA
+
+_BATCH_RULES = """[행동 원칙]
+1. [에이전트] 목록의 각 투자자가 되어, 서로 독립적으로 각자의 상황에 맞게 판단하세요.
+2. 모두 같은 성향이지만 말투와 판단은 사람마다 다르게, 사람처럼 감정을 담으세요.
+3. HOLD를 남발하지 마세요. 보유 중이면 익절/손절(SELL)로 현금을 자주 회수하세요.
+4. 각자의 '가능' 목록에 없는 행동은 고르지 마세요.
+[입력 형식] 현재가/현금/평단은 원, 보유는 주, 수익률은 %. 기억=직전 판단, 여론=시장 분위기.
+[출력] JSON만, 목록의 모든 투자자를 빠짐없이, thought_process는 각자 딱 한 문장:
+{"decisions": [{"agent": "이름", "thought_process": "한 문장", "action": "BUY|SELL|HOLD", "price": 정수, "quantity": 정수}]}"""
+
+
+@lru_cache(maxsize=None)
+def system_prefix(agent_type: str, strategy: str, social: bool, batch: bool = False) -> str:
+    if batch:
+        return f"당신은 {agent_type} 여러 명의 판단을 대신 내립니다. 특정 종목 매매를 결정해야 합니다.\n[투자 철학] {strategy}\n{_BATCH_RULES}"
+    mode = "커뮤니티 라운지에서 사람들과 소통 중입니다." if social else "특정 종목 매매를 결정해야 합니다."
+    rules = _SOCIAL_RULES if social else _TRADE_RULES
+    return f"당신은 {agent_type}입니다. {mode}\n[투자 철학] {strategy}\n{rules}"
+
+
+# ---------- 2. 가변 부분 (숫자 압축) ----------
+def _clip(text, limit: int = TEXT_FIELD_CHARS) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def allowed_actions(current_price: float, cash: float, portfolio_qty: int) -> list:
+    actions = []
+    if current_price > 0 and cash >= current_price: actions.append("BUY")
+    if portfolio_qty > 0: actions.append("SELL")
+    return actions + ["HOLD"]
+
+
+def _account_fields(current_price, cash, portfolio_qty, avg_price) -> list:
+    fields = [f"현금:{int(cash)}", f"보유:{int(portfolio_qty)}주"]
+    if portfolio_qty > 0 and avg_price > 0:
+        fields += [f"평단:{int(avg_price)}", f"수익률:{(current_price - avg_price) / avg_price * 100:+.1f}"]
+    return fields
+
+
+def trade_user_prompt(agent_name, current_price, cash, portfolio_qty, avg_price, actions,
+                      memory=None, sentiment=None, news=None) -> str:
+    fields = [f"현재가:{int(current_price)}"] + _account_fields(current_price, cash, portfolio_qty, avg_price)
+    lines = [f"[시장 데이터] 나:{agent_name} " + " ".join(fields), f"가능:{'/'.join(actions)}"]
+    if news: lines.append(f"뉴스:{_clip(news)}")
+    if sentiment: lines.append(f"여론:{_clip(sentiment)}")
+    if memory: lines.append(f"기억:{_clip(memory)}")
+    return "\n".join(lines)
+
+
+def batch_user_prompt(current_price, agents: list, sentiment=None, news=None) -> str:
+    """agents: [{agent_name, cash, portfolio_qty, avg_price, actions, last_action_desc}] - 한 줄에 한 명"""
+    lines = [f"[시장 데이터] 현재가:{int(current_price)}"]
+    if news: lines.append(f"뉴스:{_clip(news)}")
+    if sentiment: lines.append(f"여론:{_clip(sentiment)}")
+    lines.append("[에이전트]")
+    for a in agents:
+        row = [f"- 나:{a['agent_name']}"] + _account_fields(current_price, a["cash"], a["portfolio_qty"], a["avg_price"])
+        row.append(f"가능:{'/'.join(a['actions'])}")
+        if a.get("last_action_desc"): row.append(f"기억:{_clip(a['last_action_desc'], 60)}")
+        lines.append(" ".join(row))
+    return "\n".join(lines)
+
+
+def social_user_prompt(agent_name, topic, cash, sentiment=None, memory=None) -> str:
+    lines = [f"[커뮤니티 라운지] 나:{agent_name} 현금:{int(cash)}", f"주제:{_clip(topic)}"]
+    if sentiment: lines.append(f"분위기:{_clip(sentiment)}")
+    if memory: lines.append(f"기억:{_clip(memory)}")
+    return "\n".join(lines)
+
+
+def fit_budget(build, budget: int = PROMPT_TOKEN_BUDGET, **optional) -> str:
+    """예산을 넘으면 선택 항목(optional)을 뒤에서부터 하나씩 빼면서 다시 조립"""
+    keys = list(optional)
+    prompt = build(**optional)
+    while keys and count_tokens(prompt) > budget:
+        optional[keys.pop()] = None
+        prompt = build(**optional)
+    return prompt
@@ -1,5 +1,5 @@
 # reset_db.py
-from database import SessionLocal, DBTrade, DBDiscussion, DBAgent, DBCompany
+from database import SessionLocal, DBTrade, DBDiscussion, DBAgent, DBCompany, DBPosition, DBAgentMemory, DBUserAnalytics
 
 def clean_database():
     print("🧹 데이터베이스 대청소를 시작합니다...")
@@ -15,12 +15,13 @@ def clean_database():
             for comp in db.query(DBCompany).all():
                 comp.change_rate = 0.0
                 
-            # 4. 에이전트 포트폴리오 초기화 (처음부터 다시 매매하도록)
+            # 4. 에이전트 포트폴리오/기억 초기화 (처음부터 다시 매매하도록, 성향은 유지)
+            db.query(DBPosition).filter(DBPosition.agent_id != "MARKET_MAKER").delete(synchronize_session=False)
+            db.query(DBAgentMemory).delete()
+            db.query(DBUserAnalytics).delete()
             for agent in db.query(DBAgent).all():
                 if agent.agent_id != "MARKET_MAKER":
-                    agent.portfolio = {}
                     agent.cash_balance = 5000000.0
-                    agent.psychology = {}
             
             db.commit()
             print("✅ 청소 완료! 이제 찌꺼기 없는 깨끗한 차트가 그려집니다.")
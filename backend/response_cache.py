@@ -0,0 +1,146 @@
+import os
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+from database import get_storage
+from metrics import record_cache, RESPONSE_CACHE_HIT_RATIO, ERRORS_TOTAL
+
+# ---------------------------------------------------------
+# 읽기 전용 API 응답 캐시 (uvicorn 워커 여러 개 + 시뮬레이션 프로세스가 공유)
+# - 토픽별 버전 번호를 로컬 SQLite 파일 하나에 둠: trades, trades:<ticker>, news, posts:<ticker|GLOBAL>
+#   · 쓰는 쪽(엔진 체결, 뉴스 발행, 종토방 저장)이 해당 토픽 버전을 +1 → 고정 TTL 없이 이벤트로 무효화
+# - 응답 본문도 같은 파일에 (route+파라미터 키, 의존 토픽 버전 묶음=stamp) 로 저장 → 다른 워커가 만든 것도 재사용
+#   · 워커별 메모리에도 한 벌 (stamp가 같으면 파일에서 본문을 다시 읽지 않음), 최근 쓴 MAX_MEMORY_ENTRIES개만 (LRU)
+# - 안전망: RESPONSE_CACHE_MAX_AGE 초마다 stamp가 바뀜 (다른 호스트의 쓰기처럼 버전 증가를 못 보는 경우 대비)
+#   · 구간이 바뀌면 이전 구간 stamp의 응답 행은 다시 쓰일 일이 없으므로 파일에서 지움
+# - 인메모리 DB 백엔드는 프로세스마다 DB가 따로라 공유하지 않고 프로세스 안에서만 씀
+# ---------------------------------------------------------
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH")  # 기본: 임시 폴더에 DB URL별 파일
+MAX_AGE_SEC = float(os.getenv("RESPONSE_CACHE_MAX_AGE", "60"))
+MAX_MEMORY_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS versions (topic TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stamp TEXT NOT NULL, body BLOB NOT NULL)",
+)
+
+
+class ResponseCache:
+    def __init__(self, path: str = RESPONSE_CACHE_PATH):
+        self.path = path
+        self._uri = False
+        self._local = threading.local()  # 스레드별 sqlite 연결 (FastAPI 동기 엔드포인트는 스레드풀에서 돔)
+        self._memory = OrderedDict()     # key -> (stamp, body), 오래 안 쓴 것부터 밀려남
+        self._memory_lock = threading.Lock()
+        self._pruned_bucket = None       # 지난 구간 행을 지운 마지막 안전망 구간
+        self.hits = self.misses = 0
+
+    def _resolve_path(self):
+        storage = get_storage()
+        if storage.ephemeral:
+            # 공유할 DB가 없으니 이 프로세스의 스레드끼리만 공유하는 메모리 DB
+            self.path, self._uri = f"file:response_cache_{os.getpid()}_{id(self)}?mode=memory&cache=shared", True
+        else:
+            tag = hashlib.blake2b(storage.url.encode("utf-8"), digest_size=6).hexdigest()
+            self.path = os.path.join(tempfile.gettempdir(), f"asfm_response_cache_{tag}.sqlite")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.path is None:
+                self._resolve_path()
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False, uri=self._uri)
+            if not self._uri:
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # 날아가도 캐시일 뿐
+            for ddl in _SCHEMA:
+                conn.execute(ddl)
+            self._local.conn = conn
+        return conn
+
+    # ---------- 쓰는 쪽: 무효화 ----------
+    def invalidate(self, *topics: str):
+        """토픽 버전 +1 (캐시 문제로 체결/발행이 실패하면 안 되므로 예외는 삼킴)"""
+        try:
+            conn = self._conn()
+            conn.executemany(
+                "INSERT INTO versions (topic, version) VALUES (?, 1) "
+                "ON CONFLICT(topic) DO UPDATE SET version = version + 1", [(t,) for t in topics])
+        except sqlite3.Error:
+            ERRORS_TOTAL.inc(component="response_cache")
+
+    def invalidate_trades(self, ticker: str):
+        self.invalidate("trades", f"trades:{ticker}")
+
+    # ---------- 읽는 쪽 ----------
+    def stamp(self, topics: tuple) -> str:
+        """의존 토픽들의 현재 버전 + 안전망 시간 구간 → 이 값이 같으면 응답도 같음"""
+        rows = dict(self._conn().execute(
+            f"SELECT topic, version FROM versions WHERE topic IN ({','.join('?' * len(topics))})", topics).fetchall())
+        bucket = int(time.time() // MAX_AGE_SEC) if MAX_AGE_SEC > 0 else 0
+        return ",".join(str(rows.get(t, 0)) for t in topics) + f"@{bucket}"
+
+    def _remember(self, key: str, entry: tuple):
+        with self._memory_lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > MAX_MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str, stamp: str) -> Optional[bytes]:
+        with self._memory_lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+        if cached is None or cached[0] != stamp:
+            row = self._conn().execute("SELECT stamp, body FROM responses WHERE key = ?", (key,)).fetchone()
+            cached = (row[0], bytes(row[1])) if row else None
+            if cached and cached[0] == stamp:
+                self._remember(key, cached)
+        hit = cached is not None and cached[0] == stamp
+        self.record(key.split("?", 1)[0], hit)
+        return cached[1] if hit else None
+
+    def put(self, key: str, stamp: str, body: bytes):
+        self._remember(key, (stamp, body))
+        bucket = stamp.rsplit("@", 1)[1]
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT INTO responses (key, stamp, body) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET stamp = excluded.stamp, body = excluded.body", (key, stamp, body))
+            if bucket != self._pruned_bucket:
+                # 안전망 구간이 바뀐 뒤 첫 저장 → 이전 구간 stamp 행 정리 (구간마다 프로세스당 1번)
+                self._pruned_bucket = bucket
+                conn.execute("DELETE FROM responses WHERE stamp NOT LIKE ?", (f"%@{bucket}",))
+        except sqlite3.Error:
+            ERRORS_TOTAL.inc(component="response_cache")
+
+    def record(self, route: str, hit: bool):
+        if hit: self.hits += 1
+        else: self.misses += 1
+        record_cache(f"response:{route}", hit)
+        RESPONSE_CACHE_HIT_RATIO.set(self.hit_ratio())
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset(self):
+        """DB를 통째로 갈아엎었을 때 (벤치마크/리셋 스크립트) - 저장된 응답과 버전을 모두 버림"""
+        try:
+            conn = self._conn()
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM versions")
+        except sqlite3.Error:
+            ERRORS_TOTAL.inc(component="response_cache")
+        with self._memory_lock:
+            self._memory.clear()
+        self.hits = self.misses = 0
+
+
+RESPONSE_CACHE = ResponseCache()
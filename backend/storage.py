@@ -0,0 +1,117 @@
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+# ---------------------------------------------------------
+# 스토리지 백엔드 (PostgreSQL / SQLite WAL / 인메모리)
+# - STORAGE_BACKEND=postgres|sqlite|memory 로 명시하거나,
+# - DATABASE_URL의 스킴(postgresql://, sqlite://)으로 자동 선택
+# ---------------------------------------------------------
+
+class StorageBackend:
+    name = "base"
+    label = "Base"
+    ephemeral = False  # True면 프로세스 종료 시 데이터 소멸 (테이블 자동 생성)
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def build_engine(self):
+        raise NotImplementedError
+
+
+class PostgresBackend(StorageBackend):
+    name = "postgres"
+    label = "Azure PostgreSQL"
+
+    def build_engine(self):
+        # 🔥 15~30명 규모에 맞춘 최적화된 DB 풀 설정 (기존 Azure 설정 유지)
+        return create_engine(
+            self.url,
+            pool_pre_ping=True,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "20")),        # 항시 열어두는 DB 문 20개
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "30")),  # 순간적으로 30개 추가 오픈 (총 50개)
+            pool_timeout=30,      # 대기 시간 30초
+            pool_recycle=1800     # 30분마다 안 쓰는 연결 정리하여 Azure DB 끊김 방지
+        )
+
+
+class SQLiteBackend(StorageBackend):
+    name = "sqlite"
+    label = "SQLite (WAL)"
+
+    # 읽기/쓰기가 동시에 몰리는 시뮬레이션 + API 조합에 맞춘 PRAGMA
+    PRAGMAS = {
+        "journal_mode": "WAL",        # 읽기와 쓰기가 서로를 막지 않음
+        "synchronous": "NORMAL",      # WAL 모드에서 안전하면서 fsync 횟수 최소화
+        "busy_timeout": "5000",       # 다른 프로세스가 쓰는 중이면 5초까지 대기
+        "cache_size": "-65536",       # 페이지 캐시 64MB
+        "temp_store": "MEMORY",
+        "mmap_size": "268435456",     # 256MB 메모리 맵 읽기
+        "foreign_keys": "ON",
+    }
+
+    def _connect_args(self):
+        return {"check_same_thread": False, "timeout": 30}
+
+    def build_engine(self):
+        engine = create_engine(self.url, connect_args=self._connect_args(), pool_pre_ping=True)
+        self._install_pragmas(engine)
+        return engine
+
+    def _install_pragmas(self, engine):
+        pragmas = self.PRAGMAS
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_conn, _record):
+            cursor = dbapi_conn.cursor()
+            for key, value in pragmas.items():
+                cursor.execute(f"PRAGMA {key}={value}")
+            cursor.close()
+
+
+class MemoryBackend(SQLiteBackend):
+    name = "memory"
+    label = "In-Memory SQLite"
+    ephemeral = True
+
+    # 디스크가 없으므로 저널/동기화 비용을 전부 끔
+    PRAGMAS = {
+        "journal_mode": "MEMORY",
+        "synchronous": "OFF",
+        "temp_store": "MEMORY",
+        "foreign_keys": "ON",
+    }
+
+    def build_engine(self):
+        # 모든 세션/스레드가 하나의 연결(=하나의 메모리 DB)을 공유해야 데이터가 보임
+        engine = create_engine("sqlite://", connect_args=self._connect_args(), poolclass=StaticPool)
+        self._install_pragmas(engine)
+        return engine
+
+
+BACKENDS = {b.name: b for b in (PostgresBackend, SQLiteBackend, MemoryBackend)}
+
+
+def resolve_backend() -> StorageBackend:
+    url = os.getenv("DATABASE_URL")
+    backend_name = os.getenv("STORAGE_BACKEND", "").lower()
+
+    if not backend_name:
+        if not url:
+            raise ValueError("❌ .env 파일에 'DATABASE_URL'이 없습니다! (로컬 실행은 STORAGE_BACKEND=sqlite 또는 memory)")
+        backend_name = "sqlite" if url.startswith("sqlite") else "postgres"
+
+    if backend_name not in BACKENDS:
+        raise ValueError(f"❌ 알 수 없는 STORAGE_BACKEND: {backend_name} (postgres/sqlite/memory 중 선택)")
+
+    if backend_name == "sqlite" and not (url and url.startswith("sqlite")):
+        url = f"sqlite:///{os.getenv('SQLITE_PATH', 'stock_game.db')}"
+    elif backend_name == "postgres":
+        if not url:
+            raise ValueError("❌ STORAGE_BACKEND=postgres 인데 'DATABASE_URL'이 없습니다!")
+        # SQLAlchemy는 postgres:// 대신 postgresql://을 사용해야 함
+        if url.startswith("postgres://"):
+            url = url.replace("postgres://", "postgresql://", 1)
+
+    return BACKENDS[backend_name](url or "sqlite://")
@@ -0,0 +1,190 @@
+import os
+from collections import deque
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from database import DBUserAnalytics, DBTrade
+from agent_registry import AGENTS
+
+# ---------------------------------------------------------
+# 유저 매매 습관 분석 (user_analytics 테이블, 유저 1명 = 1행)
+# - 유저 체결마다 엔진이 같은 트랜잭션 안에서 누적치만 증분 갱신 → 진단 요청 때 원시 체결을 다시 훑지 않음
+#   · 회전율, 평균 보유기간, 승률(청산 매도 기준), 집중도(원가 기준 HHI/최대 비중), 공포 매도 횟수
+# - 멘토에게는 원시 거래 행 대신 이 요약 지표만 전달 (프롬프트가 짧고 일정함)
+# - 마지막 진단 카드와 그때의 지표도 같은 행에 저장 → 지표가 의미 있게 변했을 때만 LLM 재호출
+# ---------------------------------------------------------
+PANIC_LOSS_PCT = float(os.getenv("PANIC_LOSS_PCT", "3"))    # 평단 대비 이만큼 손실 본 매도이면서
+PANIC_DROP_PCT = float(os.getenv("PANIC_DROP_PCT", "2"))    # 종목이 최근 이만큼 떨어지는 중 → 공포 매도
+REPLAY_WINDOW = 20                                          # 재구성 시 최근 수익률 창 (indicators.WINDOW와 같은 뜻)
+
+# 진단 재생성 기준 (하나라도 넘으면 "의미 있는 변화")
+SOLUTION_MIN_NEW_TRADES = int(os.getenv("SOLUTION_MIN_NEW_TRADES", "5"))
+SOLUTION_RATE_DELTA = float(os.getenv("SOLUTION_RATE_DELTA", "0.1"))      # 승률/최대 비중 변화폭
+SOLUTION_REL_DELTA = float(os.getenv("SOLUTION_REL_DELTA", "0.5"))        # 회전율/보유기간 상대 변화
+
+
+def _insert_ignore(db: Session):
+    """DB 종류에 맞는 INSERT ... ON CONFLICT DO NOTHING (positions._upsert 와 같은 방식)"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(DBUserAnalytics)
+
+
+def _row_for_update(db: Session, agent_id: str) -> DBUserAnalytics:
+    # 유저 체결은 API(유저 주문)와 시뮬레이션(걸어둔 유저 주문) 양쪽에서 일어남 → 행 잠금 후 갱신
+    db.execute(_insert_ignore(db).values(agent_id=agent_id, lots={}).on_conflict_do_nothing())
+    return db.query(DBUserAnalytics).filter(DBUserAnalytics.agent_id == agent_id).with_for_update().one()
+
+
+# ---------- 1. 갱신 (체결 1건) ----------
+def record_fill(db: Session, agent_id: str, ticker: str, is_buy: bool, qty: int, price: float,
+                sim_time: datetime, recent_return_pct: float = 0.0):
+    """유저 체결 1건 반영 (commit은 호출한 쪽 트랜잭션에서). recent_return_pct = 종목 최근 수익률 (공포 매도 판정용)"""
+    row = _row_for_update(db, agent_id)
+    lots = dict(row.lots or {})
+    ts = sim_time.timestamp()
+    amount = price * qty
+
+    row.trades += 1
+    row.first_trade_at = row.first_trade_at or sim_time
+    row.last_trade_at = sim_time
+    if is_buy:
+        row.buys += 1
+        row.bought_amount += amount
+        held, cost, entered = lots.get(ticker, (0, 0.0, ts))
+        total = held + qty
+        lots[ticker] = [total, (held * cost + amount) / total, (held * entered + qty * ts) / total]
+    else:
+        row.sells += 1
+        row.sold_amount += amount
+        held, cost, entered = lots.get(ticker, (0, 0.0, ts))
+        closed = min(qty, held)  # 분석 시작 전부터 들고 있던 물량은 평단/진입시각을 모르므로 제외
+        if closed > 0:
+            pnl = (price - cost) * closed
+            row.realized_pnl += pnl
+            if pnl > 0: row.wins += 1
+            elif pnl < 0: row.losses += 1
+            row.closed_qty += closed
+            row.hold_seconds += (ts - entered) * closed
+            loss_pct = (cost - price) / cost * 100 if cost else 0.0
+            if loss_pct >= PANIC_LOSS_PCT and recent_return_pct <= -PANIC_DROP_PCT:
+                row.panic_sells += 1
+            if held - closed > 0:
+                lots[ticker] = [held - closed, cost, entered]
+            else:
+                lots.pop(ticker, None)
+    row.lots = lots  # JSON 컬럼은 통째로 다시 대입해야 변경으로 잡힘
+
+
+# ---------- 2. 조회 (요약 지표) ----------
+def compute_features(row: Optional[DBUserAnalytics], cash_balance: float) -> dict:
+    """누적치 → 멘토에게 줄 요약 지표 (행이 없으면 거래 0건 기준)"""
+    if row is None:
+        return {"trades": 0, "buys": 0, "sells": 0, "turnover": 0.0, "trades_per_day": 0.0, "avg_hold_min": None,
+                "win_rate": None, "realized_pnl": 0, "top_ticker": None, "top_weight": 0.0, "hhi": 0.0, "panic_sells": 0}
+    lots = row.lots or {}
+    basis = {t: qty * cost for t, (qty, cost, _) in lots.items() if qty > 0}
+    invested = sum(basis.values())
+    weights = {t: v / invested for t, v in basis.items()} if invested else {}
+    top = max(weights, key=weights.get) if weights else None
+    days = (row.last_trade_at.date() - row.first_trade_at.date()).days + 1 if row.first_trade_at else 1
+    closes = row.wins + row.losses
+    return {
+        "trades": row.trades,
+        "buys": row.buys,
+        "sells": row.sells,
+        # 회전율 = 누적 거래대금(매수+매도의 절반) / 현재 자산(현금 + 보유 원가)
+        "turnover": round((row.bought_amount + row.sold_amount) / 2 / max(cash_balance + invested, 1.0), 2),
+        "trades_per_day": round(row.trades / days, 1),
+        "avg_hold_min": round(row.hold_seconds / row.closed_qty / 60, 1) if row.closed_qty else None,
+        "win_rate": round(row.wins / closes, 2) if closes else None,
+        "realized_pnl": round(row.realized_pnl),
+        "top_ticker": top,
+        "top_weight": round(weights[top], 2) if top else 0.0,
+        "hhi": round(sum(w * w for w in weights.values()), 2),
+        "panic_sells": row.panic_sells,
+    }
+
+
+def get_user_features(db: Session, agent_id: str, cash_balance: float) -> dict:
+    row = db.query(DBUserAnalytics).filter(DBUserAnalytics.agent_id == agent_id).first()
+    return compute_features(row, cash_balance)
+
+
+def format_features(f: dict) -> str:
+    """프롬프트용 한 줄 요약"""
+    if not f["trades"]:
+        return "아직 체결된 거래가 없습니다."
+    hold = f"{f['avg_hold_min']}분" if f["avg_hold_min"] is not None else "청산 이력 없음"
+    win = f"{f['win_rate']:.0%}" if f["win_rate"] is not None else "청산 이력 없음"
+    top = f"{f['top_ticker']} {f['top_weight']:.0%}" if f["top_ticker"] else "보유 없음"
+    return (f"총 {f['trades']}회(매수 {f['buys']}/매도 {f['sells']}), 하루 평균 {f['trades_per_day']}회, "
+            f"회전율 {f['turnover']}배, 평균 보유 {hold}, 승률 {win}, 실현손익 {f['realized_pnl']:,}원, "
+            f"최대 비중 {top} (HHI {f['hhi']}), 공포 매도 {f['panic_sells']}회")
+
+
+# ---------- 3. 진단 캐시 (지표가 의미 있게 변했을 때만 LLM 재호출) ----------
+def _rel_changed(old, new) -> bool:
+    if old is None or new is None: return old != new
+    return abs(new - old) > SOLUTION_REL_DELTA * max(abs(old), 1e-9)
+
+
+def features_changed(old: Optional[dict], new: dict) -> bool:
+    if not old: return True
+    return (new["trades"] - old.get("trades", 0) >= SOLUTION_MIN_NEW_TRADES
+            or new["panic_sells"] > old.get("panic_sells", 0)
+            or new["top_ticker"] != old.get("top_ticker")
+            or abs(new["top_weight"] - old.get("top_weight", 0.0)) >= SOLUTION_RATE_DELTA
+            or (new["win_rate"] is None) != (old.get("win_rate") is None)
+            or (new["win_rate"] is not None and abs(new["win_rate"] - old["win_rate"]) >= SOLUTION_RATE_DELTA)
+            or _rel_changed(old.get("turnover"), new["turnover"])
+            or _rel_changed(old.get("avg_hold_min"), new["avg_hold_min"]))
+
+
+def get_cached_solution(db: Session, agent_id: str, features: dict) -> Optional[list]:
+    """저장된 진단이 있고 그때와 지표가 크게 다르지 않으면 그 카드를 그대로"""
+    row = db.query(DBUserAnalytics.solution, DBUserAnalytics.solution_features).filter(
+        DBUserAnalytics.agent_id == agent_id).first()
+    if row is None or row.solution is None or features_changed(row.solution_features, features):
+        return None
+    return row.solution
+
+
+def save_solution(db: Session, agent_id: str, features: dict, cards: list):
+    db.execute(_insert_ignore(db).values(agent_id=agent_id, lots={}).on_conflict_do_nothing())
+    db.execute(update(DBUserAnalytics).where(DBUserAnalytics.agent_id == agent_id)
+               .values(solution=cards, solution_features=features))
+    db.commit()
+
+
+# ---------- 4. 재구성 (테이블 도입 전 거래 / 초기화 후) ----------
+def rebuild(db: Session) -> int:
+    """trades(buyer_uid/seller_uid)를 id 순으로 다시 흘려 유저 지표를 처음부터 계산. 반영한 체결 수"""
+    AGENTS.load(db)
+    db.query(DBUserAnalytics).delete()
+
+    # 공포 매도 판정에 종목의 최근 수익률이 필요하므로 유저 체결만이 아니라 전체 체결을 순서대로 훑음 (1회성)
+    recent = {}  # ticker -> 최근 REPLAY_WINDOW건 체결가
+    fills = 0
+    query = db.query(DBTrade.ticker, DBTrade.price, DBTrade.quantity, DBTrade.buyer_uid, DBTrade.seller_uid,
+                     DBTrade.timestamp).order_by(DBTrade.id)
+    for ticker, price, qty, buyer_uid, seller_uid, ts in query.yield_per(10_000):
+        prices = recent.setdefault(ticker, deque(maxlen=REPLAY_WINDOW))
+        ret = (prices[-1] - prices[0]) / prices[0] * 100 if prices and prices[0] else 0.0  # 엔진처럼 이번 체결 직전 기준
+        for uid, is_buy in ((buyer_uid, True), (seller_uid, False)):
+            if uid is not None and AGENTS.is_human(uid):
+                record_fill(db, AGENTS.name(uid), ticker, is_buy, qty, price, ts, ret)
+                fills += 1
+        prices.append(price)
+    db.commit()
+    return fills
+
+
+if __name__ == "__main__":
+    from database import SessionLocal, init_db
+    init_db()  # user_analytics 테이블이 없으면 생성
+    with SessionLocal() as db:
+        print(f"✅ 유저 체결 {rebuild(db):,}건으로 매매 습관 지표 재구성 완료")